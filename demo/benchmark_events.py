@@ -0,0 +1,79 @@
+#!/usr/bin/python
+""" Memory and copy/equality benchmark for the event stream of a full game.
+
+Plays a 300 round game between two BFSPlayer teams and records every
+event which is sent to the viewers. It then reports the memory used by the
+recorded stream and the time needed to compare and to copy it.
+"""
+
+import copy
+import sys
+import time
+
+from pelita.game_master import GameMaster
+from pelita.player import BFSPlayer, NQRandomPlayer, SimpleTeam
+from pelita.viewer import AbstractViewer
+from pelita.layout import get_layout_by_name
+
+ROUNDS = 300
+
+class RecordingViewer(AbstractViewer):
+    """ A viewer which keeps every event it observes. """
+    def __init__(self):
+        self.events = []
+
+    def observe(self, round_, turn, universe, events):
+        self.events.extend(events)
+
+def deep_sizeof(obj, seen=None):
+    """ Approximate memory size of `obj` including everything it references.
+
+    Shared objects (e.g. interned positions) are only counted once.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen)
+                    for k, v in obj.iteritems())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    if hasattr(obj, "__dict__"):
+        size += deep_sizeof(obj.__dict__, seen)
+    for name in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, name):
+            size += deep_sizeof(getattr(obj, name), seen)
+    return size
+
+if __name__ == '__main__':
+    layout = get_layout_by_name('layout_normal_without_dead_ends_001')
+    gm = GameMaster(layout, 4, ROUNDS, noise=False)
+    gm.register_team(SimpleTeam(BFSPlayer(), NQRandomPlayer()))
+    gm.register_team(SimpleTeam(NQRandomPlayer(), BFSPlayer()))
+    viewer = RecordingViewer()
+    gm.register_viewer(viewer)
+
+    start = time.time()
+    gm.play()
+    play_time = time.time() - start
+
+    events = viewer.events
+    size = deep_sizeof(events)
+
+    start = time.time()
+    events_copy = copy.deepcopy(events)
+    copy_time = time.time() - start
+
+    start = time.time()
+    assert events == events_copy
+    eq_time = time.time() - start
+
+    print "Played %i rounds in %.3f s." % (ROUNDS, play_time)
+    print "Events recorded:  %i" % len(events)
+    print "Memory (approx.): %i bytes (%.1f bytes/event)" % (
+        size, float(size) / max(len(events), 1))
+    print "deepcopy:         %.4f s" % copy_time
+    print "equality:         %.4f s" % eq_time
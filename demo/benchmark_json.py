@@ -0,0 +1,60 @@
+#!/usr/bin/python
+""" Encoding benchmark for the messages which are sent to remote players.
+
+Plays a short game, records every universe and its events and then
+reports the size and the time needed to encode and decode them with the
+verbose (tagged dicts) and the compact encoding of the JsonConverter.
+"""
+
+import time
+
+from pelita.game_master import GameMaster
+from pelita.player import BFSPlayer, NQRandomPlayer, SimpleTeam
+from pelita.viewer import AbstractViewer
+from pelita.layout import get_layout_by_name
+from pelita.messaging.json_convert import json_converter, JsonConverter
+
+ROUNDS = 100
+REPEAT = 3
+
+class RecordingViewer(AbstractViewer):
+    """ A viewer which keeps every universe and its events. """
+    def __init__(self):
+        self.messages = []
+
+    def observe(self, round_, turn, universe, events):
+        self.messages.append({"universe": universe.copy(), "events": events})
+
+def measure(func, items):
+    """ Returns the best time of `REPEAT` runs of `func` over `items`. """
+    best = None
+    for _ in range(REPEAT):
+        start = time.time()
+        for item in items:
+            func(item)
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+if __name__ == '__main__':
+    layout = get_layout_by_name('layout_normal_without_dead_ends_001')
+    gm = GameMaster(layout, 4, ROUNDS, noise=False)
+    gm.register_team(SimpleTeam(BFSPlayer(), NQRandomPlayer()))
+    gm.register_team(SimpleTeam(NQRandomPlayer(), BFSPlayer()))
+    viewer = RecordingViewer()
+    gm.register_viewer(viewer)
+    gm.play()
+    messages = viewer.messages
+
+    verbose = JsonConverter(compact=False)
+    verbose.reg = json_converter.reg
+
+    print "%i messages, JSON backend: %s" % (len(messages),
+                                            json_converter.backend.__name__)
+    print "%-8s %14s %12s %12s" % ("", "bytes/message", "encode [s]", "decode [s]")
+    for name, converter in (("verbose", verbose), ("compact", json_converter)):
+        encoded = [converter.dumps(message) for message in messages]
+        size = sum(len(data) for data in encoded) / len(encoded)
+        encode_time = measure(converter.dumps, messages)
+        decode_time = measure(converter.loads, encoded)
+        print "%-8s %14i %12.4f %12.4f" % (name, size, encode_time, decode_time)
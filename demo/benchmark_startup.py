@@ -0,0 +1,83 @@
+#!/usr/bin/python
+""" Startup benchmark for short games.
+
+Plays a few short games through the SimpleServer/SimpleClient setup and
+reports the time from the creation of the server until the first move
+is requested from a player (time-to-first-move) and the total wall time.
+
+For short games, this fixed overhead dominates the total time.
+"""
+
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+
+from pelita.simplesetup import SimpleClient, SimpleServer
+from pelita.player import StoppingPlayer, SimpleTeam
+from pelita.viewer import AbstractViewer
+
+ROUNDS = 10
+REPEAT = 3
+
+LAYOUT = """
+##########
+#        #
+#0      1#
+##########
+"""
+
+class NullViewer(AbstractViewer):
+    def observe(self, round_, turn, universe, events):
+        pass
+
+class FirstMovePlayer(StoppingPlayer):
+    """ Records the time of the first move request in a shared value. """
+    def __init__(self, first_move):
+        super(FirstMovePlayer, self).__init__()
+        self.first_move = first_move
+
+    def get_move(self):
+        with self.first_move.get_lock():
+            if not self.first_move.value:
+                self.first_move.value = time.time()
+        return super(FirstMovePlayer, self).get_move()
+
+def play(kind, tmp_dir):
+    first_move = multiprocessing.Value("d", 0.0)
+    if kind == "local":
+        kwargs = {"local": True}
+    elif kind == "unix":
+        kwargs = {"address": "unix://" + os.path.join(tmp_dir, "pelita.sock")}
+    else:
+        kwargs = {"address": "tcp://localhost:50007"}
+
+    start = time.time()
+    server = SimpleServer(layout_string=LAYOUT, rounds=ROUNDS, players=2, **kwargs)
+    clients = []
+    for name in ("team1", "team2"):
+        client = SimpleClient(SimpleTeam(name, FirstMovePlayer(first_move)), **kwargs)
+        if kind == "local":
+            clients.append(client.autoplay_thread())
+        else:
+            clients.append(client.autoplay_process())
+    server.run_simple(NullViewer)
+    # the client processes share the address of the server
+    for client in clients:
+        client.join()
+    total = time.time() - start
+
+    return first_move.value - start, total
+
+if __name__ == '__main__':
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        print "%-6s %22s %16s" % ("", "time-to-first-move [s]", "total [s]")
+        for kind in ("local", "unix", "tcp"):
+            results = [play(kind, tmp_dir) for _ in range(REPEAT)]
+            first_move = min(r[0] for r in results)
+            total = min(r[1] for r in results)
+            print "%-6s %22.4f %16.4f" % (kind, first_move, total)
+    finally:
+        shutil.rmtree(tmp_dir)
@@ -6,18 +6,22 @@
 
 import sys
 import Queue
+import collections
+import threading
 
 import logging
-import time
-from pelita.viewer import DumpingViewer
+from pelita.viewer import DumpingViewer, ViewerQueue
 
 _logger = logging.getLogger("pelita")
 _logger.setLevel(logging.DEBUG)
 
 from .messaging import (DispatchingActor, expose, actor_registry,
                         actor_of, RemoteConnection, DeadConnection,
-                        ActorNotRunning)
+                        ActorNotRunning, AnytimeRequest, gather,
+                        PRIORITY_LOW, PRIORITY_HIGH)
+from .messaging.actor import BaseActorReference
 from .messaging.remote_actor import RemoteActorReference
+from .messaging.json_convert import json_converter
 from .game_master import (GameMaster, PlayerTimeout, PlayerDisconnected,
                           AbstractViewer)
 
@@ -25,11 +29,17 @@
 
 TIMEOUT = 3
 
-def get_server_actor(name, host=None, port=None):
+# The time budget which is announced to a player is a bit smaller
+# than TIMEOUT to account for the network latency.
+MOVE_BUDGET = TIMEOUT * 0.9
+
+def get_server_actor(name, host=None, port=None, path=None):
     try:
-        if port is None:
-            # assume local game
-            server_actor = actor_registry.get_by_name(name)
+        if path is not None:
+            server_actor = RemoteConnection().unix_actor_for(name, path)
+        elif port is None:
+            # assume local game; the server may still be setting up
+            server_actor = actor_registry.wait_for_name(name, TIMEOUT / 2.)
         else:
             server_actor = RemoteConnection().actor_for(name, host, port)
     except DeadConnection:
@@ -54,13 +64,13 @@ def set_viewer(self, viewer):
     def set_initial(self, universe):
         self._viewer.set_initial(universe)
 
-    @expose
+    @expose(priority=PRIORITY_LOW)
     def observe(self, round_, turn, universe, events):
         self._viewer.observe(round_, turn, universe, events)
 
     @expose
-    def connect(self, main_actor, timeout, host=None, port=None):
-        self._server = get_server_actor(main_actor, host, port)
+    def connect(self, main_actor, timeout, host=None, port=None, path=None):
+        self._server = get_server_actor(main_actor, host, port, path)
         if not self._server:
             self.ref.reply("failed")
             return
@@ -69,7 +79,7 @@ def connect(self, main_actor, timeout, host=None, port=None):
             if self._server.query("register_viewer_actor", [self.ref.uuid]).get(timeout) == "ok":
                 _logger.info("Connection accepted")
                 self.ref.reply("ok")
-        except Queue.Empty:
+        except (Queue.Empty, DeadConnection):
             self.ref.reply("actor no reply")
         except ActorNotRunning:
             # local server is not yet running. Try again later
@@ -91,10 +101,16 @@ def connect_local(self, main_actor, silent=True):
         """
         return self.connect(main_actor, None, None, silent=silent)
 
-    def connect(self, main_actor, host="", port=50007, silent=True):
+    def connect_unix(self, main_actor, path, silent=True):
+        """ Tells our local actor to establish a connection with `main_actor`
+        through the Unix domain socket `path`.
+        """
+        return self.connect(main_actor, None, None, silent=silent, path=path)
+
+    def connect(self, main_actor, host="", port=50007, silent=True, path=None):
         """ Tells our local actor to establish a connection with `main_actor`.
         """
-        if port is None:
+        if port is None and path is None:
             if not silent:
                 print "Trying to establish a connection with local actor '%s'..." % main_actor,
         else:
@@ -103,7 +119,7 @@ def connect(self, main_actor, host="", port=50007, silent=True):
         sys.stdout.flush()
 
         try:
-            res = self.actor_ref.query("connect", [main_actor, 2, host, port]).get(TIMEOUT)
+            res = self.actor_ref.query("connect", [main_actor, 2, host, port, path]).get(TIMEOUT)
             if not silent:
                 print res
             if res == "ok":
@@ -138,12 +154,12 @@ def register_team(self, team):
         self.ref.reply("OK")
 
     @expose
-    def say_hello(self, main_actor, team_name, host=None, port=None):
+    def say_hello(self, main_actor, team_name, host=None, port=None, path=None):
         """ Opens a connection to the remote main_actor,
         and sends it a "hello" message with the given team_name.
         """
 
-        self.server_actor = get_server_actor(main_actor, host, port)
+        self.server_actor = get_server_actor(main_actor, host, port, path)
         if not self.server_actor:
             self.ref.reply("failed")
             return
@@ -151,8 +167,11 @@ def say_hello(self, main_actor, team_name, host=None, port=None):
         try:
             if self.server_actor.query("hello", [team_name, self.ref.uuid]).get(2) == "ok":
                 _logger.info("Connection accepted")
+                if isinstance(self.server_actor, RemoteActorReference):
+                    # stop as soon as the server closes the connection
+                    self.server_actor.add_disconnect_callback(self.ref.stop)
                 self.ref.reply("ok")
-        except Queue.Empty:
+        except (Queue.Empty, DeadConnection):
             self.ref.reply("actor no reply")
         except ActorNotRunning:
             # local server is not yet running. Try again later
@@ -170,11 +189,25 @@ def set_initial(self, universe):
         """
         self.ref.reply(self.team._set_initial(universe))
 
-    @expose
-    def play_now(self, bot_index, universe):
+    @expose(priority=PRIORITY_HIGH)
+    def play_now(self, bot_index, universe, time_budget=None):
         """ Called by the server. This message requests a new move
         from the bot with index `bot_index`.
+
+        If the team supports it, provisional moves are sent back as
+        ``{"provisional": move}`` before the final reply.
         """
+        if hasattr(self.team, "_set_move_budget"):
+            channel = self.ref.channel
+
+            def send_provisional(move):
+                try:
+                    channel.put({"provisional": move})
+                except (DeadConnection, ActorNotRunning):
+                    pass
+
+            self.team._set_move_budget(time_budget, send_provisional)
+
         move = self.team._get_move(bot_index, universe)
         self.ref.reply(move)
 
@@ -221,10 +254,16 @@ def connect_local(self, main_actor, silent=True):
         """
         return self.connect(main_actor, None, None, silent=silent)
 
-    def connect(self, main_actor, host="", port=50007, silent=True):
+    def connect_unix(self, main_actor, path, silent=True):
+        """ Tells our local actor to establish a connection with `main_actor`
+        through the Unix domain socket `path`.
+        """
+        return self.connect(main_actor, None, None, silent=silent, path=path)
+
+    def connect(self, main_actor, host="", port=50007, silent=True, path=None):
         """ Tells our local actor to establish a connection with `main_actor`.
         """
-        if port is None:
+        if port is None and path is None:
             if not silent:
                 print "Trying to establish a connection with local actor '%s'..." % main_actor,
         else:
@@ -234,7 +273,7 @@ def connect(self, main_actor, host="", port=50007, silent=True):
             sys.stdout.flush()
 
         try:
-            res = self.actor_ref.query("say_hello", [main_actor, self.team_name, host, port]).get(TIMEOUT)
+            res = self.actor_ref.query("say_hello", [main_actor, self.team_name, host, port, path]).get(TIMEOUT)
             if not silent:
                 print res
             if res == "ok":
@@ -252,6 +291,17 @@ class RemoteViewer(AbstractViewer):
     def __init__(self, reference):
         self.ref = reference
 
+    @staticmethod
+    def coalesce(old, new):
+        """ Merges two queued messages for a remote viewer.
+
+        Two ``observe`` messages keep the latest universe but all events.
+        """
+        if old.get("method") == new.get("method") == "observe":
+            return {"method": "observe",
+                    "params": list(ViewerQueue._coalesce(old["params"], new["params"]))}
+        return new
+
     def set_initial(self, universe):
         self.ref.notify("set_initial", [universe])
 
@@ -259,6 +309,106 @@ def observe(self, round_, turn, universe, events):
         self.ref.notify("observe", [round_, turn, universe, events])
 
 
+class BroadcastHub(AbstractViewer):
+    """ A viewer which relays the game to many remote viewers.
+
+    Every message is converted to json only once and the same string
+    is sent to all subscribed viewers. A viewer which subscribes during
+    a game first receives the initial universe and the latest snapshot
+    (the keyframe).
+
+    The connections of the subscribers use the ``"coalesce"`` outbox
+    policy, so that a slow viewer skips snapshots instead of slowing
+    down the others. (Unlike `RemoteViewer`, events of skipped
+    snapshots are lost for this viewer.)
+
+    The hub should be registered as a background viewer, so that the
+    encoding does not happen in the game thread.
+
+    Attributes
+    ----------
+    subscribers : list of ActorReference
+        the viewer actors
+    encodings : int
+        the number of json encodings so far
+    """
+    def __init__(self):
+        self.subscribers = []
+        self.encodings = 0
+        self._initial = None
+        self._latest = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, viewer_ref):
+        """ Adds the viewer actor `viewer_ref` and sends it the keyframe. """
+        with self._lock:
+            self.subscribers.append(viewer_ref)
+            for message in (self._initial, self._latest):
+                # stop after the first failure, the viewer has been removed
+                if message is not None and not self._send(viewer_ref, message):
+                    break
+
+    def set_initial(self, universe):
+        self._broadcast("set_initial", [universe], initial=True)
+
+    def observe(self, round_, turn, universe, events):
+        self._broadcast("observe", [round_, turn, universe, events])
+
+    def _broadcast(self, method, params, initial=False):
+        message = (method, params, json_converter.dumps({"method": method, "params": params}))
+        with self._lock:
+            self.encodings += 1
+            if initial:
+                self._initial = message
+                self._latest = None
+            else:
+                self._latest = message
+            for viewer_ref in list(self.subscribers):
+                self._send(viewer_ref, message)
+
+    def _send(self, viewer_ref, message):
+        """ Sends `message` to `viewer_ref` or removes a dead viewer.
+        Returns False in the latter case.
+        """
+        method, params, encoded = message
+        try:
+            if isinstance(viewer_ref, RemoteActorReference):
+                viewer_ref.put_encoded(encoded, key=method)
+            else:
+                viewer_ref.notify(method, params)
+        except (DeadConnection, ActorNotRunning):
+            _logger.info("Removing viewer %r from broadcast.", viewer_ref)
+            if viewer_ref in self.subscribers:
+                self.subscribers.remove(viewer_ref)
+            return False
+        return True
+
+
+class BroadcastActor(DispatchingActor):
+    """ Accepts the viewers for a `BroadcastHub`.
+
+    Viewers connect to this actor just like to the `ServerActor`. Since
+    it does not run the game, viewers may also join during a game.
+    """
+    def on_start(self):
+        self.hub = None
+
+    @expose
+    def set_hub(self, hub):
+        self.hub = hub
+
+    @expose
+    def register_viewer_actor(self, viewer_uuid):
+        if self.ref.remote:
+            other_ref = self.ref.remote.create_proxy(viewer_uuid)
+            self.ref.remote.outbox.set_policy("coalesce")
+        else:
+            other_ref = actor_registry.get_by_uuid(viewer_uuid)
+
+        self.hub.subscribe(other_ref)
+        self.ref.reply("ok")
+
+
 class RemoteTeamPlayer(object):
     """ This class is registered with the GameMaster and
     relays all get_move requests to the given ActorReference.
@@ -273,29 +423,41 @@ class RemoteTeamPlayer(object):
     """
     def __init__(self, reference):
         self.ref = reference
+        self._bot_ids = None
 
     def _set_bot_ids(self, bot_ids):
-        try:
-            return self.ref.query("set_bot_ids", bot_ids).get(TIMEOUT)
-        except (Queue.Empty, ActorNotRunning, DeadConnection):
-            pass
+        # The bot ids are sent together with the initial universe
+        # in `_set_initial` to save a round trip.
+        self._bot_ids = bot_ids
 
     def _set_initial(self, universe):
+        queries = []
+        if self._bot_ids is not None:
+            queries.append(("set_bot_ids", self._bot_ids))
+        queries.append(("set_initial", [universe]))
         try:
-            return self.ref.query("set_initial", [universe]).get(TIMEOUT)
+            results = gather(self.ref.query_batch(queries), TIMEOUT)
+            return results[-1]
         except (Queue.Empty, ActorNotRunning, DeadConnection):
             pass
 
     def _get_move(self, bot_idx, universe):
+        request = AnytimeRequest()
         try:
-            result = self.ref.query("play_now", [bot_idx, universe]).get(TIMEOUT)
+            self.ref.query("play_now", [bot_idx, universe, MOVE_BUDGET], request=request)
+            result = request.get(TIMEOUT)
             return tuple(result)
         except TypeError:
             # if we could not convert into a tuple (e.g. bad reply)
             return None
         except Queue.Empty:
-            # if we did not receive a message in time
-            raise PlayerTimeout()
+            # if we did not receive a message in time,
+            # we use the last provisional move (if any)
+            try:
+                provisional_move = tuple(request.provisional)
+            except TypeError:
+                provisional_move = None
+            raise PlayerTimeout(provisional_move)
         except (ActorNotRunning, DeadConnection):
             # if the remote connection is closed
             raise PlayerDisconnected()
@@ -307,16 +469,38 @@ class ServerActor(DispatchingActor):
 
     It also automatically starts a new game whenever two players
     are accepted.
+
+    Further games may be queued with `schedule_game`. They are played
+    one after the other by the same teams over the same connections
+    (a session), so that the teams keep their processes and caches.
+    A team which disconnects during a session is dropped and the next
+    game waits for another team to say 'hello'. When no team is left,
+    the remaining games are cancelled.
     """
     def on_start(self):
         self.teams = []
         self.team_names = []
 
         self.remote_viewers = []
+        self.viewers = []
         self.game_master = None
+        self.scheduled_games = collections.deque()
+        self.results = []
 
         self._auto_shutdown = False
+        self._start_held = False
+        self._start_pending = False
         self.dump_file = None
+        self._dump_stream = None
+        self.broadcast_hub = None
+
+    def on_stop(self):
+        self._close_dump()
+
+    def _close_dump(self):
+        if self._dump_stream is not None:
+            self._dump_stream.close()
+            self._dump_stream = None
 
     @expose
     def auto_shutdown(self):
@@ -328,25 +512,69 @@ def set_auto_shutdown(self, value):
 
     @expose
     def set_dump_file(self, dump_file):
+        """ Dumps the games to the file `dump_file`. All games of a
+        session are written to the same file, one after the other.
+        """
+        self._close_dump()
         self.dump_file = dump_file
 
+    @expose
+    def hold_start(self):
+        """ Do not start a game until `release_start` is called,
+        even if all teams are available.
+
+        This allows the owner of the server to finish its setup
+        (e.g. registering viewers) without racing the teams.
+        """
+        self._start_held = True
+
+    @expose
+    def release_start(self):
+        """ Allows the game to start as soon as all teams are available. """
+        self._start_held = False
+        self.check_for_start()
+
     @expose
     def initialize_game(self, layout, number_bots, game_time):
         """ Initialises a new game.
         """
         self.game_master = GameMaster(layout, number_bots, game_time)
+        for viewer in self.viewers:
+            # viewers must not be able to slow down the game
+            self.game_master.register_viewer(viewer, background=True)
         self.check_for_start()
 
+    @expose
+    def schedule_game(self, layout, number_bots, game_time):
+        """ Queues a game which is played by the same teams after
+        the current one.
+        """
+        if self.game_master is None:
+            self.initialize_game(layout, number_bots, game_time)
+        else:
+            self.scheduled_games.append((layout, number_bots, game_time))
+
+    @expose
+    def get_results(self):
+        """ Replies the list of ``(team_names, scores)`` of all
+        finished games.
+        """
+        self.ref.reply(self.results)
+
+    @expose
+    def set_broadcast_hub(self, hub):
+        """ Sends the game to all viewers of the `BroadcastHub` `hub`. """
+        self.broadcast_hub = hub
+        self.register_viewer(hub)
+
     def _remove_dead_teams(self):
         # check, if previously added teams are still connected:
         zipped = [(team, name) for team, name in zip(self.teams, self.team_names)
                                if not getattr(team, "is_connected", None) or
                                team.is_connected()]
 
-        if zipped:
-            teams, team_names = zip(*zipped)
-            self.teams = list(teams)
-            self.team_names = list(team_names)
+        self.teams = [team for team, name in zipped]
+        self.team_names = [name for team, name in zipped]
 
     @expose
     def hello(self, team_name, actor_uuid):
@@ -365,10 +593,26 @@ def hello(self, team_name, actor_uuid):
 
         self.check_for_start()
 
+    @expose
+    def register_team(self, team, team_name=""):
+        """ Register a team player object which is already able to answer
+        the requests of the GameMaster (e.g. a `SharedMemoryTeamPlayer`).
+
+        This is only possible for a local ServerActor.
+        """
+        _logger.info("Registering local team '%s'." % team_name)
+
+        self.teams.append(team)
+        self.team_names.append(team_name)
+
+        self.check_for_start()
+
     @expose
     def register_viewer_actor(self, viewer_uuid):
         if self.ref.remote:
             other_ref = self.ref.remote.create_proxy(viewer_uuid)
+            # a slow viewer connection must not delay the game
+            self.ref.remote.outbox.set_policy("coalesce", merge=RemoteViewer.coalesce)
         else:
             other_ref = actor_registry.get_by_uuid(viewer_uuid)
 
@@ -379,7 +623,11 @@ def register_viewer_actor(self, viewer_uuid):
 
     @expose
     def register_viewer(self, viewer):
-        self.game_master.register_viewer(viewer)
+        """ Registers `viewer` for the current and all following games. """
+        self.viewers.append(viewer)
+        if self.game_master is not None:
+            # viewers must not be able to slow down the game
+            self.game_master.register_viewer(viewer, background=True)
 
     @expose
     def start_game(self):
@@ -388,34 +636,64 @@ def start_game(self):
         This method only returns when the game master itself
         returns.
         """
+        self._start_pending = False
         for team_idx in range(len(self.teams)):
             team_ref = self.teams[team_idx]
             team_name = self.team_names[team_idx]
 
-            remote_player = RemoteTeamPlayer(team_ref)
+            if isinstance(team_ref, BaseActorReference):
+                team_player = RemoteTeamPlayer(team_ref)
+            else:
+                team_player = team_ref
 
-            self.game_master.register_team(remote_player, team_name=team_name)
+            self.game_master.register_team(team_player, team_name=team_name)
 
-        if self.dump_file:
-            with open(self.dump_file, 'w') as f:
-                viewer = DumpingViewer(f)
-                self.game_master.register_viewer(viewer)
+        try:
+            if self.dump_file:
+                if self._dump_stream is None:
+                    self._dump_stream = open(self.dump_file, 'w')
+                self.game_master.register_viewer(DumpingViewer(self._dump_stream))
 
-                self.game_master.play()
-        else:
             self.game_master.play()
+        finally:
+            self.results.append((list(self.team_names),
+                                 [team.score for team in self.game_master.universe.teams]))
+            if self._dump_stream is not None:
+                self._dump_stream.flush()
+            if not self.scheduled_games:
+                self._close_dump()
+                for team in self.game_master.player_teams:
+                    if hasattr(team, "close"):
+                        team.close()
 
-        if self._auto_shutdown:
+        self.game_master = None
+        self._continue_session()
+
+    def _continue_session(self):
+        """ Starts the next scheduled game or shuts down, if there is none. """
+        if self.scheduled_games:
+            self._remove_dead_teams()
+            if not self.teams:
+                _logger.warning("All teams have disconnected. "
+                                "Cancelling %i scheduled games.",
+                                len(self.scheduled_games))
+                self.scheduled_games.clear()
+                self._close_dump()
+
+        if self.scheduled_games:
+            # change sides, so that both teams play on both halves
+            self.teams.reverse()
+            self.team_names.reverse()
+            self.initialize_game(*self.scheduled_games.popleft())
+        elif self._auto_shutdown:
             self.ref.stop()
 
     def check_for_start(self):
         """ Checks, if a game can be run and start it. """
-        if self.game_master is not None and len(self.teams) == 2:
+        if (self.game_master is not None and len(self.teams) == 2
+                and not self._start_held and not self._start_pending):
             _logger.info("Two players are available. Starting a game.")
-            self.ref.notify("delayed_start_game")
-
-    @expose
-    def delayed_start_game(self):
-        """ Waits a bit before really starting the game. """
-        time.sleep(0.3)
-        self.ref.notify("start_game")
+            # Every team has received its reply to 'hello' before
+            # this message is handled, so there is no need to wait.
+            self._start_pending = True
+            self.ref.notify("start_game")
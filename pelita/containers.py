@@ -297,6 +297,12 @@ class TypeAwareList(MutableSequence):
     It inherits from MutableSequence, thus supporting all the usual operations on list.
     One difference is, that for list equality the `list` method must be called.
 
+    Items are additionally bucketed by their exact type when they are
+    appended. Checking for a type with `has()` (or `type in tal`) and fetching
+    the first item of a type with `first()` therefore do not need to scan the
+    list. Any other modification (insertion in the middle, deletion or item
+    assignment) invalidates the buckets, which are rebuilt on the next lookup.
+
     Examples
     --------
     >>> tal = TypeAwareList([Free(), Food()])
@@ -316,6 +322,10 @@ class TypeAwareList(MutableSequence):
     0
     >>> tal.index(Free())
     0
+    >>> tal.has(Food)
+    True
+    >>> tal.first(Food)
+    Food()
     >>> tal = TypeAwareList([1, 2, 3], base_class=int)
     >>> tal.append("string")
     ValueError: Value ''a'' is no instance of base '<type 'int'>'.
@@ -330,6 +340,9 @@ def __init__(self, iterable=None, base_class=None):
 
         self.base_class = base_class
         self._items = []
+        # maps the exact type of the items to the items in list order
+        # None means that the buckets need to be rebuilt
+        self._buckets = {}
         if iterable is not None:
             self.extend(iterable)
 
@@ -342,26 +355,89 @@ def __setitem__(self, key, value):
             raise ValueError("Value '%r' is no instance of base '%r'."
                     % (value, self.base_class))
         self._items[key] = value
+        self._buckets = None
 
     def __delitem__(self, key):
         del self._items[key]
+        self._buckets = None
 
     def insert(self, index, value):
         if self.base_class and not isinstance(value, self.base_class):
             raise ValueError("Value '%r' is no instance of base '%r'."
                     % (value, self.base_class))
+        if index >= len(self._items) and self._buckets is not None:
+            # appending keeps the buckets in order
+            self._buckets.setdefault(type(value), []).append(value)
+        else:
+            self._buckets = None
         self._items.insert(index, value)
 
+    def _get_buckets(self):
+        """ Returns the type buckets, rebuilding them if necessary. """
+        if self._buckets is None:
+            buckets = {}
+            for item in self._items:
+                buckets.setdefault(type(item), []).append(item)
+            self._buckets = buckets
+        return self._buckets
+
     def __len__(self):
         return len(self._items)
 
     def __contains__(self, item):
         """ y in x or instance of y in x """
         if inspect.isclass(item):
-            return any(isinstance(x, item) for x in self)
+            return self.has(item)
         else:
             return item in self._items
 
+    def has(self, type_):
+        """ Checks whether an instance of `type_` is in the list.
+
+        This is a constant time lookup, if `type_` is the exact type of the
+        items. Otherwise, only the distinct types in the list are checked.
+
+        Parameters
+        ----------
+        type_ : type
+            the type to look for
+
+        Returns
+        -------
+        has_type : boolean
+            True, if there is an instance of `type_` in the list
+        """
+        buckets = self._get_buckets()
+        if type_ in buckets:
+            return True
+        return any(issubclass(t, type_) for t in buckets)
+
+    def first(self, type_, default=None):
+        """ Returns the first item which is an instance of `type_`.
+
+        Parameters
+        ----------
+        type_ : type
+            the type to look for
+        default : object, optional, default=None
+            the value to return if there is no such item
+
+        Returns
+        -------
+        item : object
+            the first instance of `type_` or `default`
+        """
+        buckets = self._get_buckets()
+        matching = [t for t in buckets if issubclass(t, type_)]
+        if not matching:
+            return default
+        if len(matching) == 1:
+            return buckets[matching[0]][0]
+        # several subclasses match, we need the list order
+        for item in self._items:
+            if isinstance(item, type_):
+                return item
+
     def index(self, item):
         """ L.index(value, [start, [stop]]) -> integer -- return first index of
         value or instance of value"""
@@ -384,6 +460,12 @@ def filter_type(self, type_):
         if not inspect.isclass(type_):
             raise TypeError("Wrong type '%r' for 'filter_type'. Need 'type'."
                     % type_)
+        buckets = self._get_buckets()
+        matching = [t for t in buckets if issubclass(t, type_)]
+        if not matching:
+            return []
+        if len(matching) == 1:
+            return list(buckets[matching[0]])
         return [item for item in self if isinstance(item, type_)]
 
     def remove_type(self, type_):
@@ -432,3 +514,13 @@ def _from_json_dict(cls, item):
         item["base_class"] = getattr(sys.modules[module], class_name)
         return cls(**item)
 
+    def _to_json_list(self):
+        item = self._to_json_dict()
+        return [item["iterable"], item["base_class"]]
+
+    @classmethod
+    def _from_json_list(cls, values):
+        iterable, base_class = values
+        return cls._from_json_dict({"iterable": iterable,
+                                    "base_class": base_class})
+
@@ -3,7 +3,7 @@
 """ The datamodel. """
 
 import copy
-from .layout import Layout
+from .layout import Layout, parse_layout
 from .containers import Mesh, TypeAwareList
 from .messaging.json_convert import serializable
 
@@ -21,6 +21,32 @@
 # the number of points to score when killing
 KILLPOINTS=5
 
+# cache of canonical position tuples, see `_intern_pos`
+_positions = {}
+
+def _intern_pos(position):
+    """ Return the canonical tuple for `position`.
+
+    Positions are stored in many places (bots, events, histories). Using a
+    single shared tuple for every distinct position keeps the memory footprint
+    of long event streams small and lets equality checks short-circuit on
+    identity.
+
+    Parameters
+    ----------
+    position : tuple or list of int (x, y)
+        the position to intern
+
+    Returns
+    -------
+    position : tuple of int (x, y)
+        the shared tuple for this position
+
+    """
+    if type(position) is not tuple:
+        position = tuple(position)
+    return _positions.setdefault(position, position)
+
 def new_pos(position, move):
     """ Adds a position tuple and a move tuple.
 
@@ -48,7 +74,7 @@ def new_pos(position, move):
         raise ValueError("%s is not a valid move tuple" % repr(move))
     pos_x = position[0] + move[0]
     pos_y = position[1] + move[1]
-    return (pos_x, pos_y)
+    return _intern_pos((pos_x, pos_y))
 
 def diff_pos(initial, target):
     """ Return the move required to move from one pos to another.
@@ -140,6 +166,8 @@ class Team(object):
         the bot indices that belong to this team
 
     """
+    __slots__ = ("index", "name", "zone", "score", "bots")
+
     def __init__(self, index, name, zone, score=0, bots=None):
         self.index = index
         self.name = name
@@ -195,11 +223,23 @@ def __repr__(self):
                 (self.index, self.name, self.zone, self.score, self.bots))
 
     def __eq__(self, other):
-        return type(self) == type(other) and self.__dict__ == other.__dict__
+        return (type(self) == type(other) and
+                self.__getstate__() == other.__getstate__())
 
     def __ne__(self, other):
         return not (self == other)
 
+    def __getstate__(self):
+        return (self.index, self.name, self.zone, self.score, self.bots)
+
+    def __setstate__(self, state):
+        self.index, self.name, self.zone, self.score, self.bots = state
+
+    def __deepcopy__(self, memo):
+        # all attributes but `bots` are immutable
+        return self.__class__(self.index, self.name, self.zone, self.score,
+                              list(self.bots))
+
     def _to_json_dict(self):
         return {"index": self.index,
                 "name": self.name,
@@ -213,6 +253,15 @@ def _from_json_dict(cls, item):
         item["zone"] = tuple(item["zone"])
         return cls(**item)
 
+    def _to_json_list(self):
+        return [self.index, self.name, self.zone[0], self.zone[1],
+                self.score, self.bots]
+
+    @classmethod
+    def _from_json_list(cls, values):
+        index, name, zone_min, zone_max, score, bots = values
+        return cls(index, name, (zone_min, zone_max), score, bots)
+
 @serializable
 class Bot(object):
     """ A bot on a team.
@@ -243,16 +292,19 @@ class Bot(object):
         True if the position is noisy, False if it is exact
 
     """
+    __slots__ = ("index", "initial_pos", "team_index", "homezone",
+                 "current_pos", "noisy")
+
     def __init__(self, index, initial_pos, team_index, homezone,
             current_pos=None, noisy=False):
         self.index = index
-        self.initial_pos = initial_pos
+        self.initial_pos = _intern_pos(initial_pos)
         self.team_index = team_index
         self.homezone = homezone
         if not current_pos:
             self.current_pos = self.initial_pos
         else:
-            self.current_pos = current_pos
+            self.current_pos = _intern_pos(current_pos)
         self.noisy = noisy
 
     @property
@@ -272,11 +324,26 @@ def _reset(self):
         self.current_pos = self.initial_pos
 
     def __eq__(self, other):
-        return type(self) == type(other) and self.__dict__ == other.__dict__
+        return (type(self) == type(other) and
+                self.__getstate__() == other.__getstate__())
 
     def __ne__(self, other):
         return not (self == other)
 
+    def __getstate__(self):
+        return (self.index, self.initial_pos, self.team_index, self.homezone,
+                self.current_pos, self.noisy)
+
+    def __setstate__(self, state):
+        (self.index, self.initial_pos, self.team_index, self.homezone,
+            self.current_pos, self.noisy) = state
+
+    def __deepcopy__(self, memo):
+        # all attributes are immutable
+        bot = self.__class__.__new__(self.__class__)
+        bot.__setstate__(self.__getstate__())
+        return bot
+
     def __cmp__(self, other):
         if self == other:
             return 0
@@ -303,23 +370,69 @@ def _from_json_dict(cls, item):
             item[tupled_attr] = tuple(item[tupled_attr])
         return cls(**item)
 
+    def _to_json_list(self):
+        initial_pos, homezone, current_pos = (self.initial_pos, self.homezone,
+                                              self.current_pos)
+        return [self.index, initial_pos[0], initial_pos[1], self.team_index,
+                homezone[0], homezone[1], current_pos[0], current_pos[1],
+                self.noisy]
+
+    @classmethod
+    def _from_json_list(cls, values):
+        (index, initial_x, initial_y, team_index, zone_min, zone_max,
+         current_x, current_y, noisy) = values
+        return cls(index, (initial_x, initial_y), team_index,
+                   (zone_min, zone_max), (current_x, current_y), noisy)
+
 class UniverseEvent(object):
-    """ Base class for all events in a Universe. """
+    """ Base class for all events in a Universe.
+
+    Events are small value objects. Subclasses list their attributes in
+    `__slots__`, which is also used for equality, copying and serialisation.
+    """
+    __slots__ = ()
 
     def __eq__(self, other):
-        return type(self) == type(other) and self.__dict__ == other.__dict__
+        if self is other:
+            return True
+        if type(self) != type(other):
+            return False
+        for name in self.__slots__:
+            if getattr(self, name) != getattr(other, name):
+                return False
+        return True
 
     def __ne__(self, other):
         return not (self == other)
 
+    def __getstate__(self):
+        return tuple([getattr(self, name) for name in self.__slots__])
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def __deepcopy__(self, memo):
+        # all attributes are immutable
+        event = self.__class__.__new__(self.__class__)
+        event.__setstate__(self.__getstate__())
+        return event
+
     def _to_json_dict(self):
-        return dict(self.__dict__)
+        return dict(zip(self.__slots__, self.__getstate__()))
 
     @classmethod
     def _from_json_dict(cls, item):
         # Events must take care to convert tuples in their __init__ method
         return cls(**item)
 
+    def _to_json_list(self):
+        return list(self.__getstate__())
+
+    @classmethod
+    def _from_json_list(cls, values):
+        return cls(*values)
+
 @serializable
 class BotMoves(UniverseEvent):
     """ Signifies that a bot has moved.
@@ -330,10 +443,12 @@ class BotMoves(UniverseEvent):
         index of the bot
 
     """
+    __slots__ = ("bot_index", "old_pos", "new_pos")
+
     def __init__(self, bot_index, old_pos, new_pos):
         self.bot_index = bot_index
-        self.old_pos = tuple(old_pos)
-        self.new_pos = tuple(new_pos)
+        self.old_pos = _intern_pos(old_pos)
+        self.new_pos = _intern_pos(new_pos)
 
     def __repr__(self):
         return ('BotMoves(%i, %r, %r)'
@@ -349,9 +464,11 @@ class BotEats(UniverseEvent):
         index of the bot
 
     """
+    __slots__ = ("bot_index", "food_pos")
+
     def __init__(self, bot_index, food_pos):
         self.bot_index = bot_index
-        self.food_pos = tuple(food_pos)
+        self.food_pos = _intern_pos(food_pos)
 
     def __repr__(self):
         return ('BotEats(%i, %r)'
@@ -367,8 +484,10 @@ class FoodEaten(UniverseEvent):
         position of the eaten food
 
     """
+    __slots__ = ("food_pos",)
+
     def __init__(self, food_pos):
-        self.food_pos = tuple(food_pos)
+        self.food_pos = _intern_pos(food_pos)
 
     def __repr__(self):
         return 'FoodEaten(%s)' % repr(self.food_pos)
@@ -386,6 +505,8 @@ class TeamScoreChange(UniverseEvent):
     new_score : int
         the new score
     """
+    __slots__ = ("team_index", "score_change", "new_score")
+
     def __init__(self, team_index, score_change, new_score):
         self.team_index = team_index
         self.score_change = score_change
@@ -417,16 +538,20 @@ class BotDestroyed(UniverseEvent):
         the position after moving
 
     """
+    __slots__ = ("harvester_index", "harvester_old_pos",
+                 "harvester_new_pos", "harvester_reset", "destroyer_index",
+                 "destroyer_old_pos", "destroyer_new_pos")
+
     def __init__(self, harvester_index, harvester_old_pos,
             harvester_new_pos, harvester_reset,
             destroyer_index, destroyer_old_pos, destroyer_new_pos):
         self.harvester_index = harvester_index
-        self.harvester_old_pos = tuple(harvester_old_pos)
-        self.harvester_new_pos = tuple(harvester_new_pos)
-        self.harvester_reset = tuple(harvester_reset)
+        self.harvester_old_pos = _intern_pos(harvester_old_pos)
+        self.harvester_new_pos = _intern_pos(harvester_new_pos)
+        self.harvester_reset = _intern_pos(harvester_reset)
         self.destroyer_index = destroyer_index
-        self.destroyer_old_pos = tuple(destroyer_old_pos)
-        self.destroyer_new_pos = tuple(destroyer_new_pos)
+        self.destroyer_old_pos = _intern_pos(destroyer_old_pos)
+        self.destroyer_new_pos = _intern_pos(destroyer_new_pos)
 
     def __repr__(self):
         return ('BotDestroyed(%i, %r, %r, %r, %i, %r, %r)'
@@ -445,6 +570,8 @@ class TimeoutEvent(UniverseEvent):
         index of the team which had the timeout
 
     """
+    __slots__ = ("team_index",)
+
     def __init__(self, team_index):
         self.team_index = team_index
 
@@ -461,6 +588,8 @@ class TeamWins(UniverseEvent):
         index of the winning team
 
     """
+    __slots__ = ("winning_team_index",)
+
     def __init__(self, winning_team_index):
         self.winning_team_index = winning_team_index
 
@@ -472,6 +601,8 @@ def __repr__(self):
 class GameDraw(UniverseEvent):
     """ Signifies that the game was a draw.
     """
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -635,6 +766,21 @@ def __repr__(self):
         return ('Maze(%i, %i, data=%r)'
             % (self.width, self.height, self._data))
 
+    def _to_json_list(self):
+        # the cells only hold component chars, so a single string
+        # is much shorter than a list of strings
+        data = ",".join(self._data)
+        if data.count(",") != len(self._data) - 1:
+            data = list(self._data)
+        return [self.width, self.height, data]
+
+    @classmethod
+    def _from_json_list(cls, values):
+        width, height, data = values
+        if isinstance(data, basestring):
+            data = data.split(",")
+        return cls(width, height, data)
+
 
 def create_maze(layout_mesh):
     """ Transforms a layout_mesh into a Maze.
@@ -706,7 +852,7 @@ def create_CTFUniverse(layout_str, number_bots,
     UniverseException
         if the number of bots or layout width are odd
     LayoutEncodingException
-        if there is something wrong with the layout_str, see `Layout()`
+        if there is something wrong with the layout_str, see `parse_layout()`
 
     """
     if team_names is None:
@@ -718,10 +864,13 @@ def create_CTFUniverse(layout_str, number_bots,
         raise UniverseException(
             "Number of bots in CTF must be even, is: %i"
             % number_bots)
-    layout = Layout(layout_str, layout_chars, number_bots)
-    layout_mesh = layout.as_mesh()
-    initial_pos = extract_initial_positions(layout_mesh, number_bots)
-    maze = create_maze(layout_mesh)
+    (width, height), data, initial_pos = parse_layout(layout_str, layout_chars,
+                                                      number_bots, Free.char)
+    # the maze cells of each layout character
+    cells = {Wall.char: Wall.char, Free.char: Free.char, Food.char: Free.char + Food.char}
+    maze = Maze(width, height)
+    # all cells are strings; no need for the checks of the constructor
+    maze._set_data(map(cells.__getitem__, data))
     if maze.width % 2 != 0:
         raise UniverseException(
             "Width of a layout for CTF must be even, is: %i"
@@ -1103,3 +1252,17 @@ def _to_json_dict(self):
     def _from_json_dict(cls, item):
         return cls(**item)
 
+    def _to_json_list(self):
+        # maze, teams and bots are always of the same type,
+        # so they do not need to be tagged
+        return [self.maze._to_json_list(),
+                [team._to_json_list() for team in self.teams],
+                [bot._to_json_list() for bot in self.bots]]
+
+    @classmethod
+    def _from_json_list(cls, values):
+        maze, teams, bots = values
+        return cls(Maze._from_json_list(maze),
+                   [Team._from_json_list(team) for team in teams],
+                   [Bot._from_json_list(bot) for bot in bots])
+
@@ -7,7 +7,7 @@
 import sys
 from .containers import TypeAwareList
 from . import datamodel
-from .viewer import AbstractViewer
+from .viewer import AbstractViewer, ViewerDispatcher
 from .graph import AdjacencyList
 
 __docformat__ = "restructuredtext"
@@ -15,7 +15,16 @@
 MAX_TIMEOUTS = 5
 
 class PlayerTimeout(Exception):
-    pass
+    """ Raised when a player did not return its move in time.
+
+    Parameters
+    ----------
+    provisional_move : tuple of (int, int), optional
+        the last provisional move the player announced before the deadline
+    """
+    def __init__(self, provisional_move=None):
+        super(PlayerTimeout, self).__init__()
+        self.provisional_move = provisional_move
 
 class PlayerDisconnected(Exception):
     pass
@@ -46,7 +55,9 @@ class GameMaster(object):
     player_teams : list
         the participating player teams
     viewers : list of subclasses of AbstractViewer
-        the viewers that are observing this game
+        the viewers that are observing this game synchronously
+    viewer_dispatcher : ViewerDispatcher
+        feeds the viewers that are observing this game in the background
 
     """
     def __init__(self, layout, number_bots, game_time, noise=True):
@@ -57,6 +68,7 @@ def __init__(self, layout, number_bots, game_time, noise=True):
         self.player_teams = []
         self.player_teams_timeouts = []
         self.viewers = []
+        self.viewer_dispatcher = ViewerDispatcher()
 
     def register_team(self, team, team_name=""):
         """ Register a client TeamPlayer class.
@@ -76,12 +88,26 @@ def register_team(self, team, team_name=""):
         if team_name:
             self.universe.teams[team_idx].name = team_name
 
-    def register_viewer(self, viewer):
+    def register_viewer(self, viewer, background=False, maxsize=1,
+                        policy="coalesce"):
         """ Register a viewer to display the game state as it progresses.
 
+        By default, the viewer is called synchronously from within the game
+        loop. A `background` viewer gets its own thread and queue instead,
+        so that it cannot slow down the game. If it lags behind, queued
+        states are handled according to `policy` (see `ViewerQueue`).
+        Background viewers share their game states and must not modify
+        them.
+
         Parameters
         ----------
         viewer : subclass of AbstractViewer
+        background : boolean, optional, default = False
+            observe the game from a background thread
+        maxsize : int, optional, default = 1
+            the maximum number of queued states for a background viewer
+        policy : string, optional, default = "coalesce"
+            one of "block", "drop" or "coalesce"
 
         """
         if (viewer.__class__.observe.__func__ ==
@@ -89,7 +115,10 @@ def register_viewer(self, viewer):
             raise TypeError("Viewer %s does not override 'observe()'."
                     % viewer.__class__)
         viewer.set_initial(self.universe.copy())
-        self.viewers.append(viewer)
+        if background:
+            self.viewer_dispatcher.add_viewer(viewer, maxsize, policy)
+        else:
+            self.viewers.append(viewer)
 
     def send_to_viewers(self, round_index, turn, events):
         """ Call the 'observe' method on all registered viewers.
@@ -110,6 +139,13 @@ def send_to_viewers(self, round_index, turn, events):
                     self.universe.copy(),
                     copy.deepcopy(events))
 
+        if self.viewer_dispatcher:
+            # a single snapshot is shared by all background viewers
+            self.viewer_dispatcher.publish(round_index,
+                    turn,
+                    self.universe.copy(),
+                    copy.deepcopy(events))
+
     def set_initial(self):
         """ This method needs to be called before a game is started.
         It notifies the PlayerTeams of the initial universes and their
@@ -124,6 +160,13 @@ def set_initial(self):
 
     def play(self):
         """ Play a whole game. """
+        try:
+            self._play()
+        finally:
+            # let the background viewers catch up with the game
+            self.viewer_dispatcher.stop()
+
+    def _play(self):
         # notify all PlayerTeams
         self.set_initial()
 
@@ -154,32 +197,33 @@ def play_round(self, round_index):
         """
         for i, bot in enumerate(self.universe.bots):
             player_team = self.player_teams[bot.team_index]
+            timed_out = False
             try:
                 universe_copy = self.universe.copy()
                 if self.noiser:
                     universe_copy = self.noiser.uniform_noise(universe_copy, i)
-                move = player_team._get_move(bot.index, universe_copy)
+                try:
+                    move = player_team._get_move(bot.index, universe_copy)
+                except PlayerTimeout as e:
+                    if e.provisional_move is None:
+                        raise
+                    # The player told us its best move so far. We use it
+                    # instead of a random move, but it is still a timeout.
+                    sys.stderr.write("Timeout for team %r (bot index %r). Using provisional move.\n" % (
+                        bot.team_index,
+                        bot.index))
+                    timed_out = True
+                    move = e.provisional_move
                 events = self.universe.move_bot(i, move)
+                if timed_out:
+                    events.append(datamodel.TimeoutEvent(bot.team_index))
+                    self._count_timeout(bot, events)
             except (datamodel.IllegalMoveException, PlayerTimeout) as e:
                 events = TypeAwareList(base_class=datamodel.UniverseEvent)
                 events.append(datamodel.TimeoutEvent(bot.team_index))
 
-                if isinstance(e, PlayerTimeout):
-                    # after MAX_TIMEOUTS timeouts, you lose
-                    self.player_teams_timeouts[bot.team_index] += 1
-
-                    if self.player_teams_timeouts[bot.team_index] == MAX_TIMEOUTS:
-                        other_team_idx = not bot.team_index
-                        events.append(datamodel.TeamWins(other_team_idx))
-                        sys.stderr.write("Timeout #%r for team %r (bot index %r).\n" % (
-                            self.player_teams_timeouts[bot.team_index],
-                            bot.team_index,
-                            bot.index))
-                    else:
-                        sys.stderr.write("Timeout #%r for team %r (bot index %r). Team disqualified.\n" % (
-                            self.player_teams_timeouts[bot.team_index],
-                            bot.team_index,
-                            bot.index))
+                if timed_out or isinstance(e, PlayerTimeout):
+                    self._count_timeout(bot, events)
 
                 moves = self.universe.get_legal_moves(bot.current_pos).keys()
                 moves.remove(datamodel.stop)
@@ -202,18 +246,40 @@ def play_round(self, round_index):
             self.print_possible_winner(events)
 
             self.send_to_viewers(round_index, i, events)
-            if datamodel.TeamWins in events or datamodel.GameDraw in events:
+            if events.has(datamodel.TeamWins) or events.has(datamodel.GameDraw):
                 return False
         return True
 
+    def _count_timeout(self, bot, events):
+        """ Counts a timeout of the team of `bot`. After MAX_TIMEOUTS
+        timeouts, the team loses and a TeamWins event for the other team
+        is added to `events`.
+        """
+        self.player_teams_timeouts[bot.team_index] += 1
+
+        if self.player_teams_timeouts[bot.team_index] == MAX_TIMEOUTS:
+            other_team_idx = not bot.team_index
+            if not events.has(datamodel.TeamWins):
+                events.append(datamodel.TeamWins(other_team_idx))
+            sys.stderr.write("Timeout #%r for team %r (bot index %r).\n" % (
+                self.player_teams_timeouts[bot.team_index],
+                bot.team_index,
+                bot.index))
+        else:
+            sys.stderr.write("Timeout #%r for team %r (bot index %r). Team disqualified.\n" % (
+                self.player_teams_timeouts[bot.team_index],
+                bot.team_index,
+                bot.index))
+
     def print_possible_winner(self, events):
         """ Checks the event list for a potential winner and prints this information.
 
         This is needed for scripts parsing the output.
         """
-        if datamodel.TeamWins(0) in events:
-            winner = self.universe.teams[0]
-            loser = self.universe.teams[1]
+        team_wins = events.first(datamodel.TeamWins)
+        if team_wins is not None:
+            winner = self.universe.teams[team_wins.winning_team_index]
+            loser = self.universe.teams[not team_wins.winning_team_index]
             print "Finished. %r won over %r. (%r:%r)" % (
                     winner.name, loser.name,
                     winner.score, loser.score
@@ -221,15 +287,7 @@ def print_possible_winner(self, events):
             # We must manually flush, else our forceful stopping of Tk
             # won't let us pipe it.
             sys.stdout.flush()
-        elif datamodel.TeamWins(1) in events:
-            winner = self.universe.teams[1]
-            loser = self.universe.teams[0]
-            print "Finished. %r won over %r. (%r:%r)" % (
-                    winner.name, loser.name,
-                    winner.score, loser.score
-                )
-            sys.stdout.flush()
-        elif datamodel.GameDraw() in events:
+        elif events.has(datamodel.GameDraw):
             t0 = self.universe.teams[0]
             t1 = self.universe.teams[1]
             print "Finished. %r and %r had a draw. (%r:%r)" % (
@@ -4,7 +4,8 @@
 
 from collections import deque
 import heapq
-from .datamodel import Free, manhattan_dist
+from .datamodel import Free, Wall, manhattan_dist
+from .containers import Mesh
 
 __docformat__ = "restructuredtext"
 
@@ -184,3 +185,181 @@ def a_star(self, initial, target):
         # The last element is the current position, we don't need that in our
         # path, so don't include it.
         return path[:-1]
+
+
+class LayoutInfo(object):
+    """ Static features of a maze, which do not change during a game.
+
+    All features are computed once when the object is created. Use
+    `LayoutInfo.for_maze()`, which returns the cached features of
+    mazes with the same walls.
+
+    Parameters
+    ----------
+    width : int
+        the width of the maze
+    height : int
+        the height of the maze
+    free : set of tuple of (int, int)
+        the positions which are not a wall
+
+    Attributes
+    ----------
+    free : frozenset of tuple of (int, int)
+        the positions which are not a wall
+    adjacency : dict of tuple of (int, int) to tuple
+        the free neighbours of each free position
+    articulation_points : frozenset of tuple of (int, int)
+        the chokepoints; positions whose blocking splits the maze
+    dead_end_depth : Mesh of int
+        for positions in a dead end, the number of steps to leave it,
+        otherwise 0
+    corridors : list of tuple of tuple of (int, int)
+        the maximal chains of positions with exactly two neighbours,
+        in the order of the chain
+    team_borders : list of list of tuple of (int, int)
+        the free positions of the last column in the zone of each team
+        of a capture the flag game (see `CTFUniverse.team_border`)
+    border_distance : list of Mesh
+        the number of steps from each position to the nearest border
+        position of each team (None for walls and unreachable positions)
+
+    """
+    # the features of the recently used mazes
+    _cache = {}
+    _cache_size = 16
+
+    def __init__(self, width, height, free):
+        self.width = width
+        self.height = height
+        self.free = frozenset(free)
+
+        self.adjacency = {}
+        for x, y in self.free:
+            self.adjacency[(x, y)] = tuple(pos for pos in
+                    ((x, y - 1), (x + 1, y), (x, y + 1), (x - 1, y))
+                    if pos in self.free)
+
+        self.articulation_points = self._articulation_points()
+        self.dead_end_depth = self._dead_end_depth()
+        self.corridors = self._corridors()
+        self.team_borders = [
+            [(border_x, y) for y in range(height) if (border_x, y) in self.free]
+            for border_x in (width // 2 - 1, width // 2)]
+        self.border_distance = [self.distances(border)
+                                for border in self.team_borders]
+
+    @classmethod
+    def for_maze(cls, maze):
+        """ Returns the (possibly cached) `LayoutInfo` of `maze`. """
+        walls = "".join("#" if Wall.char in cell else " " for cell in maze._data)
+        key = (maze.width, maze.height, walls)
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        free = [maze._index_linear_to_tuple(index)
+                for index, char in enumerate(walls) if char != "#"]
+        if len(cls._cache) >= cls._cache_size:
+            cls._cache.clear()
+        info = cls._cache[key] = cls(maze.width, maze.height, free)
+        return info
+
+    def distances(self, sources):
+        """ Breadth first search from all `sources` at once.
+
+        Returns
+        -------
+        distances : Mesh of int
+            the number of steps from each position to the nearest
+            position in `sources` (None for walls and unreachable
+            positions)
+        """
+        distances = Mesh(self.width, self.height)
+        to_visit = deque()
+        for pos in sources:
+            distances[pos] = 0
+            to_visit.append(pos)
+        while to_visit:
+            current = to_visit.popleft()
+            distance = distances[current] + 1
+            for pos in self.adjacency[current]:
+                if distances[pos] is None:
+                    distances[pos] = distance
+                    to_visit.append(pos)
+        return distances
+
+    def _articulation_points(self):
+        # Hopcroft-Tarjan, but without recursion, which would fail
+        # on large mazes
+        index = {}
+        low = {}
+        points = set()
+        for root in sorted(self.adjacency):
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            root_children = 0
+            stack = [(root, None, iter(self.adjacency[root]))]
+            while stack:
+                node, parent, neighbours = stack[-1]
+                for next_ in neighbours:
+                    if next_ not in index:
+                        index[next_] = low[next_] = len(index)
+                        stack.append((next_, node, iter(self.adjacency[next_])))
+                        break
+                    elif next_ != parent:
+                        low[node] = min(low[node], index[next_])
+                else:
+                    # all neighbours of node are done
+                    stack.pop()
+                    if parent is None:
+                        continue
+                    low[parent] = min(low[parent], low[node])
+                    if parent == root:
+                        root_children += 1
+                    elif low[node] >= index[parent]:
+                        points.add(parent)
+            if root_children > 1:
+                points.add(root)
+        return frozenset(points)
+
+    def _dead_end_depth(self):
+        # Remove the dead ends from the maze, starting at their ends.
+        # What remains are the positions on loops.
+        degree = dict((pos, len(neighbours))
+                      for pos, neighbours in self.adjacency.iteritems())
+        to_remove = deque(pos for pos, deg in degree.iteritems() if deg <= 1)
+        removed = set()
+        while to_remove:
+            pos = to_remove.popleft()
+            removed.add(pos)
+            for neighbour in self.adjacency[pos]:
+                if neighbour not in removed:
+                    degree[neighbour] -= 1
+                    if degree[neighbour] == 1:
+                        to_remove.append(neighbour)
+
+        depth = self.distances(self.free - removed)
+        # walls and parts of the maze without a loop
+        depth._set_data([d or 0 for d in depth._data])
+        return depth
+
+    def _corridors(self):
+        corridors = []
+        seen = set()
+        for pos in sorted(self.adjacency):
+            if pos in seen or len(self.adjacency[pos]) != 2:
+                continue
+            seen.add(pos)
+            corridor = deque([pos])
+            for direction, append in zip(self.adjacency[pos],
+                                         (corridor.appendleft, corridor.append)):
+                previous, current = pos, direction
+                while current not in seen and len(self.adjacency[current]) == 2:
+                    seen.add(current)
+                    append(current)
+                    first, second = self.adjacency[current]
+                    previous, current = current, (second if first == previous else first)
+            corridors.append(tuple(corridor))
+        return corridors
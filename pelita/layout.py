@@ -96,6 +96,108 @@ def get_layout_by_name(layout_name):
         raise ValueError("Layout: '%s' is not known." % ke.args)
 
 
+def parse_layout(layout_str, layout_chars, number_bots, free_char=" "):
+    """ Parses and checks a string encoded layout in a single pass.
+
+    Accepts the same layouts as `Layout`: leading and trailing whitespace
+    of each line and empty lines around the maze are ignored.
+
+    Parameters
+    ----------
+    layout_str : str
+        the layout to parse
+    layout_chars : list of str
+        the list of legal characters (without the bot ids)
+    number_bots : int
+        the number of bots to look for
+    free_char : str, optional
+        the character which replaces the bots in `data`
+
+    Returns
+    -------
+    shape : tuple of (int, int)
+        the width and height of the layout
+    data : str
+        the characters of all rows, one after the other, with the bots
+        replaced by `free_char`
+    bot_positions : list of tuple of (int, int)
+        the initial position of each bot
+
+    Raises
+    ------
+    LayoutEncodingException
+        if an illegal character is encountered, a bot-id is specified
+        twice or missing or if the layout is not rectangular. The message
+        tells the line and column (counted from 1) in `layout_str`.
+
+    """
+    bot_ids = [str(i) for i in range(number_bots)]
+    legal = set(layout_chars).union(bot_ids)
+    plain_chars = "".join(layout_chars)
+    legal_chars = plain_chars + "".join(bot_ids)
+
+    rows = []
+    bot_positions = [None] * number_bots
+    bot_origins = [None] * number_bots
+    width = None
+    # empty lines after the last row are only allowed at the end
+    empty_line = None
+    for line_no, raw_line in enumerate(layout_str.split("\n"), 1):
+        line = raw_line.strip()
+        if not line:
+            if rows and empty_line is None:
+                empty_line = line_no
+            continue
+        column = len(raw_line) - len(raw_line.lstrip()) + 1
+        if empty_line is not None:
+            raise LayoutEncodingException(
+                "The layout must be rectangular, line %i is empty" % empty_line)
+
+        if isinstance(line, str):
+            illegal = line.translate(None, legal_chars)
+        else:
+            illegal = [c for c in line if c not in legal]
+        if illegal:
+            raise LayoutEncodingException(
+                "Char: '%c' is not a legal layout character (line %i, column %i)"
+                % (illegal[0], line_no, column + line.index(illegal[0])))
+
+        if width is None:
+            width = len(line)
+        elif len(line) != width:
+            raise LayoutEncodingException(
+                "The layout must be rectangular, line %i has length %i instead of %i"
+                % (line_no, len(line), width))
+
+        if isinstance(line, str):
+            has_bots = line.translate(None, plain_chars)
+        else:
+            has_bots = [c for c in line if c not in layout_chars]
+        if has_bots:
+            y = len(rows)
+            for x, char in enumerate(line):
+                if char in layout_chars:
+                    continue
+                bot = int(char)
+                if bot_positions[bot] is not None:
+                    raise LayoutEncodingException(
+                        "Bot-ID: '%c' was specified twice (line %i, column %i and line %i, column %i)"
+                        % ((char,) + bot_origins[bot] + (line_no, column + x)))
+                bot_positions[bot] = (x, y)
+                bot_origins[bot] = (line_no, column + x)
+            for char in bot_ids:
+                line = line.replace(char, free_char)
+        rows.append(line)
+
+    missing = [bot_id for bot_id, pos in zip(bot_ids, bot_positions) if pos is None]
+    if missing:
+        raise LayoutEncodingException(
+            'Layout is invalid for %i bots, The following IDs were missing: %s '
+            % (number_bots, missing))
+
+    return (width or 0, len(rows)), "".join(rows), bot_positions
+
+
 class Layout(object):
     """ Auxiliary class to parse string encodings of mazes.
 
@@ -122,6 +122,11 @@ def hello(self, what):
     res = client.query("hello", ["World!"])
     print res.get(3)
 
+If all actors run on the same host, a Unix domain socket may be used instead::
+
+    remote = RemoteConnection().start_unix_listener("/tmp/pelita.sock")
+    client = RemoteConnection().unix_actor_for("main-actor", "/tmp/pelita.sock")
+
 Finally, the remote connection must be closed (which also stops all remote
 actors)::
 
@@ -142,6 +147,8 @@ def hello(self, what):
 
 from .messages import Query, Notification, Response, Error, BaseMessage
 from .actor import (Actor, BaseActorReference, ActorReference, DispatchingActor,
-                    expose, DeadConnection, StopProcessing, Request,
+                    expose, DeadConnection, StopProcessing, Request, AnytimeRequest,
+                    gather, PriorityInbox, PRIORITY_LOW, PRIORITY_NORMAL, PRIORITY_HIGH,
                     actor_of, actor_registry, Exit, ActorNotRunning)
 from .remote_actor import RemoteActorReference, RemoteConnection
+from .metrics import metrics, MetricsLogger, Histogram
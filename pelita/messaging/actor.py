@@ -6,18 +6,26 @@
 
 
 import Queue
+import collections
+import time
 import uuid
 import inspect
-from threading import Lock
+from threading import Lock, Event, Condition
 
 import logging
 _logger = logging.getLogger("pelita.actor")
 _logger.setLevel(logging.DEBUG)
 
 from ..utils import SuspendableThread, CloseThread
+from .metrics import metrics
 
 __docformat__ = "restructuredtext"
 
+# Messages with a higher priority are handled first.
+PRIORITY_LOW = -10
+PRIORITY_NORMAL = 0
+PRIORITY_HIGH = 10
+
 class Channel(object):
     """ A `Channel` is an object which may be sent a message.
 
@@ -43,16 +51,43 @@ class Request(Channel):
     query and a reference to it is passed to the `Actor`.
 
     The `Actor` may then reply to the `Request` exactly once.
+    Further replies are ignored.
     """
+    # Completing a request takes only a moment, so all requests share
+    # a single lock instead of allocating one each.
+    _complete_lock = Lock()
+
     def __init__(self):
-        self._queue = Queue.Queue(maxsize=1)
+        self._event = Event()
+        self._result = None
+        self._error = None
 
     def put(self, message, channel=None, remote=None):
         """ Sets the result of the Request to `message`.
 
         The other arguments will be discarded.
         """
-        self._queue.put(message)
+        if not self._complete(message, None):
+            _logger.debug("Request %r already has a result. Ignoring %r.", self, message)
+
+    def fail(self, error):
+        """ Completes the Request without a result. `get` raises
+        `error` instead (e.g. a `DeadConnection`, if the reply
+        cannot arrive anymore).
+        """
+        self._complete(None, error)
+
+    def _complete(self, result, error):
+        """ Sets the result or the error, unless the Request has been
+        completed before. Returns True, if it was the first completion.
+        """
+        with self._complete_lock:
+            if self._event.is_set():
+                return False
+            self._result = result
+            self._error = error
+            self._event.set()
+        return True
 
     def get(self, timeout=3):
         """ Returns the result of the Request (if it is there).
@@ -63,31 +98,94 @@ def get(self, timeout=3):
         timeout : float, optional
             the time in seconds to wait.
             default = None (no timeout)
+
+        Raises
+        ------
+        Queue.Empty
+            if there is no result after `timeout` seconds
+        Exception
+            the error of a failed Request (see `fail`)
         """
         if timeout == 0:
-            block = False
+            ready = self._event.is_set()
         else:
-            block = True
-
-        return self._queue.get(block, timeout)
+            ready = self._event.wait(timeout)
+        if not ready:
+            raise Queue.Empty
+        if self._error is not None:
+            raise self._error
+        return self._result
 
     def get_or_none(self, timeout=0):
         """Returns the result or None, if the value is not available."""
         try:
-            return self._queue.get(timeout).result
+            return self.get(timeout)
         except Queue.Empty:
             return None
 
     def has_result(self):
-        """Checks whether a result is available.
+        """Checks whether a result is available."""
+        return self._event.is_set()
+
+def gather(requests, timeout=3):
+    """ Waits for the results of all `requests` with a single deadline.
+
+    Parameters
+    ----------
+    requests : list of Request
+        the requests to wait for
+    timeout : float, optional
+        the total time in seconds to wait for all results.
+        default = 3, None means no timeout
+
+    Returns
+    -------
+    results : list
+        the results in the order of `requests`
+
+    Raises
+    ------
+    Queue.Empty
+        if not all results are available before the deadline
+    """
+    if timeout is None:
+        return [request.get(None) for request in requests]
+
+    deadline = time.time() + timeout
+    results = []
+    for request in requests:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            remaining = 0
+        results.append(request.get(remaining))
+    return results
+
+class AnytimeRequest(Request):
+    """ A `Request` which may receive provisional results before the
+    final result arrives.
+
+    A provisional result is sent as a message of the form
+    ``{"provisional": value}``; it replaces any earlier provisional result
+    and does not complete the request. Every other message is treated as
+    the final result.
+    """
+    def __init__(self):
+        super(AnytimeRequest, self).__init__()
+        self._provisional = None
+        self._lock = Lock()
 
-        This method does not guarantee that a subsequent call of Request.get() will succeed,
-        because the result could have been removed by another thread.
+    def put(self, message, channel=None, remote=None):
+        if isinstance(message, dict) and message.keys() == ["provisional"]:
+            with self._lock:
+                self._provisional = message["provisional"]
+        else:
+            super(AnytimeRequest, self).put(message, channel, remote)
 
-        However, unless there is code which calls get() in the background, this method
-        should be save to use.
-        """
-        return self._queue.full()
+    @property
+    def provisional(self):
+        """ The latest provisional result or None. """
+        with self._lock:
+            return self._provisional
 
 class DeadConnection(Exception):
     """Raised when the connection is lost."""
@@ -110,6 +208,8 @@ def __init__(self, **kwargs):
         super(BaseActor, self).__init__(**kwargs)
 
         self._ref = None
+        # the name in the actor_registry, if any
+        self._name = None
 
         self._trap_exit = False
         self._linked_actors = []
@@ -148,6 +248,7 @@ def _run(self):
             raise CloseThread()
 
         # default
+        start = time.time() if metrics.enabled else None
         try:
             _logger.debug("Received message %r.", message)
             self.ref._current_message = message
@@ -160,9 +261,13 @@ def _run(self):
             self.ref._channel = None
             self.ref._remote = None
         except Exception as e:
+            if start is not None:
+                metrics.for_actor(self).record_handled(message, time.time() - start, failed=True)
             exit_msg = Exit(self, e)
             self._exit_linked(exit_msg)
             raise
+        if start is not None:
+            metrics.for_actor(self).record_handled(message, time.time() - start)
 
     def _exit_linked(self, exit_msg):
         """ If an exception occurred, tell every linked actor.
@@ -197,35 +302,153 @@ def start(self):
     def stop(self):
         super(BaseActor, self).stop()
         self.on_stop()
+        metrics.actor_stopped(self)
 
     def handle_inbox(self):
         pass
 
+class PriorityInbox(object):
+    """ A queue for the inbox of an `Actor` which returns the items
+    with the highest ``"priority"`` first. Items with the same priority
+    are returned in the order they were put.
+
+    To keep a constant stream of urgent messages from starving the
+    others, every `starvation_limit` consecutive times an item has been
+    preferred over an older one, the oldest waiting item is returned
+    instead.
+
+    The interface follows `Queue.Queue`.
+
+    Parameters
+    ----------
+    starvation_limit : int, optional
+        the number of times older items may be passed over.
+        default = 10
+    """
+    def __init__(self, starvation_limit=10):
+        self.starvation_limit = starvation_limit
+        self._levels = {}
+        self._priorities = []
+        self._counter = 0
+        self._passed_over = 0
+        self._size = 0
+        self._not_empty = Condition(Lock())
+
+    def put(self, item, block=True, timeout=None):
+        priority = item.get("priority", PRIORITY_NORMAL)
+        with self._not_empty:
+            level = self._levels.get(priority)
+            if level is None:
+                level = self._levels[priority] = collections.deque()
+                self._priorities = sorted(self._levels, reverse=True)
+            self._counter += 1
+            level.append((self._counter, item))
+            self._size += 1
+            self._not_empty.notify()
+
+    def put_nowait(self, item):
+        self.put(item, False)
+
+    def get(self, block=True, timeout=None):
+        """ Removes and returns the next item.
+
+        Raises
+        ------
+        Queue.Empty
+            if no item is available (after `timeout` seconds)
+        """
+        with self._not_empty:
+            if not block:
+                if not self._size:
+                    raise Queue.Empty
+            elif timeout is None:
+                while not self._size:
+                    self._not_empty.wait()
+            else:
+                deadline = time.time() + timeout
+                while not self._size:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise Queue.Empty
+                    self._not_empty.wait(remaining)
+            return self._pop()
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def _pop(self):
+        waiting = [self._levels[priority] for priority in self._priorities
+                   if self._levels[priority]]
+        level = waiting[0]
+        if len(waiting) > 1:
+            oldest = min(waiting, key=lambda level: level[0][0])
+            if oldest is not level:
+                self._passed_over += 1
+                if self._passed_over > self.starvation_limit:
+                    self._passed_over = 0
+                    level = oldest
+        else:
+            self._passed_over = 0
+
+        self._size -= 1
+        return level.popleft()[1]
+
+    def qsize(self):
+        with self._not_empty:
+            return self._size
+
+    def empty(self):
+        return not self.qsize()
+
 class Actor(BaseActor):
     # TODO Handle messages not replied to – else the queue is waiting forever
     def __init__(self, inbox=None, **kwargs):
-        self._inbox = inbox or Queue.Queue()
+        self._inbox = inbox or PriorityInbox()
 
         super(Actor, self).__init__(**kwargs)
 
     def handle_inbox(self):
-        """ Reads the next item from the Queue or raises Queue.Empty
+        """ Waits for the next item in the Queue.
+
+        There is no need for a timeout, since `stop` puts a message
+        into the Queue which wakes up the waiting thread.
         """
-        msg = self._inbox.get(True, 3)
+        msg = self._inbox.get(True)
+        if "time" in msg:
+            metrics.for_actor(self).record_dequeue(msg["time"], self._inbox.qsize())
         return (msg.get("message"),
                 msg.get("channel"),
                 msg.get("priority", 0),
                 msg.get("remote"))
 
-    def put(self, message, channel=None, remote=None):
+    def put(self, message, channel=None, remote=None, priority=None):
+        if priority is None:
+            priority = self.priority_for(message)
         msg = {
             "message": message,
             "channel": channel,
             "remote": remote,
-            "priority": 0
+            "priority": priority
         }
+        if metrics.enabled and message is not StopProcessing:
+            msg["time"] = time.time()
+            metrics.for_actor(self).received += 1
         self._inbox.put(msg)
 
+    def stop(self):
+        super(Actor, self).stop()
+        # wake up the thread, if it is waiting for a message
+        self._inbox.put({"message": StopProcessing, "priority": PRIORITY_HIGH})
+
+    def priority_for(self, message):
+        """ Returns the priority with which `message` is put into
+        the inbox. May be overridden.
+        """
+        if message is StopProcessing:
+            # process everything which is already waiting
+            return PRIORITY_LOW
+        return PRIORITY_NORMAL
+
 class BaseActorReference(Channel):
     """ An `ActorReference` is used to send all requests and notifications
     to the actor. It also holds the currently processed message and information
@@ -276,15 +499,49 @@ def notify(self, method, params=None, channel=None):
                    "params": params}
         self.put(message=message, channel=channel)
 
-    def query(self, method, params=None):
+    def query(self, method, params=None, request=None):
+        """ Sends a message and returns a `Request` for the reply.
+
+        A custom `request` object (e.g. an `AnytimeRequest`) may be given.
+        """
         query = {"method": method,
                  "params": params}
-        req_obj = Request()
+        req_obj = request if request is not None else Request()
 
         self.put(message=query, channel=req_obj)
 
         return req_obj
 
+    def query_batch(self, queries):
+        """ Sends several queries at once and returns their `Request` objects.
+
+        Remote references send all queries in a single frame. Use `gather()`
+        to wait for all results with a single deadline::
+
+            requests = ref.query_batch([("mult", [1, 2]), ("mult", [3, 4])])
+            results = gather(requests, 3)
+
+        Parameters
+        ----------
+        queries : list of (method, params)
+            the queries to send
+        """
+        messages = []
+        requests = []
+        for method, params in queries:
+            req_obj = Request()
+            messages.append(({"method": method, "params": params}, req_obj))
+            requests.append(req_obj)
+
+        self.put_batch(messages)
+
+        return requests
+
+    def put_batch(self, messages):
+        """ Puts several (message, channel) pairs. """
+        for message, channel in messages:
+            self.put(message=message, channel=channel)
+
 class ActorReference(BaseActorReference):
     def __init__(self, actor, **kwargs):
         self._actor = actor
@@ -359,13 +616,97 @@ def stop(self):
     def __repr__(self):
         return "%s(%s)" % (self.__class__, self._actor)
 
-def expose(method=None, name=None):
-    if name and not method:
-        return lambda fun: expose(fun, name)
+def expose(method=None, name=None, priority=None):
+    """ Marks a method of a `DispatchingActor` as callable by messages.
+
+    Parameters
+    ----------
+    name : string, optional
+        the name under which the method is called. default = method name
+    priority : int, optional
+        the inbox priority of messages for this method.
+        default = PRIORITY_NORMAL
+    """
+    if not method:
+        return lambda fun: expose(fun, name, priority)
     method.__expose = True
     method.__expose_as = name
+    method.__expose_priority = priority
     return method
 
+class _Signature(object):
+    """ The precomputed signature of an exposed method, which is used
+    to check the parameters of a message before the method is called.
+    """
+    __slots__ = ("args", "required", "maximum", "keywords")
+
+    def __init__(self, method):
+        args, varargs, keywords, defaults = inspect.getargspec(method)
+        if inspect.ismethod(method):
+            # self or cls
+            args = args[1:]
+        self.args = tuple(args)
+        self.required = len(args) - len(defaults or ())
+        self.maximum = len(args) if varargs is None else float("inf")
+        self.keywords = keywords is not None
+
+    def check(self, params):
+        """ Returns a description of the problem, if the method cannot
+        be called with `params`, else None.
+        """
+        if type(params) is list and self.required <= len(params) <= self.maximum:
+            # the common case
+            return None
+        if params is None:
+            params = ()
+        if isinstance(params, dict):
+            if not self.keywords:
+                for key in params:
+                    if key not in self.args:
+                        return "unexpected keyword argument %r" % key
+            for arg in self.args[:self.required]:
+                if arg not in params:
+                    return "missing argument %r" % arg
+            return None
+
+        try:
+            given = len(params)
+        except TypeError:
+            return "params must be a list or a dict"
+        if not self.required <= given <= self.maximum:
+            return "takes %i to %i arguments (%i given)" % (
+                self.required, len(self.args), given)
+        return None
+
+class _DispatchingMeta(type):
+    """ Builds the dispatch tables of a `DispatchingActor` class
+    once, when the class is created.
+    """
+    def __init__(cls, name, bases, dct):
+        super(_DispatchingMeta, cls).__init__(name, bases, dct)
+
+        cls._dispatch_db = {}
+        cls._priority_db = {}
+        cls._signature_db = {}
+        # search all attributes of this class
+        for member_name in dir(cls):
+            member = getattr(cls, member_name)
+            if getattr(member, "__expose", False):
+                name = getattr(member, "__expose_as", None)
+                if not name:
+                    name = member_name
+                if name in cls._dispatch_db:
+                    raise ValueError("Dispatcher name '%r' defined twice" % name)
+                cls._dispatch_db[name] = member_name
+                priority = getattr(member, "__expose_priority", None)
+                if priority is not None:
+                    cls._priority_db[name] = priority
+                try:
+                    cls._signature_db[name] = _Signature(member)
+                except TypeError:
+                    # no Python function; its parameters are not checked
+                    cls._signature_db[name] = None
+
 class DispatchingActor(Actor):
     """ The `DispatchingActor` allows methods of the form
 
@@ -386,30 +727,26 @@ def some_action(self, *args)
     actor.send("action", params)
 
     Note that `DispatchingActor` overrides `on_receive`.
-    """
 
-    def __new__(cls, *args, **kwargs):
-        cls._init_dispatch_db()
-        return super(DispatchingActor, cls).__new__(cls, *args, **kwargs)
+    The table of exposed methods is built once for each class, and the
+    parameters of a message are checked against the signature of the
+    method before it is called.
+    """
+    __metaclass__ = _DispatchingMeta
 
     def __init__(self, **kwargs):
         super(DispatchingActor, self).__init__(**kwargs)
 
-        self._init_dispatch_db()
+        # bound methods by dispatch name; filled on first use
+        self._bound_methods = {}
 
-    @classmethod
-    def _init_dispatch_db(cls):
-        cls._dispatch_db = {}
-        # search all attributes of this class
-        for member_name in dir(cls):
-            member = getattr(cls, member_name)
-            if getattr(member, "__expose", False):
-                name = getattr(member, "__expose_as", None)
-                if not name:
-                    name = member_name
-                if name in cls._dispatch_db:
-                    raise ValueError("Dispatcher name '%r' defined twice", name)
-                cls._dispatch_db[name] = member_name
+    def priority_for(self, message):
+        """ Returns the priority given to the method in `expose`. """
+        try:
+            method = message["method"]
+            return self._priority_db.get(method.lstrip("?"), PRIORITY_NORMAL)
+        except (TypeError, AttributeError, KeyError):
+            return super(DispatchingActor, self).priority_for(message)
 
     def __reply_error(self, msg):
         """ Called, when an error occurs. We either reply with the error message
@@ -421,8 +758,18 @@ def __reply_error(self, msg):
             _logger.warning(msg)
 
     def __get_method(self, sent_name):
-        local_name = self._dispatch_db.get(sent_name) or ""
-        return getattr(self, local_name, None)
+        """ Returns the bound method for `sent_name` and its signature
+        or (None, None).
+        """
+        try:
+            return self._bound_methods[sent_name]
+        except KeyError:
+            local_name = self._dispatch_db.get(sent_name)
+            if local_name is None:
+                return None, None
+            entry = (getattr(self, local_name), self._signature_db[sent_name])
+            self._bound_methods[sent_name] = entry
+            return entry
 
     def _dispatch(self, message):
         try:
@@ -437,48 +784,38 @@ def _dispatch(self, message):
         if not isinstance(method, basestring):
             return self.__reply_error("'method' must be a string.")
 
-        prefixes = ["?"]
-        method_prefix = ""
-
-        if method and method[0] in prefixes:
-            method_prefix = method[0]
+        doc_request = method[:1] == "?"
+        if doc_request:
             method = method[1:]
 
-        local_method = self.__get_method(method)
+        local_method, signature = self.__get_method(method)
         if not local_method:
             self.on_unhandled(message)
             return
 
-        if method_prefix == "?":
+        if doc_request:
             if self.ref.channel:
                 res = local_method.__doc__
                 self.ref.reply(res)
             else:
                 _logger.warning("Doc requested but no channel given.")
 
-        try:
-            if params is None:
-                local_method()
-            elif isinstance(params, dict):
-                local_method(**params)
-            else:
-                local_method(*params)
-        except TypeError as e:
-            # Must inspect the stack trace, because we cannot
-            # be sure, where the exception happened.
-            # Was it a problem of the Actor, or did the caller
-            # just have a typo somewhere?
-            trace = inspect.trace()
-            if len(trace) > 1:
-                # The exception happened inside the code,
-                # so it is really the Actor’s fault.
-                # This will most probably kill the Actor.
-                raise
-            else:
-                # The exception happened because a non-existing method
-                # got called. Tell the sender what was wrong.
-                self.__reply_error("Type Error: method '%r'\n%r" % (message.get("method"), e))
-            return
+        if signature is not None:
+            problem = signature.check(params)
+            if problem:
+                # The caller has sent wrong parameters.
+                # Tell the sender what was wrong.
+                self.__reply_error("Type Error: method '%r'\n%s" % (message.get("method"), problem))
+                return
+
+        # A TypeError raised from here on is the Actor’s fault.
+        # This will most probably kill the Actor.
+        if params is None:
+            local_method()
+        elif isinstance(params, dict):
+            local_method(**params)
+        else:
+            local_method(*params)
 
 # TODO: Need to consider, if we want to automatically reply the result
 #
@@ -513,6 +850,7 @@ def _check_actor_correctness(actor):
 # the actor_registry should be unique,
 # so we’ll have a lock defined on module basis
 _registry_lock = Lock()
+_registry_changed = Condition(_registry_lock)
 
 class _ActorRegistry(object):
     def __init__(self):
@@ -535,8 +873,10 @@ def register(self, actor, name=None):
 
             if name:
                 self._reg[name] = proxy
+                actor._name = name
 
             self._reg[proxy.uuid] = proxy
+            _registry_changed.notify_all()
 
             return proxy
 
@@ -544,6 +884,22 @@ def get_by_name(self, name, default=None):
         with _registry_lock:
             return self._reg.get(name, default)
 
+    def wait_for_name(self, name, timeout=None, default=None):
+        """ Returns the actor registered as `name`. If there is no such
+        actor yet, waits at most `timeout` seconds for its registration.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with _registry_lock:
+            while name not in self._reg:
+                if deadline is None:
+                    _registry_changed.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return default
+                    _registry_changed.wait(remaining)
+            return self._reg[name]
+
     def get_by_uuid(self, uuid, default=None):
         with _registry_lock:
             return self._reg.get(uuid, default)
@@ -3,7 +3,13 @@
 """ Json conversion helpers. """
 
 import inspect
-import json
+
+try:
+    # simplejson is usually faster than the json module of the
+    # standard library and has the same interface
+    import simplejson as default_backend
+except ImportError:
+    import json as default_backend
 
 __docformat__ = "restructuredtext"
 
@@ -32,9 +38,29 @@ class MyObject(object):
         @json_id("module.MyObject")
         class MyObject(object):
             pass
+
+    Classes with a fixed structure may additionally define a compact
+    encoding: an instancemethod `_to_json_list` which returns the values
+    as a plain list and a classmethod `_from_json_list` which takes it.
+    These objects are serialised as::
+
+        {"__id__": json_id,
+         "__compact__": list of values}
+
+    Both forms are always understood by `decode`.
+
+    Parameters
+    ----------
+    backend : module, optional
+        a module with the interface of `json`, which does the actual work.
+        Defaults to `simplejson`, if it is installed, else to `json`.
+    compact : bool, optional, default = True
+        if False, the compact encoding is never used
     """
-    def __init__(self):
+    def __init__(self, backend=None, compact=True):
         self.reg = {}
+        self.backend = backend or default_backend
+        self.compact = compact
 
     def _guess_encoder(self, class_):
         """ Guesses the standard encoder as `class_._to_json_dict` and
@@ -66,6 +92,18 @@ def _guess_decoder(self, class_):
             raise ValueError("Class '%s' has no classmethod '_from_json_dict'." % class_.__name__)
         return decoder
 
+    def _guess_compact_codec(self, class_):
+        """ Returns the methods `_to_json_list` and `_from_json_list`
+        of `class_` or (None, None), if it does not define both.
+        """
+        encoder = getattr(class_, "_to_json_list", None)
+        decoder = getattr(class_, "_from_json_list", None)
+        if encoder is None or decoder is None:
+            return None, None
+        if inspect.isclass(encoder.__self__) or not inspect.isclass(decoder.__self__):
+            raise ValueError("Class '%s' needs an instancemethod '_to_json_list' "
+                             "and a classmethod '_from_json_list'." % class_.__name__)
+        return encoder, decoder
 
     def register(self, class_, encoder=None, decoder=None):
         """ Registers `class_` in the conversion registry with
@@ -101,9 +139,13 @@ def register(self, class_, encoder=None, decoder=None):
         if not decoder:
             decoder = self._guess_decoder(class_)
 
+        compact_encoder, compact_decoder = self._guess_compact_codec(class_)
+
         self.reg[identifier] = {"class": class_,
                                 "encoder": encoder,
-                                "decoder": decoder}
+                                "decoder": decoder,
+                                "compact_encoder": compact_encoder,
+                                "compact_decoder": compact_decoder}
 
     def encode(self, item):
         """ Calls the necessary functions to turn `item` into
@@ -117,7 +159,8 @@ def encode(self, item):
         Returns
         -------
         dict : dict containing the keys "__id__" and "__value__"
-            returns serialised object as "__value__"
+            returns serialised object as "__value__" (or as "__compact__",
+            if the class has a compact encoding)
         """
         try:
             json_id = item._json_id
@@ -133,7 +176,10 @@ def encode(self, item):
 
         res = dict()
         res["__id__"] = json_id
-        res["__value__"] = converter["encoder"](item)
+        if self.compact and converter["compact_encoder"] is not None:
+            res["__compact__"] = converter["compact_encoder"](item)
+        else:
+            res["__value__"] = converter["encoder"](item)
         return res
 
     def decode(self, json_dict):
@@ -151,10 +197,15 @@ def decode(self, json_dict):
             returns the matched and restored object instance or
             the original dict in case of failure
         """
+        if "__id__" not in json_dict:
+            # the common case: a plain dict
+            return json_dict
+
         try:
-            json_id = json_dict["__id__"]
+            converter = self.reg[json_dict["__id__"]]
+            if "__compact__" in json_dict and converter["compact_decoder"]:
+                return converter["compact_decoder"](json_dict["__compact__"])
             value = json_dict["__value__"]
-            converter = self.reg[json_id]
         except KeyError:
             # we don’t know any better, let’s hope the best
             return json_dict
@@ -182,10 +233,10 @@ def wrapper(class_):
         return wrapper
 
     def dumps(self, obj):
-        return json.dumps(obj, default=self.encode)
+        return self.backend.dumps(obj, default=self.encode)
 
     def loads(self, json_dict):
-        return json.loads(json_dict, object_hook=self.decode)
+        return self.backend.loads(json_dict, object_hook=self.decode)
 
 def json_id(id):
     def wrapper(cls):
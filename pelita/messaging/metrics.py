@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+
+""" Metrics of the actor runtime.
+
+Collects per actor and per method counters (messages received and
+handled, errors, inbox depth, the time a message waits in the inbox and
+the time its handler takes), the byte counters of all remote connections
+and the round-trip times of remote requests.
+
+Collecting is switched off by default. Usage::
+
+    from pelita.messaging import metrics
+    metrics.enable()
+    ...
+    print metrics.snapshot()
+
+or, to write a summary to the log every 5 seconds::
+
+    MetricsLogger(5).start()
+
+The metrics of an actor are still reported after it has stopped, but
+only those of the last `MAX_STOPPED_ACTORS` stopped actors are kept, so
+that a long running server which creates actors for every game does not
+accumulate them.
+"""
+
+import bisect
+import collections
+import logging
+import threading
+import time
+import weakref
+
+from ..utils import SuspendableThread
+
+_logger = logging.getLogger("pelita.metrics")
+
+__docformat__ = "restructuredtext"
+
+#: upper bounds (in seconds) of the buckets of a `Histogram`
+BUCKETS = (0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1, 3, 10)
+
+#: the number of stopped actors whose metrics are kept
+MAX_STOPPED_ACTORS = 100
+
+
+class Histogram(object):
+    """ Counts durations in fixed buckets.
+
+    Parameters
+    ----------
+    buckets : sequence of float, optional
+        the sorted upper bounds of the buckets. Larger values are counted
+        in an additional overflow bucket.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, fraction):
+        """ Returns the upper bound of the bucket which holds the
+        `fraction` (0..1) quantile or None, if nothing has been observed.
+        Values in the overflow bucket are reported as `max`.
+        """
+        with self._lock:
+            if not self.count:
+                return None
+            rank = fraction * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+            return self.max
+
+    def snapshot(self):
+        """ Returns the state as a dict of plain values. """
+        with self._lock:
+            counts = list(self.counts)
+            count, total, max_ = self.count, self.total, self.max
+        return {"count": count,
+                "mean": total / count if count else None,
+                "max": max_,
+                "p50": self.percentile(0.5),
+                "p99": self.percentile(0.99),
+                "buckets": counts}
+
+
+class MethodMetrics(object):
+    """ Metrics for the messages of a single method of an actor. """
+    def __init__(self):
+        self.handled = 0
+        self.errors = 0
+        self.queue_time = Histogram()
+        self.handler_time = Histogram()
+
+    def snapshot(self):
+        return {"handled": self.handled,
+                "errors": self.errors,
+                "queue_time": self.queue_time.snapshot(),
+                "handler_time": self.handler_time.snapshot()}
+
+
+class ActorMetrics(object):
+    """ Metrics of a single actor.
+
+    The counters are only changed by the thread of the actor (and
+    `received` by the senders), so they do not need a lock.
+    """
+    def __init__(self, name, generation=0):
+        self.name = name
+        self.generation = generation
+        self.received = 0
+        self.inbox_depth = 0
+        self.max_inbox_depth = 0
+        self.methods = {}
+        self._queue_time = None
+
+    def method(self, name):
+        try:
+            return self.methods[name]
+        except KeyError:
+            return self.methods.setdefault(name, MethodMetrics())
+
+    def record_dequeue(self, put_time, depth):
+        """ Records that a message which has been put at `put_time`
+        has been taken from an inbox, which still holds `depth` messages.
+        """
+        self.inbox_depth = depth
+        if depth + 1 > self.max_inbox_depth:
+            self.max_inbox_depth = depth + 1
+        self._queue_time = time.time() - put_time
+
+    def record_handled(self, message, handler_time, failed=False):
+        method = self.method(_method_name(message))
+        method.handled += 1
+        if failed:
+            method.errors += 1
+        if self._queue_time is not None:
+            method.queue_time.observe(self._queue_time)
+            self._queue_time = None
+        method.handler_time.observe(handler_time)
+
+    def snapshot(self):
+        methods = dict((name, method.snapshot())
+                       for name, method in self.methods.items())
+        return {"received": self.received,
+                "handled": sum(m["handled"] for m in methods.values()),
+                "errors": sum(m["errors"] for m in methods.values()),
+                "inbox_depth": self.inbox_depth,
+                "max_inbox_depth": self.max_inbox_depth,
+                "methods": methods}
+
+def _method_name(message):
+    try:
+        return message["method"]
+    except (KeyError, TypeError):
+        return type(message).__name__
+
+
+class MetricsRegistry(object):
+    """ Holds the metrics of all actors and remote connections of
+    this process.
+
+    Parameters
+    ----------
+    max_stopped_actors : int, optional
+        the number of stopped actors whose metrics are kept. The oldest
+        ones are dropped first. Changes take effect with `reset()`.
+
+    Attributes
+    ----------
+    enabled : bool
+        nothing is recorded, unless this is True
+    """
+    def __init__(self, max_stopped_actors=MAX_STOPPED_ACTORS):
+        self.enabled = False
+        self.max_stopped_actors = max_stopped_actors
+        self._actors = []
+        self._stopped = collections.deque(maxlen=max_stopped_actors)
+        self._generation = 0
+        self._mailboxes = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """ Forgets all recorded actor metrics. """
+        with self._lock:
+            self._actors = []
+            self._stopped = collections.deque(maxlen=self.max_stopped_actors)
+            self._generation += 1
+
+    def for_actor(self, actor):
+        """ Returns the `ActorMetrics` of `actor`. """
+        actor_metrics = getattr(actor, "_metrics", None)
+        if actor_metrics is not None and actor_metrics.generation == self._generation:
+            return actor_metrics
+
+        name = getattr(actor, "_name", None)
+        if not name:
+            name = "%s-%s" % (actor.__class__.__name__, str(actor.ref.uuid)[:8])
+        with self._lock:
+            # another thread may have been faster
+            actor_metrics = getattr(actor, "_metrics", None)
+            if actor_metrics is None or actor_metrics.generation != self._generation:
+                actor_metrics = ActorMetrics(name, self._generation)
+                self._actors.append(actor_metrics)
+                # the metrics outlive the actor, so that stopped actors
+                # are still reported
+                actor._metrics = actor_metrics
+        return actor_metrics
+
+    def actor_stopped(self, actor):
+        """ Moves the metrics of `actor` to the bounded list of
+        stopped actors.
+        """
+        actor_metrics = getattr(actor, "_metrics", None)
+        if actor_metrics is None:
+            return
+        with self._lock:
+            try:
+                self._actors.remove(actor_metrics)
+            except ValueError:
+                # stopped twice or recorded before a reset
+                return
+            self._stopped.append(actor_metrics)
+
+    def add_mailbox(self, mailbox):
+        """ Adds a `RemoteMailbox` whose connection and requests are
+        reported in the snapshot while it exists.
+        """
+        with self._lock:
+            self._mailboxes.add(mailbox)
+
+    def snapshot(self):
+        """ Returns all metrics as a dict of plain values.
+
+        Returns
+        -------
+        snapshot : dict
+            with the keys "actors" (the metrics by actor name) and
+            "connections" (byte and frame counters as well as request
+            round trips by connection)
+        """
+        with self._lock:
+            actors = list(self._stopped) + self._actors
+            mailboxes = list(self._mailboxes)
+        connections = {}
+        for mailbox in mailboxes:
+            connection = mailbox.connection
+            info = dict((key, getattr(connection, key)) for key in
+                        ("bytes_sent", "bytes_sent_raw", "frames_sent",
+                         "bytes_received", "bytes_received_raw", "frames_received"))
+            info["connected"] = connection.is_connected()
+            info["round_trips"] = mailbox.request_db.round_trip_snapshot()
+            connections[repr(connection)] = info
+        return {"actors": dict((m.name, m.snapshot()) for m in actors),
+                "connections": connections}
+
+    def summary(self):
+        """ Returns a short description of the snapshot (one line per
+        actor method and connection).
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for name, actor in sorted(snapshot["actors"].items()):
+            lines.append("%s: received %i, handled %i, errors %i, inbox %i (max %i)" % (
+                name, actor["received"], actor["handled"], actor["errors"],
+                actor["inbox_depth"], actor["max_inbox_depth"]))
+            for method_name, method in sorted(actor["methods"].items()):
+                lines.append("  %s: %i, queue %s, handler %s" % (
+                    method_name, method["handled"],
+                    _format_times(method["queue_time"]),
+                    _format_times(method["handler_time"])))
+        for name, conn in sorted(snapshot["connections"].items()):
+            lines.append("%s: sent %i frames / %i bytes, received %i frames / %i bytes" % (
+                name, conn["frames_sent"], conn["bytes_sent"],
+                conn["frames_received"], conn["bytes_received"]))
+            for method_name, hist in sorted(conn["round_trips"].items()):
+                lines.append("  round trip %s: %i, %s" % (
+                    method_name, hist["count"], _format_times(hist)))
+        return "\n".join(lines)
+
+def _format_times(hist):
+    if not hist["count"]:
+        return "-"
+    return "mean %.2f ms, p99 < %.2f ms, max %.2f ms" % (
+        hist["mean"] * 1000, hist["p99"] * 1000, hist["max"] * 1000)
+
+metrics = MetricsRegistry()
+
+
+class MetricsLogger(SuspendableThread):
+    """ Enables the metrics and logs their summary every `interval`
+    seconds.
+    """
+    def __init__(self, interval, lvl=logging.INFO):
+        super(MetricsLogger, self).__init__()
+        self.lvl = lvl
+        self.interval = interval
+
+        self.thread.daemon = True
+        self._wait = threading.Event()
+
+    def start(self):
+        metrics.enable()
+        super(MetricsLogger, self).start()
+
+    def _run(self):
+        self._wait.wait(self.interval)
+        _logger.log(self.lvl, "Actor metrics:\n%s", metrics.summary())
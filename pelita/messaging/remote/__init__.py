@@ -1,6 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from .jsonconnection import JsonSocketConnection, MessageSocketConnection
+from .jsonconnection import (JsonSocketConnection, MessageSocketConnection,
+                             COMPRESSION_THRESHOLD)
 from .tcpsocket import TcpSocket, TcpConnectingClient
-from .listener import TcpListeningSocket, TcpThreadedListeningServer
+from .unixsocket import UnixSocket, UnixConnectingClient
+from .listener import (TcpListeningSocket, TcpThreadedListeningServer,
+                       UnixListeningSocket, UnixThreadedListeningServer)
 __docformat__ = "restructuredtext"
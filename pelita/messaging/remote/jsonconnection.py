@@ -3,6 +3,9 @@
 import socket
 import errno
 import logging
+import time
+import zlib
+import base64
 
 from .. import Error, DeadConnection, BaseMessage
 from ..json_convert import json_converter
@@ -12,6 +15,9 @@
 
 __docformat__ = "restructuredtext"
 
+#: frames shorter than this are never compressed
+COMPRESSION_THRESHOLD = 512
+
 
 class JsonSocketConnection(object):
     """ Implements JSON communication over a socket.
@@ -24,6 +30,26 @@ class JsonSocketConnection(object):
 
     By default, this character is EOT (= End of transmission, \x04),
     which of course must never occur in a JSON string.
+
+    Outgoing frames may be compressed (see `enable_compression`). A
+    compressed frame is itself a JSON string of the form
+    ``{"zlib": "<base64 data>"}``; every connection is able to read
+    such frames. All compressed frames of a connection belong to a single
+    zlib stream, so that repeated parts of later frames (the maze, the
+    keys of the universe) shrink to a few bytes.
+
+    Attributes
+    ----------
+    connected : bool
+        False, as soon as the connection is known to be dead
+    last_received : float
+        the time when data has been received for the last time
+    bytes_sent, bytes_received : int
+        the number of bytes which went over the socket
+    bytes_sent_raw, bytes_received_raw : int
+        the number of bytes of the uncompressed JSON strings
+    frames_sent, frames_received : int
+        the number of JSON strings
     """
     def __init__(self, socket):
         self.socket = socket
@@ -43,6 +69,20 @@ def __init__(self, socket):
         # which still waits for completion
         self.incoming = ""
 
+        self.connected = True
+        self.last_received = time.time()
+
+        self.compression_threshold = None
+        self._compressor = None
+        self._decompressor = None
+
+        self.bytes_sent = 0
+        self.bytes_sent_raw = 0
+        self.bytes_received = 0
+        self.bytes_received_raw = 0
+        self.frames_sent = 0
+        self.frames_received = 0
+
     @property
     def terminator(self):
         """ Accessor for the JSON termination character.
@@ -58,14 +98,50 @@ def terminator(self, value):
             raise ValueError("Terminator length must be 1.")
         self._terminator = value
 
+    def enable_compression(self, threshold=COMPRESSION_THRESHOLD, level=6):
+        """ Compresses every following frame which is at least
+        `threshold` bytes long.
+
+        The peer must be able to read compressed frames, so this should
+        only be called after it has announced to do so.
+        """
+        if self._compressor is None:
+            self._compressor = zlib.compressobj(level)
+        self.compression_threshold = threshold
+
+    def _compress(self, json_string):
+        data = self._compressor.compress(json_string)
+        data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return '{"zlib": "%s"}' % base64.b64encode(data)
+
+    def _decompress(self, json_data):
+        """ Returns the JSON string which is contained in the
+        compressed frame `json_data`.
+        """
+        if self._decompressor is None:
+            self._decompressor = zlib.decompressobj()
+        try:
+            return self._decompressor.decompress(base64.b64decode(json_data["zlib"]))
+        except (TypeError, zlib.error):
+            raise ValueError("Invalid compressed frame.")
+
     def send(self, obj):
         """ Converts `obj` to a json string and sends it.
         """
+        self.send_raw(json_converter.dumps(obj))
+
+    def send_raw(self, json_string):
+        """ Sends `json_string` which has already been encoded.
+        """
         if self.socket:
-            json_string = json_converter.dumps(obj)
+            self.bytes_sent_raw += len(json_string)
+            if (self._compressor is not None and
+                len(json_string) >= self.compression_threshold):
+                json_string = self._compress(json_string)
             try:
                 self._send(json_string)
             except socket.error:
+                self.connected = False
                 raise DeadConnection
         else:
             raise RuntimeError("Cannot send without a connection.")
@@ -83,6 +159,8 @@ def _send(self, json_string):
         while sent_bytes < len(data):
             _logger.info("Sending raw data %r", data[sent_bytes:])
             sent_bytes += self.socket.send(data[sent_bytes:])
+        self.bytes_sent += sent_bytes
+        self.frames_sent += 1
 
     def read(self):
         """ This method waits until new data is available at the connection
@@ -94,12 +172,18 @@ def read(self):
 
         # get the first element
         data = self.buffer.pop(0)
+        self.bytes_received += len(data) + 1
         try:
             json_data = json_converter.loads(data)
+            if isinstance(json_data, dict) and json_data.keys() == ["zlib"]:
+                data = self._decompress(json_data)
+                json_data = json_converter.loads(data)
             _logger.debug("Data read %r", json_data)
         except ValueError:
             _logger.warning("Could not decode data %r", data)
             raise
+        self.bytes_received_raw += len(data)
+        self.frames_received += 1
 
         return json_data
 
@@ -123,20 +207,23 @@ def _read(self):
             if e.args[0] in (errno.EBADF,):
                 # close
                 _logger.info("Connection is dead.")
+                self.connected = False
                 raise DeadConnection()
 
             _logger.warning("Caught an unknown error in socket.recv. Sleep and try to repeat.")
             _logger.warning(e)
             # Waiting a bit
-            import time
             time.sleep(1)
             return
 
         if not data:
             # recv returns "", if the connection has been closed
             # this connection seems to be dead
+            self.connected = False
             raise DeadConnection()
 
+        self.last_received = time.time()
+
         split_data = data.split(self.terminator)
         # we split the data to get the following:
         # [contd*, full*, incomplete]
@@ -165,17 +252,23 @@ def _read(self):
         self.incoming += incomplete
 
     def close(self):
+        self.connected = False
+        # Shutting down the socket wakes up a thread which is blocked
+        # in recv, so that it notices the closed connection at once.
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
         self.socket.close()
 
     def is_connected(self):
-        """ Returns true, if we can receive the socket's peername.
-        Otherwise, we'll assume that the socket is not connected.
+        """ Returns False, if the connection has been closed or a
+        send or receive has failed.
+
+        This does not need a system call, so it is cheap enough to
+        be checked before each message.
         """
-        try:
-            peer = self.socket.getpeername()
-            return True
-        except socket.error:
-            return False
+        return self.connected
 
     def __repr__(self):
         try:
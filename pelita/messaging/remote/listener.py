@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
+import errno
 import logging
+import os
 import socket
 
-from . import TcpSocket
+from . import TcpSocket, UnixSocket
 from ...utils import SuspendableThread
 
 _logger = logging.getLogger("pelita.listener")
@@ -26,9 +28,43 @@ def handle_accept(self):
         """ Waits for a connection to be established and returns it."""
         connection, addr = self.socket.accept()
         _logger.info("Connection accepted.")
+        # send small messages at once (see TcpConnectingClient)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         return connection
 
+class UnixListeningSocket(UnixSocket):
+    def __init__(self, path):
+        """ Opens a Unix domain socket at `path` and listens
+        for an incoming connection.
+
+        A stale socket file at `path` is removed first.
+        """
+        super(UnixListeningSocket, self).__init__(path)
+
+        try:
+            os.unlink(path)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                raise
+
+        self.socket.bind(path)
+        self.socket.listen(1)
+
+    def handle_accept(self):
+        """ Waits for a connection to be established and returns it."""
+        connection, addr = self.socket.accept()
+        _logger.info("Connection accepted.")
+
+        return connection
+
+    def close(self):
+        super(UnixListeningSocket, self).close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
 class TcpThreadedListeningServer(SuspendableThread):
     def __init__(self, host, port):
         """ Opens a socket with respective host and port
@@ -47,6 +83,13 @@ def __init__(self, host, port):
         _logger.info("%r: Created socket" % self)
 
     def run(self):
+        try:
+            self._accept_loop()
+        finally:
+            # free the address for the next server
+            self.socket.close()
+
+    def _accept_loop(self):
         while self._running:
             try:
                 connection = self.socket.handle_accept()
@@ -77,12 +120,42 @@ def stop(self):
         # To stop listening, we create a dummy connection
         # and close it immediately
         dummy = socket.socket()
-        dummy.connect((self.socket.host, self.socket.port))
+        try:
+            dummy.connect((self.socket.host, self.socket.port))
+        except socket.error:
+            # already closed
+            pass
         dummy.close()
 
     def __repr__(self):
         return "%s(%r)" % (self.__class__.__name__, self.socket)
 
+class UnixThreadedListeningServer(TcpThreadedListeningServer):
+    def __init__(self, path):
+        """ Opens a Unix domain socket at `path` and listens for
+        incoming connections.
+
+        As with `TcpThreadedListeningServer`, `on_accept()` must be
+        supplied.
+        """
+        SuspendableThread.__init__(self)
+
+        self.socket = UnixListeningSocket(path)
+        _logger.info("%r: Created socket" % self)
+
+    def stop(self):
+        SuspendableThread.stop(self)
+
+        # To stop listening, we create a dummy connection
+        # and close it immediately
+        dummy = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            dummy.connect(self.socket.path)
+        except socket.error:
+            pass
+        dummy.close()
+        self.socket.close()
+
 class TcpThreadedListeningServerQueuer(TcpThreadedListeningServer):
     def __init__(self, incoming_connections, host, port):
         super(TcpThreadedListeningServerQueuer, self).__init__(host, port)
@@ -67,6 +67,9 @@ def __init__(self, host, port):
     def handle_connect(self):
         self.connect()
         self.timeout = 3
+        # Our messages are small and every query waits for a reply.
+        # Without this, Nagle’s algorithm delays them by up to 40 ms.
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         return self.socket # or JsonSocketConnection(self.socket) ?
 
 
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+import socket
+
+__docformat__ = "restructuredtext"
+
+
+class UnixSocket(object):
+    """ Wraps a Unix domain socket for a local stream connection.
+
+    It behaves like `TcpSocket` but is addressed by a file system path
+    instead of a host and port. The `host` of a Unix socket is always
+    "localhost" and its `port` is the path.
+    """
+    def __init__(self, path):
+        self._path = path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.setblocking(1)
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def host(self):
+        return "localhost"
+
+    @property
+    def port(self):
+        return self._path
+
+    @property
+    def socket(self):
+        return self._socket
+
+    @property
+    def timeout(self):
+        """Changes the timeout of the socket."""
+        return self._socket.gettimeout()
+
+    @timeout.setter
+    def timeout(self, value):
+        self._socket.settimeout(value)
+
+    def connect(self):
+        """Connects the socket with the provided path."""
+        self._socket.connect(self._path)
+
+    def close(self):
+        """Closes the socket"""
+        self._socket.close()
+
+    def __repr__(self):
+        return "%s(%s)" % (self.__class__.__name__, self._path)
+
+
+class UnixConnectingClient(UnixSocket):
+    def __init__(self, path):
+        super(UnixConnectingClient, self).__init__(path)
+        self.timeout = 3
+
+    def handle_connect(self):
+        self.connect()
+        self.timeout = 3
+        return self.socket
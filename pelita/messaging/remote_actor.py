@@ -4,20 +4,28 @@
 Remote actor setup and bookkeeping of remote requests.
 """
 
+import collections
 import socket
+import time
 import weakref
-from threading import Lock, RLock
+from threading import Lock, RLock, Condition, Event, current_thread
 
 import logging
 _logger = logging.getLogger("pelita.mailbox")
 _logger.setLevel(logging.DEBUG)
 
 from ..utils import SuspendableThread, CloseThread, Counter
-from .remote import JsonSocketConnection, TcpThreadedListeningServer, TcpConnectingClient
-from .actor import DeadConnection, actor_registry, BaseActorReference, ActorNotRunning
+from .remote import (JsonSocketConnection, TcpThreadedListeningServer, TcpConnectingClient,
+                     UnixThreadedListeningServer, UnixConnectingClient)
+from .actor import DeadConnection, actor_registry, BaseActorReference, ActorNotRunning, Request
+from .json_convert import json_converter
+from .metrics import metrics, Histogram
 
 __docformat__ = "restructuredtext"
 
+#: seconds between two heartbeats on an otherwise idle connection
+HEARTBEAT_INTERVAL = 1.0
+
 
 class RequestDB(object):
     """ Class which holds weak references to all issued requests.
@@ -31,28 +39,70 @@ def __init__(self):
         self._db_lock = Lock()
         self._counter = Counter(0)
 
+        # only used, if the metrics are enabled
+        self._sent_at = weakref.WeakKeyDictionary()
+        self.round_trips = {}
+
     def get_request(self, id, default=None):
         """ Return the `Request` object with the specified `id`.
         """
         with self._db_lock:
-            return self._db.get(id, default)
+            request = self._db.get(id, default)
+            if self._sent_at and request is not None:
+                self._record_round_trip(request)
+            return request
+
+    def _record_round_trip(self, request):
+        try:
+            sent_at, label = self._sent_at.pop(request)
+        except (KeyError, TypeError):
+            return
+        histogram = self.round_trips.get(label)
+        if histogram is None:
+            histogram = self.round_trips[label] = Histogram()
+        histogram.observe(time.time() - sent_at)
+
+    def round_trip_snapshot(self):
+        """ Returns the round-trip histograms of the requests by label. """
+        with self._db_lock:
+            round_trips = dict(self.round_trips)
+        return dict((label, histogram.snapshot())
+                    for label, histogram in round_trips.items())
 
-    def add_request(self, request):
+    def add_request(self, request, label=None):
         """ Add a new `Request` object to the database.
 
         The object is only referenced weakly, so if the main
         reference is deleted, it may be removed automatically
         from the database as well.
+
+        If the metrics are enabled, the time until the first reply
+        arrives is recorded under `label` (e.g. the name of the method).
         """
         with self._db_lock:
-            try:
-                id = self.create_id(str(request.uuid))
-            except AttributeError:
+            if isinstance(request, Request):
+                # requests live only for a single reply; a counter is
+                # much cheaper than creating a uuid for each of them
                 id = self.create_id()
+                if metrics.enabled:
+                    self._sent_at[request] = (time.time(), label)
+            else:
+                try:
+                    id = self.create_id(str(request.uuid))
+                except AttributeError:
+                    id = self.create_id()
 
             self._db[id] = request
             return id
 
+    def fail_all(self, error):
+        """ Fails all pending `Request` objects with `error`. """
+        with self._db_lock:
+            requests = self._db.values()
+        for request in requests:
+            if isinstance(request, Request):
+                request.fail(error)
+
     def create_id(self, id=None):
         """ Create a new and hopefully unique id for this database.
         """
@@ -86,6 +136,16 @@ def _run(self):
 
         _logger.info("Processing inbox %r", recv)
 
+        if "control" in recv:
+            self.mailbox.handle_control(recv["control"])
+        elif "batch" in recv:
+            for frame in recv["batch"]:
+                self._dispatch(frame)
+        else:
+            self._dispatch(recv)
+
+    def _dispatch(self, recv):
+        """ Puts the message of a single frame into its channel. """
         actor = recv.get("actor")
         channel = self.mailbox.dispatcher(actor)
         sender = recv.get("sender")
@@ -133,7 +193,30 @@ class RemoteOutbox(object):
     the sender would not need to wait until the message is processed.
     This, however, has proven to cause much longer delays (contrary to
     intuition) for the sending thread than the lock solution.
+
+    A queue is still useful for peers which must not slow down the
+    sender, no matter how slowly they read (e.g. viewers). What
+    happens to a frame is decided by the policy (see `set_policy`):
+
+    * ``"direct"`` sends it at once in the calling thread. This is the
+      default and should be used for team players.
+    * ``"block"`` puts it into a bounded queue which is drained by a
+      writer thread. A full queue blocks the sender; no frame is lost.
+    * ``"coalesce"`` also uses the queue. If it is full, a notification
+      replaces the newest queued notification for the same actor and
+      method (they are merged with `merge`, if given). Other frames wait
+      for free space.
+
+    Once a queue has been used, ``"direct"`` behaves like ``"block"``,
+    so that the order of the frames is kept.
+
+    Attributes
+    ----------
+    dropped : int
+        the number of frames which were coalesced
     """
+    POLICIES = ("direct", "block", "coalesce")
+
     def __init__(self, mailbox, **kwargs):
         super(RemoteOutbox, self).__init__(**kwargs)
 
@@ -141,11 +224,207 @@ def __init__(self, mailbox, **kwargs):
         self.connection = mailbox.connection
         self._remote_lock = Lock()
 
+        self.policy = "direct"
+        self.maxsize = 0
+        self.merge = None
+        self.dropped = 0
+        self._frames = collections.deque()
+        self._unfinished = 0
+        self._closed = False
+        self._cond = Condition()
+        self._writer = None
+        self.last_sent = time.time()
+
+    def set_policy(self, policy, maxsize=8, merge=None):
+        """ Changes how frames are sent.
+
+        Parameters
+        ----------
+        policy : string
+            one of "direct", "block" or "coalesce"
+        maxsize : int, optional, default = 8
+            the maximum number of queued frames
+        merge : callable, optional
+            ``merge(old_message, new_message)`` returns the message which
+            replaces both in the ``"coalesce"`` policy. If None, the new
+            message replaces the old one.
+        """
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown outbox policy %r." % policy)
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        with self._cond:
+            self.policy = policy
+            self.maxsize = maxsize
+            self.merge = merge
+            if policy != "direct" and self._writer is None:
+                self._writer = RemoteOutboxWriter(self)
+                self._writer.start()
+            self._cond.notify_all()
+
     def put(self, msg):
+        if self._writer is None:
+            self._send(msg)
+            return
+
+        with self._cond:
+            if len(self._frames) >= self.maxsize:
+                if self.policy == "coalesce" and self._coalesce(msg):
+                    return
+                while len(self._frames) >= self.maxsize and not self._closed:
+                    self._cond.wait()
+            if self._closed:
+                raise DeadConnection("Outbox of %r is closed." % self.connection)
+            self._frames.append(msg)
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    def _coalesce(self, msg):
+        """ Replaces the newest queued notification for the same actor
+        and method with `msg`. Returns False, if there is none.
+        """
+        key = _coalesce_key(msg)
+        if key is None:
+            return False
+        for idx in range(len(self._frames) - 1, -1, -1):
+            old = self._frames[idx]
+            if _coalesce_key(old) == key:
+                if self.merge is not None and not isinstance(msg, EncodedFrame):
+                    msg = dict(msg, message=self.merge(old["message"], msg["message"]))
+                del self._frames[idx]
+                self._frames.append(msg)
+                self.dropped += 1
+                self._cond.notify_all()
+                return True
+        return False
+
+    def _next(self):
+        """ Waits for the next queued frame. Returns None, if the
+        outbox has been closed.
+        """
+        with self._cond:
+            while not self._frames and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            msg = self._frames.popleft()
+            self._cond.notify_all()
+            return msg
+
+    def _task_done(self):
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def enable_compression(self, threshold):
+        """ Compresses all following frames of at least `threshold`
+        bytes. """
+        with self._remote_lock:
+            self.connection.enable_compression(threshold)
+
+    def _send(self, msg):
         with self._remote_lock:
-            # May raise DeadConnection
-            # TODO add a test
+            self._write(msg)
+
+    def _write(self, msg):
+        # May raise DeadConnection
+        # TODO add a test
+        if isinstance(msg, EncodedFrame):
+            self.connection.send_raw(msg.data)
+        else:
             self.connection.send(msg)
+        self.last_sent = time.time()
+
+    def heartbeat(self):
+        """ Sends a heartbeat frame to show the peer that we are alive.
+
+        Does nothing (and never blocks), if another frame is being sent
+        or waiting in the queue.
+        """
+        frame = {"control": {"heartbeat": True}}
+        if self._writer is None:
+            if not self._remote_lock.acquire(False):
+                return
+            try:
+                self._write(frame)
+            finally:
+                self._remote_lock.release()
+        else:
+            with self._cond:
+                if self._frames or self._closed:
+                    return
+                self._frames.append(frame)
+                self._unfinished += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """ Waits until all queued frames have been sent.
+
+        Returns True, if the queue has been drained.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._unfinished and not self._closed:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            return not self._unfinished
+
+    def close(self):
+        """ Stops the writer. Queued frames are discarded. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+class EncodedFrame(object):
+    """ A frame which has already been converted to a json string.
+
+    Encoded frames may be coalesced, if they have the same `key`.
+    """
+    __slots__ = ("data", "key")
+
+    def __init__(self, data, key=None):
+        self.data = data
+        self.key = key
+
+def _coalesce_key(frame):
+    """ Notifications may be coalesced by actor and method. Queries must
+    never be touched, since someone is waiting for their reply.
+    """
+    if isinstance(frame, EncodedFrame):
+        return frame.key
+    if "sender" in frame:
+        return None
+    try:
+        return frame["actor"], frame["message"]["method"]
+    except (KeyError, TypeError):
+        return None
+
+class RemoteOutboxWriter(SuspendableThread):
+    """ Sends the queued frames of a `RemoteOutbox`. """
+    def __init__(self, outbox, **kwargs):
+        self.outbox = outbox
+
+        super(RemoteOutboxWriter, self).__init__(**kwargs)
+        self.thread.daemon = True
+
+    def _run(self):
+        msg = self.outbox._next()
+        if msg is None:
+            raise CloseThread
+        try:
+            self.outbox._send(msg)
+        except (DeadConnection, socket.error):
+            _logger.debug("Remote connection is dead, closing mailbox in %r.", self)
+            self.outbox.close()
+            self.outbox.mailbox.stop()
+            raise CloseThread
+        finally:
+            self.outbox._task_done()
 
 
 class RemoteMailbox(object):
@@ -160,6 +439,12 @@ def __init__(self, connection, remote):
         self.inbox = RemoteInbox(self)
         self.outbox = RemoteOutbox(self)
 
+        self._close_callbacks = []
+        self._closed = False
+        self._close_lock = Lock()
+
+        metrics.add_mailbox(self)
+
         # finally, add the connection to the remote database
         remote.add_connection(self.connection, self)
 
@@ -188,23 +473,102 @@ def dispatcher(self, actor_ref_id):
     def start(self):
         _logger.info("Starting mailbox %r", self)
         self.inbox.start()
+        # tell the peer which compressed frames we are able to read
+        try:
+            self.outbox.put({"control": {"decompress": ["zlib"]}})
+        except DeadConnection:
+            _logger.debug("Could not announce capabilities in %r.", self)
+
+    def add_close_callback(self, callback):
+        """ Calls `callback()` once, when this mailbox is stopped (or at
+        once, if it has already been stopped).
+        """
+        with self._close_lock:
+            if not self._closed:
+                self._close_callbacks.append(callback)
+                return
+        callback()
+
+    def handle_control(self, control):
+        """ Handles a control frame of the peer. """
+        threshold = self.remote.compression_threshold
+        if threshold is not None and "zlib" in control.get("decompress", []):
+            _logger.debug("Enabling compression in %r.", self)
+            self.outbox.enable_compression(threshold)
 
     def stop(self):
         # TODO: this method may be called multiple times
         _logger.info("Stopping mailbox %r", self)
         self.inbox.stop()
+        # give queued frames (e.g. the final state for a viewer) a chance
+        self.outbox.flush(1)
+        self.outbox.close()
         self.connection.close()
+        # nobody will reply to the open requests anymore
+        self.request_db.fail_all(DeadConnection("%r is closed." % self.connection))
         try:
             self.remote.remove_connection(self.connection)
         except KeyError:
             pass
 
+        with self._close_lock:
+            self._closed = True
+            callbacks, self._close_callbacks = self._close_callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                _logger.exception("Close callback %r of %r failed.", callback, self)
+
     def __repr__(self):
         return "RemoteMailbox(%r, %r)" % (self.connection, self.remote)
 
+class RemoteHeartbeat(SuspendableThread):
+    """ Sends heartbeats over the idle connections of a
+    `RemoteConnection` and closes the connections whose peer has been
+    silent for too long.
+    """
+    def __init__(self, remote, **kwargs):
+        self.remote = remote
+        self._wakeup = Event()
+
+        super(RemoteHeartbeat, self).__init__(**kwargs)
+        self.thread.daemon = True
+
+    def _run(self):
+        self._wakeup.wait(self.remote.heartbeat_interval)
+        if self._running:
+            self.remote.check_connections()
+
+    def stop(self):
+        super(RemoteHeartbeat, self).stop()
+        self._wakeup.set()
+
 class RemoteConnection(object):
-    def __init__(self):
+    """ Bookkeeping of all remote connections of a process.
+
+    Parameters
+    ----------
+    compression_threshold : int, optional
+        if given, frames of at least this many bytes are compressed,
+        as soon as the peer has announced that it can read them.
+        Compression is only worth it for slow links.
+    heartbeat_interval : float, optional, default = HEARTBEAT_INTERVAL
+        idle connections get a heartbeat frame after this many seconds.
+        If None, no heartbeats are sent and silent peers are not closed.
+    heartbeat_timeout : float, optional
+        a connection is closed, if nothing has been received for this
+        many seconds. Defaults to three heartbeat intervals.
+    """
+    def __init__(self, compression_threshold=None,
+                 heartbeat_interval=HEARTBEAT_INTERVAL, heartbeat_timeout=None):
         self.listener = None
+        self.compression_threshold = compression_threshold
+        self.heartbeat_interval = heartbeat_interval
+        if heartbeat_timeout is None and heartbeat_interval is not None:
+            heartbeat_timeout = 3 * heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self._heartbeat = None
 
         self.exposed_actor_reg = {}
 
@@ -215,6 +579,9 @@ def add_connection(self, connection, mailbox):
         with self._db_lock:
             _logger.debug("Adding connection %r for mailbox %r.", connection, mailbox)
             self.connections[connection] = mailbox
+            if self.heartbeat_interval is not None and self._heartbeat is None:
+                self._heartbeat = RemoteHeartbeat(self)
+                self._heartbeat.start()
 
     def remove_connection(self, connection):
         with self._db_lock:
@@ -227,15 +594,70 @@ def get_connections(self, message):
         with self._db_lock:
             return self.connections
 
+    def traffic(self):
+        """ Returns the number of bytes which have been sent and received
+        by the open connections, before and after compression.
+
+        Returns
+        -------
+        traffic : dict
+            with the keys "sent", "sent_raw", "received" and "received_raw"
+        """
+        traffic = dict.fromkeys(["sent", "sent_raw", "received", "received_raw"], 0)
+        with self._db_lock:
+            for connection in self.connections:
+                for key in traffic:
+                    traffic[key] += getattr(connection, "bytes_" + key)
+        return traffic
+
+    def check_connections(self):
+        """ Closes the connections whose peer has been silent for longer
+        than `heartbeat_timeout` and sends a heartbeat over the others,
+        if nothing has been sent during the last `heartbeat_interval`.
+        """
+        now = time.time()
+        with self._db_lock:
+            boxes = self.connections.values()
+        for box in boxes:
+            silence = now - box.connection.last_received
+            if silence > self.heartbeat_timeout:
+                _logger.warning("No data from %r for %.1f seconds. Closing.",
+                                box.connection, silence)
+                box.stop()
+            elif now - box.outbox.last_sent >= self.heartbeat_interval:
+                try:
+                    box.outbox.heartbeat()
+                except DeadConnection:
+                    box.stop()
+
     def shutdown(self):
         with self._db_lock:
             for box in self.connections.values():
                 box.stop()
+            heartbeat, self._heartbeat = self._heartbeat, None
+
+        if heartbeat is not None:
+            heartbeat.stop()
+            # the heartbeat thread itself may close the last connection
+            if heartbeat.thread is not current_thread():
+                heartbeat.thread.join()
 
         self.on_shutdown()
 
     def start_listener(self, host, port):
-        self.listener = TcpThreadedListeningServer(host=host, port=port)
+        """ Listens for TCP connections on `host` and `port`. """
+        return self._start_listener(TcpThreadedListeningServer(host=host, port=port))
+
+    def start_unix_listener(self, path):
+        """ Listens for connections on the Unix domain socket `path`.
+
+        Unix domain sockets are much cheaper than loopback TCP and should
+        be used, if all participants run on the same host.
+        """
+        return self._start_listener(UnixThreadedListeningServer(path=path))
+
+    def _start_listener(self, listener):
+        self.listener = listener
 
         def accepter(connection):
         # a new connection has been established
@@ -248,7 +670,16 @@ def accepter(connection):
         return self
 
     def actor_for(self, name, host, port):
-        sock = TcpConnectingClient(host=host, port=port)
+        """ Returns a reference to the actor `name` on `host` and `port`. """
+        return self._actor_for(name, TcpConnectingClient(host=host, port=port))
+
+    def unix_actor_for(self, name, path):
+        """ Returns a reference to the actor `name` which is reachable
+        through the Unix domain socket `path`.
+        """
+        return self._actor_for(name, UnixConnectingClient(path=path))
+
+    def _actor_for(self, name, sock):
         try:
             conn = sock.handle_connect()
         except socket.error:
@@ -306,6 +737,37 @@ def put(self, message, channel=None, remote=None):
         if not self.is_connected():
             raise DeadConnection("%r is not connected." % self._remote_mailbox.connection)
 
+        self._remote_mailbox.outbox.put(self._frame(message, channel))
+
+    def put_batch(self, messages):
+        """ Sends several (message, channel) pairs in a single frame. """
+        if not self.is_connected():
+            raise DeadConnection("%r is not connected." % self._remote_mailbox.connection)
+
+        frames = [self._frame(message, channel) for message, channel in messages]
+        self._remote_mailbox.outbox.put({"batch": frames})
+
+    def put_encoded(self, message, key=None):
+        """ Sends a notification whose message has already been
+        converted to a json string (e.g. to send it to many actors,
+        while encoding it only once).
+
+        Parameters
+        ----------
+        message : string
+            the json encoded message
+        key : hashable, optional
+            queued frames for the same actor and key may be coalesced
+        """
+        if not self.is_connected():
+            raise DeadConnection("%r is not connected." % self._remote_mailbox.connection)
+
+        data = '{"actor": %s, "message": %s}' % (json_converter.dumps(self.remote_name), message)
+        if key is not None:
+            key = (self.remote_name, key)
+        self._remote_mailbox.outbox.put(EncodedFrame(data, key))
+
+    def _frame(self, message, channel):
         remote_name = self.remote_name
         sender_info = repr(channel) # only used for debugging
 
@@ -314,21 +776,32 @@ def put(self, message, channel=None, remote=None):
             # or a Request). Store a reference to the channel and send an uuid
             # over the network. This uuid can then be used by the remote
             # actor to reply to this message.
-            uuid = self._remote_mailbox.request_db.add_request(channel)
-
-            self._remote_mailbox.outbox.put({"actor": remote_name,
-                                             "sender": uuid,
-                                             "message": message,
-                                             "sender_info": sender_info})
+            try:
+                label = message["method"]
+            except (KeyError, TypeError):
+                label = None
+            uuid = self._remote_mailbox.request_db.add_request(channel, label)
+
+            return {"actor": remote_name,
+                    "sender": uuid,
+                    "message": message,
+                    "sender_info": sender_info}
         else:
-            self._remote_mailbox.outbox.put({"actor": remote_name,
-                                             "message": message,
-                                             "sender_info": sender_info})
+            return {"actor": remote_name,
+                    "message": message,
+                    "sender_info": sender_info}
+
+    def add_disconnect_callback(self, callback):
+        """ Calls `callback()` when the connection to the remote actor
+        is closed (by either side).
+        """
+        self._remote_mailbox.add_close_callback(callback)
 
     def is_connected(self):
         """ Returns true, if the outgoing connection is alive.
         This does not tell us, if a remote actor exists or lives.
         Also, a connection may be dead on the other side and we haven’t
-        received this information yet.
+        received this information yet (at the latest, the heartbeat
+        timeout of the `RemoteConnection` tells us).
         """
         return self._remote_mailbox.connection.is_connected()
@@ -6,8 +6,9 @@
 import random
 import sys
 import math
+import time
 from .datamodel import stop, Free, diff_pos
-from .graph import AdjacencyList, NoPathException
+from .graph import AdjacencyList, NoPathException, LayoutInfo
 
 __docformat__ = "restructuredtext"
 
@@ -39,10 +40,14 @@ def __init__(self, *args):
                 raise TypeError("Player %s does not override 'get_move()'." % player.__class__)
         self._players = players
         self._bot_players = {}
+        self._move_deadline = None
+        self._provisional_callback = None
 
     def _set_bot_ids(self, bot_ids):
         if len(bot_ids) > len(self._players):
             raise ValueError("Tried to set %d bot_ids with only %d Players." % (len(bot_ids), len(self._players)))
+        # the ids of a previous game are no longer valid
+        self._bot_players = {}
         for bot_id, player in zip(bot_ids, self._players):
             player._set_index(bot_id)
             self._bot_players[bot_id] = player
@@ -54,14 +59,41 @@ def _set_initial(self, universe):
         for player in self._bot_players.values():
             player._set_initial(universe)
 
+    def _set_move_budget(self, time_budget, provisional_callback=None):
+        """ Sets the time budget for the next call of `_get_move()`.
+
+        Parameters
+        ----------
+        time_budget : float or None
+            the time in seconds the Player may use for its move
+        provisional_callback : callable, optional
+            is called with every provisional move of the Player
+        """
+        if time_budget is None:
+            self._move_deadline = None
+        else:
+            self._move_deadline = time.time() + time_budget
+        self._provisional_callback = provisional_callback
+
     def _get_move(self, bot_idx, universe):
         """ Requests a move from the Player who controls the Bot with index `bot_idx`.
         """
-        return self._bot_players[bot_idx]._get_move(universe)
+        player = self._bot_players[bot_idx]
+        player._set_move_deadline(self._move_deadline, self._provisional_callback)
+        try:
+            return player._get_move(universe)
+        finally:
+            # the budget is only valid for a single move
+            player._set_move_deadline(None, None)
+            self._move_deadline = None
+            self._provisional_callback = None
 
 class AbstractPlayer(object):
     """ Base class for all user implemented Players. """
 
+    _move_deadline = None
+    _provisional_callback = None
+
     def _set_index(self, index):
         """ Called by the GameMaster to set this Players index.
 
@@ -84,6 +116,7 @@ def _set_initial(self, universe):
         """
         self.universe_states = []
         self.universe_states.append(universe)
+        self._layout_info = None
         self.set_initial()
 
     def set_initial(self):
@@ -110,6 +143,51 @@ def get_move(self):
         raise NotImplementedError(
                 "You must override the 'get_move' method in your player")
 
+    def _set_move_deadline(self, deadline, provisional_callback=None):
+        """ Called by the team before and after each move.
+
+        Parameters
+        ----------
+        deadline : float or None
+            the time (as in `time.time()`) by which the move is due
+        provisional_callback : callable, optional
+            receives the moves of `set_provisional_move()`
+
+        """
+        self._move_deadline = deadline
+        self._provisional_callback = provisional_callback
+
+    @property
+    def remaining_time(self):
+        """ The time in seconds which is left for the current move.
+
+        Returns
+        -------
+        remaining_time : float or None
+            the remaining time or None, if there is no time limit
+
+        """
+        if self._move_deadline is None:
+            return None
+        return max(0.0, self._move_deadline - time.time())
+
+    def set_provisional_move(self, move):
+        """ Announces the best move found so far.
+
+        Players which search iteratively may call this method whenever
+        they have found a better move. If the Player does not return
+        from `get_move()` in time, the last provisional move is used
+        instead of a random one and the timeout is not counted.
+
+        Parameters
+        ----------
+        move : tuple of (int, int)
+            the provisional move
+
+        """
+        if self._provisional_callback is not None:
+            self._provisional_callback(move)
+
     @property
     def current_uni(self):
         """ The current Universe.
@@ -169,6 +247,21 @@ def team_bots(self):
         """
         return self.current_uni.team_bots(self.me.team_index)
 
+    @property
+    def layout_info(self):
+        """ The static features of the maze of this game.
+
+        Returns
+        -------
+        layout_info : LayoutInfo
+            dead ends, chokepoints, corridors, borders and distances
+            to the borders; shared by all players of the same maze
+
+        """
+        if getattr(self, "_layout_info", None) is None:
+            self._layout_info = LayoutInfo.for_maze(self.current_uni.maze)
+        return self._layout_info
+
     @property
     def team_border(self):
         """ Positions of the border positions.
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+
+""" Columnar storage of played games for analyses after the game.
+
+A `ReplayRecorder` is registered as a viewer (or is fed with the output of
+a `DumpingViewer`) and collects every turn in columns. Many games, e.g. a
+whole tournament, may be recorded one after the other. `save()` writes all
+columns into a single ``.npz`` file, `load_replay()` reads the columns
+lazily and the analysis functions of this module work on all recorded
+games at once.
+
+Usage::
+
+    recorder = ReplayRecorder()
+    game_master.register_viewer(recorder)
+    game_master.play()
+    recorder.save("games.npz")
+
+    with load_replay("games.npz") as replay:
+        heatmap = position_heatmap(replay)
+
+Recording works without NumPy; saving, loading and the analyses need it.
+
+The columns of a replay file are
+
+``positions`` : int16 array (turns, bots, 2)
+    the positions of all bots after each turn
+``scores`` : int32 array (turns, teams)
+    the scores after each turn
+``rounds``, ``turns`` : int32 arrays (turns,)
+    the round and the index of the bot which moved
+``game_offsets`` : int64 array (games + 1,)
+    the turns of game ``i`` are the rows
+    ``game_offsets[i]:game_offsets[i + 1]``
+``maze_shapes`` : int32 array (games, 2)
+    the width and height of the maze of each game
+``walls`` : bool array (sum of all maze sizes,)
+    the walls of all mazes, one maze after the other
+``bot_teams`` : int32 array (bots,)
+    the team index of each bot
+``team_names`` : unicode array (games, teams)
+``food_eaten`` : int32 array (n, 4)
+    turn (row), bot index, x and y of each eaten food
+``kills`` : int32 array (n, 5)
+    turn (row), harvester index, destroyer index, x and y of each
+    destroyed harvester
+"""
+
+from . import datamodel
+from .viewer import AbstractViewer
+from .messaging.json_convert import json_converter
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__docformat__ = "restructuredtext"
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("Replay files need NumPy, which is not installed.")
+
+
+class ReplayRecorder(AbstractViewer):
+    """ A viewer which records games in columns.
+
+    Every call of `set_initial` starts a new game. All games must be
+    played with the same number of bots.
+    """
+    def __init__(self):
+        self.positions = []
+        self.scores = []
+        self.rounds = []
+        self.turns = []
+        self.game_starts = []
+        self.mazes = []
+        self.team_names = []
+        self.bot_teams = None
+        self.food_eaten = []
+        self.kills = []
+
+    def set_initial(self, universe):
+        bot_teams = [bot.team_index for bot in universe.bots]
+        if self.bot_teams is None:
+            self.bot_teams = bot_teams
+        elif bot_teams != self.bot_teams:
+            raise ValueError("All games of a replay must have the same bots.")
+
+        self.game_starts.append(len(self.positions))
+        maze = universe.maze
+        self.mazes.append((maze.width, maze.height,
+                           [datamodel.Wall.char in cell for cell in maze._data]))
+        self.team_names.append([team.name for team in universe.teams])
+
+    def observe(self, round_, turn, universe, events):
+        if not self.game_starts:
+            self.set_initial(universe)
+        if turn is None:
+            # the final message of a game does not change the universe
+            return
+
+        row = len(self.positions)
+        self.positions.append([bot.current_pos for bot in universe.bots])
+        self.scores.append([team.score for team in universe.teams])
+        self.rounds.append(round_)
+        self.turns.append(turn)
+
+        for bot_eats in events.filter_type(datamodel.BotEats):
+            x, y = bot_eats.food_pos
+            self.food_eaten.append((row, bot_eats.bot_index, x, y))
+        for bot_destroyed in events.filter_type(datamodel.BotDestroyed):
+            x, y = bot_destroyed.harvester_new_pos
+            self.kills.append((row, bot_destroyed.harvester_index,
+                               bot_destroyed.destroyer_index, x, y))
+
+    def read_dump(self, stream, chunk_size=65536):
+        """ Records the games which a `DumpingViewer` has written
+        to `stream`.
+        """
+        for message in _read_dump(stream, chunk_size):
+            if "round_" in message:
+                self.observe(message["round_"], message["turn"],
+                             message["universe"], message["events"])
+            else:
+                self.set_initial(message["universe"])
+
+    def columns(self):
+        """ Returns all columns as a dict of NumPy arrays. """
+        _require_numpy()
+        num_bots = len(self.bot_teams or ())
+        num_teams = len(self.team_names[0]) if self.team_names else 0
+        return {
+            "positions": numpy.array(self.positions, dtype=numpy.int16).reshape(-1, num_bots, 2),
+            "scores": numpy.array(self.scores, dtype=numpy.int32).reshape(-1, num_teams),
+            "rounds": numpy.array(self.rounds, dtype=numpy.int32),
+            "turns": numpy.array(self.turns, dtype=numpy.int32),
+            "game_offsets": numpy.array(self.game_starts + [len(self.positions)], dtype=numpy.int64),
+            "maze_shapes": numpy.array([maze[:2] for maze in self.mazes], dtype=numpy.int32).reshape(-1, 2),
+            "walls": numpy.array([wall for maze in self.mazes for wall in maze[2]], dtype=bool),
+            "bot_teams": numpy.array(self.bot_teams or [], dtype=numpy.int32),
+            "team_names": numpy.array(self.team_names, dtype=unicode).reshape(-1, num_teams),
+            "food_eaten": numpy.array(self.food_eaten, dtype=numpy.int32).reshape(-1, 4),
+            "kills": numpy.array(self.kills, dtype=numpy.int32).reshape(-1, 5),
+        }
+
+    def save(self, path):
+        """ Writes all recorded games to the ``.npz`` file `path`.
+
+        The file is not compressed, so that the columns can be read
+        without unpacking.
+        """
+        numpy.savez(path, **self.columns())
+
+def _read_dump(stream, chunk_size):
+    """ Yields the decoded messages of a `DumpingViewer` stream. """
+    rest = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parts = (rest + chunk).split("\x04")
+        rest = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield json_converter.loads(part)
+    if rest.strip():
+        yield json_converter.loads(rest)
+
+
+class Replay(object):
+    """ The columns of recorded games.
+
+    Each column is read from `columns` only once, when it is first used.
+    A replay which has been loaded from a file should be closed (or used
+    as a context manager), when it is not needed anymore.
+
+    Parameters
+    ----------
+    columns : mapping of str to array
+        the columns as written by `ReplayRecorder.save`
+    """
+    def __init__(self, columns):
+        self.columns = columns
+        self._cache = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        cache = self._cache
+        try:
+            return cache[name]
+        except KeyError:
+            pass
+        try:
+            column = self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name)
+        cache[name] = column
+        return column
+
+    def close(self):
+        """ Closes the underlying file (if any). Columns which have
+        already been read stay available.
+        """
+        close = getattr(self.columns, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def num_games(self):
+        return len(self.game_offsets) - 1
+
+    @property
+    def num_teams(self):
+        return self.team_names.shape[1]
+
+    def game_of(self, rows):
+        """ Returns the index of the game of each turn in `rows`. """
+        return numpy.searchsorted(self.game_offsets, rows, side="right") - 1
+
+    def maze_shape(self, games=None):
+        """ Returns the (width, height) of the mazes of `games`, which
+        must all be of the same size.
+        """
+        shapes = self.maze_shapes if games is None else self.maze_shapes[games]
+        if not len(shapes):
+            raise ValueError("No games selected.")
+        if (shapes != shapes[0]).any():
+            raise ValueError("The selected games have mazes of different sizes.")
+        return tuple(shapes[0])
+
+    def walls_of(self, game):
+        """ Returns the walls of `game` as a bool array (height, width). """
+        if "_wall_offsets" not in self._cache:
+            sizes = self.maze_shapes[:, 0] * self.maze_shapes[:, 1]
+            self._cache["_wall_offsets"] = numpy.concatenate([[0], sizes.cumsum()])
+        width, height = self.maze_shapes[game]
+        offset = self._cache["_wall_offsets"][game]
+        return self.walls[offset:offset + width * height].reshape(height, width)
+
+    def rows(self, games=None):
+        """ Returns the turns (rows) of `games` (all games if None). """
+        if games is None:
+            return numpy.arange(self.game_offsets[-1])
+        starts = self.game_offsets[:-1][games]
+        ends = self.game_offsets[1:][games]
+        return numpy.concatenate([numpy.arange(start, end)
+                                  for start, end in zip(starts, ends)] or
+                                 [numpy.zeros(0, dtype=numpy.int64)])
+
+def load_replay(path):
+    """ Reads a replay file written by `ReplayRecorder.save`.
+
+    The columns are read from the file when they are first used and
+    kept in memory afterwards. The returned `Replay` holds the file open
+    until it is closed.
+    """
+    _require_numpy()
+    return Replay(numpy.load(path))
+
+
+def _histogram(x, y, shape):
+    width, height = shape
+    counts = numpy.bincount(y * width + x, minlength=width * height)
+    return counts.reshape(height, width)
+
+def position_heatmap(replay, bots=None, games=None):
+    """ Counts the turns the bots have spent on each cell.
+
+    Parameters
+    ----------
+    replay : Replay
+        the recorded games
+    bots : sequence of int, optional
+        the bots to count (all if None)
+    games : sequence of int, optional
+        the games to count (all if None). Their mazes must have the
+        same size.
+
+    Returns
+    -------
+    heatmap : int array (height, width)
+    """
+    shape = replay.maze_shape(games)
+    positions = replay.positions
+    if games is not None:
+        positions = positions[replay.rows(games)]
+    if bots is not None:
+        positions = positions[:, bots]
+    positions = positions.reshape(-1, 2).astype(numpy.intp)
+    return _histogram(positions[:, 0], positions[:, 1], shape)
+
+def kill_map(replay, games=None):
+    """ Counts the harvesters which have been destroyed on each cell.
+
+    Returns
+    -------
+    kill_map : int array (height, width)
+    """
+    shape = replay.maze_shape(games)
+    kills = replay.kills
+    if games is not None:
+        kills = kills[numpy.in1d(replay.game_of(kills[:, 0]), games)]
+    return _histogram(kills[:, 3].astype(numpy.intp), kills[:, 4].astype(numpy.intp), shape)
+
+def time_to_first_food(replay):
+    """ Returns the number of turns until each team has eaten its first
+    food in each game.
+
+    Returns
+    -------
+    turns : int array (games, teams)
+        the turn (counted from the start of the game) of the first
+        eaten food or -1, if a team has not eaten anything
+    """
+    num_teams = replay.num_teams
+    eaten = replay.food_eaten
+    rows = eaten[:, 0]
+    games = replay.game_of(rows)
+    teams = replay.bot_teams[eaten[:, 1]]
+    first = numpy.empty((replay.num_games, num_teams), dtype=numpy.int64)
+    first.fill(numpy.iinfo(numpy.int64).max)
+    numpy.minimum.at(first, (games, teams), rows - replay.game_offsets[games])
+    first[first == numpy.iinfo(numpy.int64).max] = -1
+    return first
+
+def food_race(replay, game):
+    """ Returns the number of food items each team has eaten after each
+    turn of `game`.
+
+    Returns
+    -------
+    eaten : int array (turns, teams)
+    """
+    start, end = replay.game_offsets[game], replay.game_offsets[game + 1]
+    eaten = replay.food_eaten
+    eaten = eaten[(eaten[:, 0] >= start) & (eaten[:, 0] < end)]
+    counts = numpy.zeros((end - start, replay.num_teams), dtype=numpy.int64)
+    numpy.add.at(counts, (eaten[:, 0] - start, replay.bot_teams[eaten[:, 1]]), 1)
+    return counts.cumsum(axis=0)
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+""" A transport for player teams which run in a process on the same host.
+
+Instead of serialising every universe and sending it through a socket,
+the server writes the dynamic part of each universe (scores, bot positions
+and food) into a memory mapped file with a fixed layout. Only a tiny
+notification is sent through a pipe; the client writes its move back into
+the same region and notifies the server.
+
+Everything which does not change during a game (the walls, the teams and
+the bots) is sent once through the pipe when the game starts.
+
+Usage::
+
+    player = SharedMemoryTeamPlayer.start_process(team)
+    game_master.register_team(player)
+
+"""
+
+import logging
+import mmap
+import multiprocessing
+import os
+import struct
+import tempfile
+import time
+
+from .datamodel import Food, Maze, Team, Bot, CTFUniverse
+from .game_master import PlayerTimeout, PlayerDisconnected
+
+_logger = logging.getLogger("pelita.shared_memory")
+
+__docformat__ = "restructuredtext"
+
+TIMEOUT = 3
+
+# sequence number, bot index
+_HEADER = struct.Struct("<Ii")
+# sequence number, valid flag, move
+_REPLY = struct.Struct("<Iiii")
+
+
+class UniverseBuffer(object):
+    """ Fixed layout of the shared memory region.
+
+    The region starts with the header (sequence number and bot index),
+    followed by the team scores, the positions and noisy flags of the bots,
+    one byte per maze cell for the food and finally the reply slot.
+
+    The sequence number doubles as a lock: it is set to zero while the
+    server writes a new universe, so a reader which sees the same
+    number before and after reading the data has got a consistent state.
+
+    Parameters
+    ----------
+    universe : CTFUniverse
+        a universe which defines the static part of the game
+    buf : mmap or None, optional
+        the memory region of at least `size_for(universe)` bytes. If None,
+        `size` bytes must be mapped before the buffer can be used.
+    """
+    def __init__(self, universe, buf=None):
+        self.universe = universe
+        self.width = universe.maze.width
+        self.height = universe.maze.height
+        self._scores = struct.Struct("<%ii" % len(universe.teams))
+        self._bots = struct.Struct("<%ih" % (3 * len(universe.bots)))
+
+        self._scores_offset = _HEADER.size
+        self._bots_offset = self._scores_offset + self._scores.size
+        self._food_offset = self._bots_offset + self._bots.size
+        self._reply_offset = self._food_offset + self.width * self.height
+        self.size = self._reply_offset + _REPLY.size
+        assert self.size == self.size_for(universe)
+
+        # the maze without any food
+        self._static_cells = [cell.replace(Food.char, "")
+                              for cell in universe.maze._data]
+        self.buf = buf
+
+    @staticmethod
+    def size_for(universe):
+        """ Returns the size in bytes of the region for `universe`. """
+        return (_HEADER.size + 4 * len(universe.teams) + 6 * len(universe.bots) +
+                universe.maze.width * universe.maze.height + _REPLY.size)
+
+    def close(self):
+        """ Unmaps the memory region. """
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+
+    def write(self, seq, bot_index, universe):
+        """ Writes `universe` as the state for request `seq`. """
+        buf = self.buf
+        buf[0:_HEADER.size] = _HEADER.pack(0, bot_index)
+
+        buf[self._scores_offset:self._bots_offset] = self._scores.pack(
+            *[team.score for team in universe.teams])
+        bot_data = []
+        for bot in universe.bots:
+            bot_data.extend(bot.current_pos)
+            bot_data.append(bool(bot.noisy))
+        buf[self._bots_offset:self._food_offset] = self._bots.pack(*bot_data)
+        buf[self._food_offset:self._reply_offset] = "".join(
+            "\x01" if Food.char in cell else "\x00"
+            for cell in universe.maze._data)
+
+        buf[0:_HEADER.size] = _HEADER.pack(seq, bot_index)
+
+    def read(self, seq):
+        """ Reads the state for request `seq`.
+
+        Returns
+        -------
+        (bot_index, universe) : (int, CTFUniverse) or None
+            None, if the region holds the state of another request
+        """
+        buf = self.buf
+        header_seq, bot_index = _HEADER.unpack(buf[0:_HEADER.size])
+        if header_seq != seq:
+            return None
+
+        scores = self._scores.unpack(buf[self._scores_offset:self._bots_offset])
+        bot_data = self._bots.unpack(buf[self._bots_offset:self._food_offset])
+        food = buf[self._food_offset:self._reply_offset]
+
+        if _HEADER.unpack(buf[0:_HEADER.size])[0] != seq:
+            return None
+
+        maze_data = [cell + Food.char if has_food == "\x01" else cell
+                     for cell, has_food in zip(self._static_cells, food)]
+        maze = Maze(self.width, self.height, data=maze_data)
+
+        teams = [Team(team.index, team.name, team.zone, score, list(team.bots))
+                 for team, score in zip(self.universe.teams, scores)]
+        bots = [Bot(bot.index, bot.initial_pos, bot.team_index, bot.homezone,
+                    current_pos=bot_data[3 * i:3 * i + 2],
+                    noisy=bool(bot_data[3 * i + 2]))
+                for i, bot in enumerate(self.universe.bots)]
+        return bot_index, CTFUniverse(maze, teams, bots)
+
+    def write_reply(self, seq, move):
+        """ Writes `move` as the reply to request `seq`. """
+        try:
+            dx, dy = move
+            data = _REPLY.pack(seq, 1, dx, dy)
+        except (TypeError, ValueError, struct.error):
+            # not a valid move; the server will deal with it
+            data = _REPLY.pack(seq, 0, 0, 0)
+        self.buf[self._reply_offset:self.size] = data
+
+    def has_reply(self, seq):
+        """ Returns True, if a reply (valid or not) to request `seq`
+        has been written.
+        """
+        return _REPLY.unpack(self.buf[self._reply_offset:self.size])[0] == seq
+
+    def read_reply(self, seq):
+        """ Returns the move for request `seq` or None, if there is no
+        valid reply.
+        """
+        reply_seq, valid, dx, dy = _REPLY.unpack(
+            self.buf[self._reply_offset:self.size])
+        if reply_seq != seq or not valid:
+            return None
+        return (dx, dy)
+
+
+def _create_mapping(size):
+    """ Creates a temporary file of `size` bytes and maps it.
+
+    Returns the path and the mapping. The file may be removed as soon as
+    all processes have mapped it.
+    """
+    shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    fd, path = tempfile.mkstemp(prefix="pelita-", dir=shm_dir)
+    try:
+        os.write(fd, "\x00" * size)
+        buf = mmap.mmap(fd, size)
+    finally:
+        os.close(fd)
+    return path, buf
+
+def _open_mapping(path, size):
+    with open(path, "r+b") as f:
+        return mmap.mmap(f.fileno(), size)
+
+
+class SharedMemoryTeamPlayer(object):
+    """ Relays all requests of the GameMaster to a team which runs
+    in another process on the same host.
+
+    The other end of `connection` must be served by `serve_team()`.
+
+    Parameters
+    ----------
+    connection : multiprocessing.Connection
+        the server end of the notification pipe
+    process : multiprocessing.Process, optional
+        the process which runs the team
+    timeout : float, optional, default = TIMEOUT
+        the time in seconds a team may take for a request
+    """
+    def __init__(self, connection, process=None, timeout=TIMEOUT):
+        self.connection = connection
+        self.process = process
+        self.timeout = timeout
+        self.buffer = None
+        # the mapped file of the last game, until the team has mapped it
+        self._mapping_path = None
+        self._seq = 0
+        self._connected = True
+
+    @classmethod
+    def start_process(cls, team, timeout=TIMEOUT):
+        """ Starts a new process which serves `team` and returns the
+        player which talks to it.
+        """
+        server_end, client_end = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=serve_team,
+                                          args=(team, client_end, server_end))
+        process.daemon = True
+        process.start()
+        client_end.close()
+        return cls(server_end, process, timeout)
+
+    def is_connected(self):
+        if self.process is not None and not self.process.is_alive():
+            return False
+        return self._connected
+
+    def _next_seq(self):
+        # zero is reserved for 'being written'
+        self._seq = self._seq % 0xffffffff + 1
+        return self._seq
+
+    def _query(self, message):
+        """ Sends `message` and waits for the reply with the same
+        sequence number. Replies to earlier requests are discarded.
+
+        Raises `PlayerTimeout` with the last provisional reply, if the
+        final reply does not arrive in time.
+        """
+        seq = message[1]
+        provisional = None
+        deadline = time.time() + self.timeout
+        try:
+            self.connection.send(message)
+            while self.connection.poll(max(0, deadline - time.time())):
+                kind, reply_seq, value = self.connection.recv()
+                if reply_seq != seq:
+                    _logger.info("Discarding stale reply %r (expected %r).",
+                                 reply_seq, seq)
+                elif kind == "provisional":
+                    provisional = value
+                else:
+                    # the team handles its requests in order, so it
+                    # has mapped the file of the game by now
+                    self._remove_mapping_file()
+                    return value
+        except (EOFError, IOError, OSError):
+            self._connected = False
+            raise PlayerDisconnected()
+        raise PlayerTimeout(provisional)
+
+    def _set_bot_ids(self, bot_ids):
+        try:
+            return self._query(("set_bot_ids", self._next_seq(), list(bot_ids)))
+        except PlayerTimeout:
+            pass
+
+    def _remove_mapping_file(self):
+        if self._mapping_path is not None:
+            os.remove(self._mapping_path)
+            self._mapping_path = None
+
+    def _set_initial(self, universe):
+        # the mapping of the previous game of a session
+        if self.buffer is not None:
+            self.buffer.close()
+        self._remove_mapping_file()
+
+        path, buf = _create_mapping(UniverseBuffer.size_for(universe))
+        self.buffer = UniverseBuffer(universe, buf)
+        # removed after the reply of the team, which may come late
+        self._mapping_path = path
+        try:
+            return self._query(("set_initial", self._next_seq(),
+                                (universe, path)))
+        except PlayerTimeout:
+            _logger.warning("Team did not reply to set_initial in time.")
+
+    def _get_move(self, bot_idx, universe):
+        seq = self._next_seq()
+        self.buffer.write(seq, bot_idx, universe)
+        # leave some time for the reply
+        self._query(("play_now", seq, self.timeout * 0.9))
+        if not self.buffer.has_reply(seq):
+            # e.g. the team has not mapped the file of this game
+            _logger.warning("Team replied to request %r without writing a move.", seq)
+            raise PlayerTimeout()
+        return self.buffer.read_reply(seq)
+
+    def close(self):
+        """ Closes the connection and stops the team process. """
+        self._connected = False
+        self.connection.close()
+        if self.buffer is not None:
+            self.buffer.close()
+        self._remove_mapping_file()
+        if self.process is not None:
+            # The process may have inherited the pipes of other teams
+            # and would therefore not notice that we closed ours.
+            self.process.join(0.1)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(1)
+
+
+def serve_team(team, connection, other_end=None):
+    """ Answers the requests of a `SharedMemoryTeamPlayer` with `team`.
+
+    Returns when the connection is closed.
+
+    Parameters
+    ----------
+    team : PlayerTeam
+        the team which handles the requests
+    connection : multiprocessing.Connection
+        the client end of the notification pipe
+    other_end : multiprocessing.Connection, optional
+        the server end of the pipe, which is closed in this process
+    """
+    if other_end is not None:
+        other_end.close()
+
+    buffer = None
+    try:
+        while True:
+            try:
+                command, seq, args = connection.recv()
+            except EOFError:
+                break
+
+            if command == "play_now":
+                state = buffer.read(seq)
+                if state is None:
+                    _logger.info("Skipping stale request %r.", seq)
+                    continue
+                bot_index, universe = state
+                if hasattr(team, "_set_move_budget"):
+                    def send_provisional(move, seq=seq):
+                        connection.send(("provisional", seq, move))
+                    team._set_move_budget(args, send_provisional)
+                buffer.write_reply(seq, team._get_move(bot_index, universe))
+                connection.send(("reply", seq, None))
+            elif command == "set_bot_ids":
+                connection.send(("reply", seq, team._set_bot_ids(args)))
+            elif command == "set_initial":
+                universe, path = args
+                if buffer is not None:
+                    buffer.close()
+                buffer = UniverseBuffer(universe,
+                    _open_mapping(path, UniverseBuffer.size_for(universe)))
+                connection.send(("reply", seq, team._set_initial(universe)))
+            else:
+                _logger.warning("Unknown command %r.", command)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        connection.close()
+        if buffer is not None:
+            buffer.close()
@@ -12,9 +12,11 @@
 import signal
 import itertools
 
-from .messaging import actor_of, RemoteConnection
-from .actors import ClientActor, ServerActor, ViewerActor
+from .messaging import actor_of, actor_registry, RemoteConnection
+from .messaging.remote import COMPRESSION_THRESHOLD
+from .actors import ClientActor, ServerActor, ViewerActor, BroadcastActor, BroadcastHub
 from .layout import get_random_layout, get_layout_by_name
+from .shared_memory import SharedMemoryTeamPlayer
 
 from .viewer import AsciiViewer
 from .ui.tk_viewer import TkViewer
@@ -24,12 +26,47 @@
 
 __docformat__ = "restructuredtext"
 
-def auto_connect(connect_func, retries=10, delay=0.5, silent=True):
-     # Try retries times to connect
+def parse_address(address):
+    """ Parses an address of the form "tcp://host:port" or "unix:///path".
+
+    Returns
+    -------
+    (host, port, path) : tuple
+        `host` and `port` for a TCP address or `path` for a Unix domain
+        socket. The unused entries are None.
+
+    Raises
+    ------
+    ValueError
+        if the address cannot be parsed
+    """
+    scheme, sep, location = address.partition("://")
+    if not sep or not location:
+        raise ValueError("Address %r is not of the form 'scheme://location'." % address)
+    if scheme == "tcp":
+        host, sep, port = location.rpartition(":")
+        if not sep:
+            raise ValueError("TCP address %r has no port." % address)
+        try:
+            return host, int(port), None
+        except ValueError:
+            raise ValueError("TCP address %r has an invalid port." % address)
+    elif scheme == "unix":
+        return None, None, location
+    raise ValueError("Unknown scheme %r in address %r." % (scheme, address))
+
+def auto_connect(connect_func, retries=10, delay=0.5, silent=True,
+                 initial_delay=0.02):
+    """ Calls `connect_func` until it returns True.
+
+    The waiting time between two attempts starts at `initial_delay`
+    and is doubled after each attempt until it reaches `delay`.
+    """
     if retries is None:
         iter = itertools.count()
     else:
         iter = xrange(retries)
+    wait = min(initial_delay, delay)
     for i in iter:
         if connect_func():
             return True
@@ -38,12 +75,13 @@ def auto_connect(connect_func, retries=10, delay=0.5, silent=True):
             if retries is None:
                 if not silent:
                     sys.stdout.write("[%s]\b\b\b" % "-\\|/"[i % 4])
-                time.sleep(delay)
+                time.sleep(wait)
             else:
                 if i < retries - 1:
                     if not silent:
-                        print " Waiting %i seconds. (%d/%d)" % (delay, i + 1, retries)
-                    time.sleep(delay)
+                        print " Waiting %.2f seconds. (%d/%d)" % (wait, i + 1, retries)
+                    time.sleep(wait)
+            wait = min(wait * 2, delay)
     if not silent:
         print "Giving up."
     return False
@@ -59,6 +97,9 @@ class SimpleServer(object):
     The Parameters 'layout_string', 'layout_name' and 'layout_file' are mutually
     exclusive. If neither is supplied, a layout will be selected at random.
 
+    The game starts as soon as both teams have connected and the viewer
+    has been registered by one of the run_* methods.
+
     Parameters
     ----------
     layout_string : string, optional
@@ -79,11 +120,27 @@ class SimpleServer(object):
         The port which the server runs on. Default: 50007.
     local : boolean, optional
         If True, we only setup a local server. Default: True.
+    address : string, optional
+        Listen on "tcp://host:port" or on the Unix domain socket
+        "unix:///path". Overrides 'host', 'port' and 'local'.
+    broadcast : boolean, optional
+        If True, viewers may also connect to the actor "pelita-broadcast",
+        which encodes each snapshot only once for all of its viewers and
+        accepts viewers during a game. Default: False.
+    games : int, optional
+        The number of games which the two teams play one after the other
+        over the same connection. The teams change sides after each game.
+        Without a fixed layout, each game uses a new random layout.
+        Default: 1.
+    compress : boolean, optional
+        If True, large frames to remote peers are compressed, if the
+        peer is able to read them. Default: False.
 
     Raises
     ------
     ValueError:
         if more than one layout keyword is specified
+        or if the address cannot be parsed
     IOError:
         if layout_file was given, but file does not exist
 
@@ -91,7 +148,8 @@ class SimpleServer(object):
     def __init__(self, layout_string=None, layout_name=None, layout_file=None,
                  layout_filter = 'normal_without_dead_ends',
                  players=4, rounds=3000, host="", port=50007,
-                 local=True, silent=True, dump_to_file=None):
+                 local=True, silent=True, dump_to_file=None, address=None,
+                 broadcast=False, games=1, compress=False):
 
         if (layout_string and layout_name or
                 layout_string and layout_file or
@@ -109,11 +167,24 @@ def __init__(self, layout_string=None, layout_name=None, layout_file=None,
         else:
             self.layout = get_random_layout(filter=layout_filter)
 
+        if games < 1:
+            raise ValueError("At least one game must be played.")
+        self.games = games
+        self.layouts = [self.layout]
+        for _ in range(games - 1):
+            if layout_string or layout_name or layout_file:
+                self.layouts.append(self.layout)
+            else:
+                self.layouts.append(get_random_layout(filter=layout_filter))
+
         self.players = players
         self.rounds = rounds
         self.silent = silent
 
-        if local:
+        self.path = None
+        if address is not None:
+            self.host, self.port, self.path = parse_address(address)
+        elif local:
             self.host = None
             self.port = None
             signal.signal(signal.SIGINT, keyboard_interrupt_handler)
@@ -123,6 +194,9 @@ def __init__(self, layout_string=None, layout_name=None, layout_file=None,
 
         self.server = None
         self.remote = None
+        self.broadcast = broadcast
+        self.broadcast_actor = None
+        self.compression_threshold = COMPRESSION_THRESHOLD if compress else None
 
         self.dump_to_file = dump_to_file
 
@@ -132,6 +206,8 @@ def stop(self):
         """ Stops the server.
         """
         self.server.stop()
+        if self.broadcast_actor:
+            self.broadcast_actor.stop()
         if self.remote:
             self.remote.stop()
 
@@ -140,16 +216,34 @@ def _startup(self):
         """
         self.server = actor_of(ServerActor, "pelita-main")
 
-        if self.port is not None:
+        if self.path is not None:
+            if not self.silent:
+                print "Starting remote connection on %s" % self.path
+            self.remote = RemoteConnection(self.compression_threshold).start_unix_listener(path=self.path)
+        elif self.port is not None:
             if not self.silent:
                 print "Starting remote connection on %s:%s" % (self.host, self.port)
-            self.remote = RemoteConnection().start_listener(host=self.host, port=self.port)
+            self.remote = RemoteConnection(self.compression_threshold).start_listener(host=self.host, port=self.port)
+
+        if self.broadcast:
+            self.broadcast_actor = actor_of(BroadcastActor, "pelita-broadcast")
+
+        if self.remote:
             self.remote.register("pelita-main", self.server)
+            if self.broadcast_actor:
+                self.remote.register("pelita-broadcast", self.broadcast_actor)
             self.remote.start_all()
         else:
             if not self.silent:
                 print "Starting actor '%s'" % "pelita-main"
             self.server.start()
+            if self.broadcast_actor:
+                self.broadcast_actor.start()
+
+        if self.broadcast_actor:
+            hub = BroadcastHub()
+            self.broadcast_actor.notify("set_hub", [hub])
+            self.server.notify("set_broadcast_hub", [hub])
 
         # Begin code for automatic closing the server when a game has run
         # TODO: this is bit of a hack and should be done by linking
@@ -159,7 +253,9 @@ def _startup(self):
             self.server.notify("set_dump_file", [self.dump_to_file])
 
         self.server.notify("set_auto_shutdown", [True])
-        if self.port is not None:
+        # the game starts when the viewer has been registered in run_*
+        self.server.notify("hold_start")
+        if self.remote:
             def on_stop():
                 print "STOP"
                 _logger.info("Automatically stopping remote connection.")
@@ -169,7 +265,8 @@ def on_stop():
 
         # End code for automatic closing
 
-        self.server.notify("initialize_game", [self.layout, self.players, self.rounds])
+        for layout in self.layouts:
+            self.server.notify("schedule_game", [layout, self.players, self.rounds])
 
     def _run_save(self, main_block):
         """ Method which executes `main_block` and rescues
@@ -181,6 +278,8 @@ def _run_save(self, main_block):
             print "Server received CTRL+C. Exiting."
         finally:
             self.server.stop()
+            if self.broadcast_actor:
+                self.broadcast_actor.stop()
             if self.remote:
                 self.remote.stop()
 
@@ -199,6 +298,7 @@ def run_simple(self, viewerclass):
         def main():
             viewer = viewerclass()
             self.server.notify("register_viewer", [viewer])
+            self.server.notify("release_start")
 
             # We wait until the server is dead
             while self.server.is_alive:
@@ -206,14 +306,18 @@ def main():
 
         self._run_save(main)
 
-    def run_tk(self, geometry=None):
+    def run_tk(self, geometry=None, fps=None):
         """ Starts a game with the Tk viewer.
         This method does not return until the server or Tk is stopped.
+
+        With a target frame rate `fps`, the viewer skips states instead
+        of slowing down the game.
         """
         def main():
             # Register a tk_viewer
-            viewer = TkViewer(geometry=geometry)
+            viewer = TkViewer(geometry=geometry, fps=fps)
             self.server.notify("register_viewer", [viewer])
+            self.server.notify("release_start")
             # We wait until tk closes
             viewer.root.mainloop()
 
@@ -241,8 +345,12 @@ class SimpleClient(object):
         The port which the server runs on. Default: 50007.
     local : boolean, optional
         If True, we only connect to a local server. Default: True.
+    address : string, optional
+        Connect to "tcp://host:port" or to the Unix domain socket
+        "unix:///path". Overrides 'host', 'port' and 'local'.
     """
-    def __init__(self, team, team_name="", host="", port=50007, local=True):
+    def __init__(self, team, team_name="", host="", port=50007, local=True,
+                 address=None):
         self.team = team
 
         if hasattr(self.team, "team_name"):
@@ -253,7 +361,10 @@ def __init__(self, team, team_name="", host="", port=50007, local=True):
 
         self.main_actor = "pelita-main"
 
-        if local:
+        self.path = None
+        if address is not None:
+            self.host, self.port, self.path = parse_address(address)
+        elif local:
             self.host = None
             self.port = None
         else:
@@ -261,7 +372,10 @@ def __init__(self, team, team_name="", host="", port=50007, local=True):
             self.port = port
 
     def _auto_connect(self, client_actor, retries=10, delay=0.5):
-        if self.port is None:
+        if self.path is not None:
+            address = "%s on %s" % (self.main_actor, self.path)
+            connect = lambda: client_actor.connect_unix(self.main_actor, self.path)
+        elif self.port is None:
             address = "%s" % self.main_actor
             connect = lambda: client_actor.connect_local(self.main_actor)
         else:
@@ -272,13 +386,25 @@ def _auto_connect(self, client_actor, retries=10, delay=0.5):
             print "%s: No connection to %s." % (client_actor, address)
             return
 
+        if self.path is None and self.port is None:
+            # a local client is finished as soon as the local server is
+            server_actor = actor_registry.get_by_name(self.main_actor)
+            if server_actor is not None:
+                wait = server_actor.join
+            else:
+                # the server is already gone
+                wait = client_actor.actor_ref.join
+        else:
+            # the client actor stops when the connection is closed
+            wait = client_actor.actor_ref.join
+
         try:
             while client_actor.actor_ref.is_alive:
                 if client_actor.is_server_connected() is False:
                     client_actor.actor_ref.stop()
                     client_actor.actor_ref.join(1)
                 else:
-                    client_actor.actor_ref.join(1)
+                    wait(1)
         except KeyboardInterrupt:
             print "%s: Client received CTRL+C. Exiting." % client_actor
         finally:
@@ -300,7 +426,7 @@ def autoplay_background(self):
         Useful for defining both server and client in the same Python script.
         For standalone clients, the normal autoplay method is sufficient.
         """
-        if self.port is None:
+        if self.port is None and self.path is None:
             self.autoplay_thread()
         else:
             self.autoplay_process()
@@ -318,11 +444,30 @@ def autoplay_thread(self):
         background_thread.start()
         return background_thread
 
+    def autoplay_shared_memory(self, server):
+        """ Plays in a background process on the same host as `server`.
+
+        Instead of using the actor connection, the universe states and
+        moves are exchanged through a shared memory region.
+
+        Parameters
+        ----------
+        server : SimpleServer
+            a server which runs in this process
+        """
+        team_player = SharedMemoryTeamPlayer.start_process(self.team)
+        server.server.notify("register_team", [team_player, self.team_name])
+        return team_player.process
+
 class SimpleViewer(object):
-    def __init__(self, main_actor="pelita-main", host="", port=50007, local=True):
+    def __init__(self, main_actor="pelita-main", host="", port=50007, local=True,
+                 address=None):
         self.main_actor = main_actor
 
-        if local:
+        self.path = None
+        if address is not None:
+            self.host, self.port, self.path = parse_address(address)
+        elif local:
             self.host = None
             self.port = None
         else:
@@ -333,7 +478,10 @@ def __init__(self, main_actor="pelita-main", host="", port=50007, local=True):
 
     def _auto_connect(self, retries, delay):
 
-        if self.port is None:
+        if self.path is not None:
+            address = "%s on %s" % (self.main_actor, self.path)
+            connect = lambda: self.viewer_actor.connect_unix(self.main_actor, self.path, silent=True)
+        elif self.port is None:
             address = "%s" % self.main_actor
             connect = lambda: self.viewer_actor.connect_local(self.main_actor, silent=True)
         else:
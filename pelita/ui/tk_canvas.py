@@ -3,6 +3,7 @@
 import Tkinter
 import tkFont
 import Queue
+import time
 
 from .. import datamodel
 from .tk_sprites import *
@@ -111,6 +112,12 @@ def __init__(self, master, geometry=None):
 
         self.current_universe = None
 
+        # the positions of the drawn food
+        self.drawn_food = set()
+        # the (round, turn) of the drawn universe
+        self.drawn_step = None
+        self.drawn_title = None
+
     def init_canvas(self):
         self.score = Tkinter.Canvas(self.master.frame, width=self.mesh_graph.screen_width, height=30)
         self.score.config(background="white")
@@ -185,14 +192,17 @@ def update(self, universe, events, round=None, turn=None):
         if not universe and not self.size_changed:
             return
 
-        if universe:
-            self.current_universe = universe
-
         if round is not None and turn is not None:
             self.game_status_info = lambda: self.draw_status_info(turn, round)
         self.game_status_info()
 
-        self.draw_universe(self.current_universe)
+        if universe:
+            self.current_universe = universe
+            step = (round, turn) if round is not None else None
+            self.draw_universe(universe, events, step)
+        else:
+            # a mere resize
+            self.draw_universe(self.current_universe)
 
         if events:
             for team_wins in events.filter_type(datamodel.TeamWins):
@@ -205,19 +215,55 @@ def update(self, universe, events, round=None, turn=None):
         self.game_finish_overlay()
 
 
-    def draw_universe(self, universe):
+    def draw_universe(self, universe, events=None, step=None):
+        """ Draws `universe`.
+
+        Everything is drawn anew only after a change of the size. Otherwise,
+        only the changes are applied to the canvas: the food eaten in `events`
+        is removed and the bots which have changed are moved or redrawn.
+
+        Parameters
+        ----------
+        universe : CTFUniverse
+            the universe to draw
+        events : TypeAwareList of UniverseEvent, optional
+            the events which led from the drawn universe to `universe`
+        step : tuple of (int, int), optional
+            the round and turn of `universe`
+        """
         self.mesh_graph.num_x = universe.maze.width
         self.mesh_graph.num_y = universe.maze.height
 
         self.draw_background(universe)
         self.draw_maze(universe)
-        self.draw_food(universe)
+        if self.size_changed:
+            self.draw_food(universe)
+        else:
+            self.update_food(universe, events, step)
+        self.drawn_step = step
 
         self.draw_title(universe)
         self.draw_bots(universe)
 
         self.size_changed = False
 
+    def follows_drawn_step(self, step, num_bots):
+        """ Returns True, if `step` is the turn directly after the drawn
+        one, so that its events tell everything which has changed.
+        """
+        if step is None or self.drawn_step is None:
+            return False
+        round, turn = step
+        drawn_round, drawn_turn = self.drawn_step
+        if drawn_turn is None:
+            return False
+        if turn is None:
+            # the final message of a game does not change the universe
+            return round == drawn_round
+        if drawn_turn + 1 < num_bots:
+            return (round, turn) == (drawn_round, drawn_turn + 1)
+        return (round, turn) == (drawn_round + 1, 0)
+
     def draw_background(self, universe):
         """ Draws a line between blue and red team.
         """
@@ -233,20 +279,24 @@ def draw_background(self, universe):
         for color, x_orig in zip(cols, (center - 3, center + 3, center)):
             x_width = self.mesh_graph.half_scale_x // 4
 
-            x_prev = None
-            y_prev = None
+            # a single line through all points
+            points = []
             for y in range((self.mesh_graph.mesh_height -1 )* 10):
                 x_real = x_orig + x_width * math.sin(y * 10)
                 y_real = self.mesh_graph.mesh_to_screen_y(y / 10.0, 0)
-                if x_prev and y_prev:
-                    self.canvas.create_line((x_prev, y_prev, x_real, y_real), width=scale, fill=color, tag="background")
-                x_prev, y_prev = x_real, y_real
+                points.extend((x_real, y_real))
+            if len(points) >= 4:
+                self.canvas.create_line(points, width=scale, fill=color, tag="background")
 
     def draw_title(self, universe):
-        self.score.delete("title")
         center = self.mesh_graph.screen_width // 2
         left_team = "%s %d " % (universe.teams[0].name, universe.teams[0].score)
         right_team = " %d %s" % (universe.teams[1].score, universe.teams[1].name)
+        if self.drawn_title == (left_team, right_team, center):
+            return
+        self.drawn_title = (left_team, right_team, center)
+
+        self.score.delete("title")
         font_size = guess_size(left_team+':'+right_team,
                                self.mesh_graph.screen_width,
                                30,
@@ -322,29 +372,40 @@ def resize(self, event):
 
     def draw_food(self, universe):
         self.canvas.delete("food")
-        for position, items in universe.maze.iteritems():
-            model_x, model_y = position
-            if datamodel.Food in items:
-                food_item = Food(self.mesh_graph, model_x, model_y)
-                food_item.draw(self.canvas)
+        self.drawn_food = set()
+        for position in universe.food_list:
+            self.add_food(position)
+
+    def add_food(self, position):
+        model_x, model_y = position
+        food_item = Food(self.mesh_graph, model_x, model_y)
+        food_item.draw(self.canvas)
+        self.drawn_food.add(position)
+
+    def remove_food(self, position):
+        self.canvas.delete(Food.food_pos_tag(position))
+        self.drawn_food.discard(position)
+
+    def update_food(self, universe, events, step):
+        """ Removes the eaten food from the canvas. """
+        if events is not None and self.follows_drawn_step(step, len(universe.bots)):
+            for food_eaten in events.filter_type(datamodel.FoodEaten):
+                self.remove_food(food_eaten.food_pos)
+            return
+
+        # We may have missed some turns (or this is a new universe),
+        # so we compare the drawn food with the universe.
+        food = set(universe.food_list)
+        for position in self.drawn_food - food:
+            self.remove_food(position)
+        for position in food - self.drawn_food:
+            self.add_food(position)
 
     def draw_maze(self, universe):
         if not self.size_changed:
             return
         self.canvas.delete("wall")
-        for position, items in universe.maze.iteritems():
-            model_x, model_y = position
-            if datamodel.Wall in items:
-                wall_item = Wall(self.mesh_graph, model_x, model_y)
-                wall_item.wall_neighbours = []
-                for dx in [-1, 0, 1]:
-                    for dy in [-1, 0, 1]:
-                        try:
-                            if datamodel.Wall in universe.maze[model_x + dx, model_y + dy]:
-                                wall_item.wall_neighbours.append( (dx, dy) )
-                        except IndexError:
-                            pass
-                wall_item.draw(self.canvas)
+        Walls.for_maze(universe.maze).draw(self.canvas, self.mesh_graph)
 
     def init_bots(self, universe):
         for bot in universe.bots:
@@ -357,16 +418,39 @@ def draw_bots(self, universe):
         for bot_idx, bot_sprite in self.bot_sprites.iteritems():
             bot_sprite.position = universe.bots[bot_sprite.bot_idx].current_pos
 
-            bot_sprite.redraw(self.canvas, universe)
+            if self.size_changed:
+                bot_sprite.redraw(self.canvas, universe)
+            else:
+                bot_sprite.update(self.canvas, universe)
+
 
+#: the longest time (in seconds) between two looks at an idle frame queue
+MAX_IDLE_INTERVAL = 0.1
 
 class TkApplication(object):
-    def __init__(self, queue, geometry=None, master=None):
+    """ The Tk application which draws the observed game states.
+
+    Parameters
+    ----------
+    queue : Queue.Queue or ViewerQueue
+        the queue of observed states. A `ViewerQueue` (of tuples
+        ``(round, turn, universe, events)``) must be read with
+        `read_frames` instead of `read_queue`.
+    geometry : tuple, optional
+        the size of the window in pixels
+    master : Tkinter.Tk
+        the root window
+    fps : float, optional
+        the target frame rate for `read_frames`
+    """
+    def __init__(self, queue, geometry=None, master=None, fps=25):
         self.master = master
         self.frame = Tkinter.Frame(self.master)
         self.master.title("Pelita")
 
         self.queue = queue
+        self.frame_interval = 1.0 / fps
+        self.poll_interval = self.frame_interval
 
         self.frame.pack(fill=Tkinter.BOTH, expand=Tkinter.YES)
 
@@ -392,6 +476,30 @@ def read_queue(self, event=None):
             if not event:
                 self.master.after(1, self.read_queue)
 
+    def read_frames(self):
+        """ Draws the latest state of a coalescing `ViewerQueue`.
+
+        Looks at the queue once per frame. While nothing happens, the
+        intervals grow up to `MAX_IDLE_INTERVAL`.
+        """
+        start = time.time()
+        item = self.queue.get(timeout=0)
+        if item is not None:
+            round_, turn, universe, events = item
+            self.observe({"round": round_,
+                          "turn": turn,
+                          "universe": universe,
+                          "events": events})
+            self.queue.task_done()
+            self.poll_interval = self.frame_interval
+        else:
+            # redraws after a resize
+            self.observe({})
+            self.poll_interval = min(self.poll_interval * 2, MAX_IDLE_INTERVAL)
+
+        delay = self.poll_interval - (time.time() - start)
+        self.master.after(max(1, int(delay * 1000)), self.read_frames)
+
     def observe(self, observed):
         universe = observed.get("universe")
         events = observed.get("events")
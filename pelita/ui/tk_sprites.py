@@ -3,6 +3,8 @@
 import cmath
 import math
 
+from .. import datamodel
+
 def col(red, green, blue):
     """Convert the given colours [0, 255] to HTML hex colours."""
     return "#%02x%02x%02x" % (red, green, blue)
@@ -65,8 +67,39 @@ def __init__(self, mesh, team=0, bot_idx=0, **kwargs):
         self.bot_idx = bot_idx
         self.team = team
 
+        # the position and shape of the drawn bot
+        self.drawn_position = None
+        self.drawn_shape = None
+
         super(BotSprite, self).__init__(mesh, **kwargs)
 
+    def shape(self, universe):
+        """ Returns everything, except the position, which
+        determines the drawing of the bot.
+        """
+        if universe.bots[self.bot_idx].is_harvester:
+            return ("harvester", self.direction)
+        # the destroyer always looks the same
+        return ("destroyer", None)
+
+    def update(self, canvas, universe):
+        """ Brings the drawn bot up to date.
+
+        If only the position has changed, the drawn items are moved.
+        Otherwise, the bot is redrawn.
+        """
+        shape = self.shape(universe)
+        if self.drawn_position is None or shape != self.drawn_shape:
+            self.redraw(canvas, universe)
+            return
+
+        old_x, old_y = self.drawn_position
+        if (old_x, old_y) != self.position:
+            canvas.move(self.tag,
+                        (self.x - old_x) * self.mesh.rect_width,
+                        (self.y - old_y) * self.mesh.rect_height)
+            self.drawn_position = self.position
+
     def draw_bot(self, canvas, outer_col, eye_col, mirror=False):
         direction = self.direction
 
@@ -88,6 +121,9 @@ def draw_bot(self, canvas, outer_col, eye_col, mirror=False):
         canvas.create_oval(eye_box, fill=eye_col, width=0, tag=self.tag)
 
     def draw(self, canvas, universe):
+        self.drawn_position = self.position
+        self.drawn_shape = self.shape(universe)
+
         is_harvester = universe.bots[self.bot_idx].is_harvester
         if is_harvester:
             if self.team == 0:
@@ -136,39 +172,106 @@ def draw_destroyer(self, canvas, outer_col, eye_col, mirror=False):
         eye_box_l = [self.screen((item.real, item.imag)) for item in eye_box_l]
         canvas.create_oval(eye_box_l, fill=eye_col, width=0, tag=self.tag)
 
-class Wall(TkSprite):
-    def draw(self, canvas, universe=None):
-        scale = (self.mesh.half_scale_x + self.mesh.half_scale_y) * 0.5
-        if not ((0, 1) in self.wall_neighbours or
-                (1, 0) in self.wall_neighbours or
-                (0, -1) in self.wall_neighbours or
-                (-1, 0) in self.wall_neighbours):
-            # if there is no direct neighbour, we can’t connect.
-            # draw only a small dot.
-            # TODO add diagonal lines
-            canvas.create_line(self.screen((-0.3, 0)), self.screen((+0.3, 0)), fill=col(48, 26, 22),
-                               width=0.8 * scale, tag=(self.tag, "wall"), capstyle="round")
-        else:
-            neighbours = [(-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0)]
-            for dx in [-1, 0, 1]:
-                for dy in [-1, 0, 1]:
-                    if (dx, dy) in self.wall_neighbours:
-                        if dx == dy == 0:
-                            continue
-                        if dx * dy != 0:
-                            continue
-                        index = neighbours.index((dx, dy))
-                        if (neighbours[(index + 1) % len(neighbours)] in self.wall_neighbours and
-                            neighbours[(index - 1) % len(neighbours)] in self.wall_neighbours):
-                            pass
-                        else:
-                            canvas.create_line(self.screen((0, 0)), self.screen((2*dx, 2*dy)), fill=col(48, 26, 22),
-                                               width=0.8 * scale, tag=(self.tag, "wall"), capstyle="round")
+class Walls(object):
+    """ The walls of a maze as a small number of straight lines.
+
+    Every wall is connected to its direct neighbours by a line through
+    the centres of both cells, unless the connection lies inside a
+    larger block of walls. Connections which continue each other are
+    merged into a single line. A wall without direct neighbours is
+    drawn as a small dot.
+
+    The lines depend only on the maze, so they are computed once for
+    each maze and shared by all viewers. Use `Walls.for_maze()`.
+
+    Parameters
+    ----------
+    wall_positions : set of tuple of (int, int)
+        the positions of all walls
+
+    Attributes
+    ----------
+    lines : list of tuple of (int, int, int, int)
+        the start and end cells (x1, y1, x2, y2) of the lines
+    dots : list of tuple of (int, int)
+        the walls without direct neighbours
+    """
+    # the lines of the recently drawn mazes
+    _cache = {}
+    _cache_size = 16
+
+    def __init__(self, wall_positions):
+        neighbours = [(-1, -1), (0, -1), (1, -1), (1, 0), (1, 1), (0, 1), (-1, 1), (-1, 0)]
+        # the connections to the right and downwards, by left or upper cell
+        horizontal = set()
+        vertical = set()
+        self.dots = []
+        for x, y in wall_positions:
+            wall_neighbours = set((dx, dy) for dx, dy in neighbours
+                                  if (x + dx, y + dy) in wall_positions)
+            if not wall_neighbours.intersection(((0, 1), (1, 0), (0, -1), (-1, 0))):
+                # if there is no direct neighbour, we can’t connect.
+                # TODO add diagonal lines
+                self.dots.append((x, y))
+                continue
+            for index, (dx, dy) in enumerate(neighbours):
+                if dx * dy != 0 or (dx, dy) not in wall_neighbours:
+                    continue
+                if (neighbours[(index + 1) % len(neighbours)] in wall_neighbours and
+                    neighbours[(index - 1) % len(neighbours)] in wall_neighbours):
+                    # inside a block of walls
+                    continue
+                if dy == 0:
+                    horizontal.add((min(x, x + dx), y))
+                else:
+                    vertical.add((x, min(y, y + dy)))
+
+        self.lines = []
+        for x, y in sorted(horizontal, key=lambda pos: (pos[1], pos[0])):
+            if (x - 1, y) not in horizontal:
+                end = x + 1
+                while (end, y) in horizontal:
+                    end += 1
+                self.lines.append((x, y, end, y))
+        for x, y in sorted(vertical):
+            if (x, y - 1) not in vertical:
+                end = y + 1
+                while (x, end) in vertical:
+                    end += 1
+                self.lines.append((x, y, x, end))
+
+    @classmethod
+    def for_maze(cls, maze):
+        """ Returns the (possibly cached) `Walls` of `maze`. """
+        key = (maze.width, maze.height,
+               "".join("#" if datamodel.Wall.char in cell else " " for cell in maze._data))
+        try:
+            return cls._cache[key]
+        except KeyError:
+            pass
+        wall_positions = set(maze._index_linear_to_tuple(index)
+                             for index, char in enumerate(key[2]) if char == "#")
+        if len(cls._cache) >= cls._cache_size:
+            cls._cache.clear()
+        walls = cls._cache[key] = cls(wall_positions)
+        return walls
+
+    def draw(self, canvas, mesh, tag="wall"):
+        """ Draws the walls onto `canvas` using the scale of `mesh`. """
+        scale = (mesh.half_scale_x + mesh.half_scale_y) * 0.5
+        options = dict(fill=col(48, 26, 22), width=0.8 * scale, tag=tag, capstyle="round")
+        for x1, y1, x2, y2 in self.lines:
+            canvas.create_line(mesh.mesh_to_screen((x1, y1), (0, 0)),
+                               mesh.mesh_to_screen((x2, y2), (0, 0)), **options)
+        for x, y in self.dots:
+            canvas.create_line(mesh.mesh_to_screen((x, y), (-0.3, 0)),
+                               mesh.mesh_to_screen((x, y), (+0.3, 0)), **options)
 
 class Food(TkSprite):
     @classmethod
     def food_pos_tag(cls, position):
-        return "Food" + str(position)
+        # no parentheses, which are operators in Tk tag expressions
+        return "food_%i_%i" % tuple(position)
 
     def draw(self, canvas, universe=None):
         if self.position[0] < self.mesh.num_x/2:
@@ -6,7 +6,9 @@
 
 import logging
 
-from pelita.viewer import AbstractViewer
+from pelita import datamodel
+from pelita.containers import TypeAwareList
+from pelita.viewer import AbstractViewer, ViewerQueue
 from pelita.ui.tk_canvas import TkApplication
 
 _logger = logging.getLogger("pelita.tk_viewer")
@@ -51,6 +53,13 @@ class TkViewer(AbstractViewer):
     add a timeout parameter, if the animation takes too long.
     The respective states and events will be lost then.
 
+    With a target frame rate `fps`, the viewer uses a coalescing
+    `ViewerQueue` instead: a new state replaces the queued one, but the
+    events of both are kept (so that e.g. `TeamWins` is not lost).
+    The game never waits for the viewer and Tk draws the latest state
+    at most `fps` times per second. `queue_size` and `timeout` are
+    ignored in this mode.
+
     Parameters
     ----------
     queue_size : int, default = 1
@@ -61,6 +70,9 @@ class TkViewer(AbstractViewer):
     geometry: tuple, default = None
         The size (in pixel) of the game root window. None means
         using a bit less than the screen size.
+    fps : float, default = None
+        The target frame rate. None means drawing every state
+        in turn.
 
     Attributes
     ----------
@@ -68,8 +80,9 @@ class TkViewer(AbstractViewer):
     app : The TkApplication class
 
     """
-    def __init__(self, queue_size=1, geometry=None, timeout=0.5):
-        self.observe_queue = Queue.Queue(maxsize=queue_size)
+    def __init__(self, queue_size=1, geometry=None, timeout=0.5, fps=None):
+        self.fps = fps
+        self.observe_queue = self.create_queue(queue_size, fps)
 
         self.root = Tkinter.Tk()
         if geometry is None:
@@ -79,10 +92,17 @@ def __init__(self, queue_size=1, geometry=None, timeout=0.5):
         # put the root window in some sensible position
         self.root.geometry(root_geometry+'+40+40')
         
-        self.app = TkApplication(queue=self.observe_queue,
-                                 geometry = geometry,
-                                 master=self.root)
-        self.root.after_idle(self.app.read_queue)
+        if fps is None:
+            self.app = TkApplication(queue=self.observe_queue,
+                                     geometry = geometry,
+                                     master=self.root)
+            self.root.after_idle(self.app.read_queue)
+        else:
+            self.app = TkApplication(queue=self.observe_queue,
+                                     geometry = geometry,
+                                     master=self.root,
+                                     fps=fps)
+            self.root.after_idle(self.app.read_frames)
 
         self.timeout = timeout
         if self.timeout == 0:
@@ -90,6 +110,15 @@ def __init__(self, queue_size=1, geometry=None, timeout=0.5):
         else:
             self.block = True
 
+    @staticmethod
+    def create_queue(queue_size=1, fps=None):
+        """ Returns the exchange queue for a viewer with the given
+        `queue_size` and `fps`.
+        """
+        if fps is None:
+            return Queue.Queue(maxsize=queue_size)
+        return ViewerQueue(maxsize=1, policy="coalesce")
+
     def _put(self, obj):
         try:
             self.observe_queue.put(obj, self.block, self.timeout)
@@ -98,6 +127,11 @@ def _put(self, obj):
             pass
 
     def set_initial(self, universe):
+        if self.fps is not None:
+            events = TypeAwareList(base_class=datamodel.UniverseEvent)
+            self.observe_queue.put((None, None, universe.copy(), events))
+            return
+
         self._put(copy.deepcopy({
             "universe": universe,
         }))
@@ -105,6 +139,11 @@ def set_initial(self, universe):
     def observe(self, round_, turn, universe, events):
 #        print "observed", events
 
+        if self.fps is not None:
+            # never blocks; the game master hands us a private copy
+            self.observe_queue.put((round_, turn, universe, events))
+            return
+
         self._put(copy.deepcopy({
             "round": round_,
             "turn": turn,
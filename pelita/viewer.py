@@ -2,8 +2,21 @@
 
 """ The observers. """
 
+import collections
+import logging
+import sys
+import threading
+import time
+
 from . import datamodel
+from .containers import TypeAwareList
 from .messaging.json_convert import json_converter
+from .utils import SuspendableThread, CloseThread
+
+_logger = logging.getLogger("pelita.viewer")
+
+# seconds to wait for the background viewers when a game is over
+FLUSH_TIMEOUT = 10
 
 __docformat__ = "restructuredtext"
 
@@ -31,11 +44,114 @@ def observe(self, round_, turn, universe, events):
         % (round_, turn, universe.teams[0].score, universe.teams[1].score))
         print ("Events: %r" % [str(e) for e in events])
         print universe.compact_str
-        if datamodel.TeamWins in events:
-            team_wins_event = events.filter_type(datamodel.TeamWins)[0]
+        if events.has(datamodel.TeamWins):
+            team_wins_event = events.first(datamodel.TeamWins)
             print ("Game Over: Team: '%s' wins!" %
             universe.teams[team_wins_event.winning_team_index].name)
 
+class AnsiViewer(AbstractViewer):
+    """ A viewer which draws the game in a terminal.
+
+    The viewer remembers the drawn frame and, using ANSI escape codes
+    to move the cursor, only rewrites the cells which have changed.
+    States which arrive faster than `fps` are skipped (the next drawn
+    frame contains their changes); the final state of a game is
+    always drawn.
+
+    Parameters
+    ----------
+    stream : file, optional, default = sys.stdout
+        the terminal
+    fps : float, optional, default = 10
+        the maximum number of frames per second
+    """
+    #: the colours of the bots of both teams
+    TEAM_COLORS = ("\033[1;34m", "\033[1;31m")
+    RESET = "\033[0m"
+
+    def __init__(self, stream=None, fps=10):
+        self.stream = stream if stream is not None else sys.stdout
+        self.frame_interval = 1.0 / fps
+        self.last_draw = None
+        # the drawn lines, each a list of cells
+        self.drawn = None
+
+    def set_initial(self, universe):
+        self.draw(self.render(None, None, universe, None))
+
+    def observe(self, round_, turn, universe, events):
+        game_over = (turn is None or events.has(datamodel.TeamWins) or
+                     events.has(datamodel.GameDraw))
+        if (not game_over and self.last_draw is not None and
+            time.time() - self.last_draw < self.frame_interval):
+            return
+        self.draw(self.render(round_, turn, universe, events))
+        if game_over:
+            # leave the cursor below the maze
+            self.stream.write("\033[%i;1H\033[?25h\n" % (len(self.drawn) + 1))
+            self.stream.flush()
+            self.drawn = None
+
+    def render(self, round_, turn, universe, events):
+        """ Returns the lines of the frame for `universe`; the maze
+        framed by a header and a status line.
+        """
+        maze = universe.maze
+        cells = [datamodel.Wall.char if datamodel.Wall.char in cell else
+                 datamodel.Food.char if datamodel.Food.char in cell else
+                 datamodel.Free.char for cell in maze._data]
+        for bot in universe.bots:
+            x, y = bot.current_pos
+            # a cell is one character wide, even for more than ten bots
+            cells[x + y * maze.width] = "%s%i%s" % (
+                self.TEAM_COLORS[bot.team_index % 2], bot.index % 10, self.RESET)
+
+        teams = universe.teams
+        header = "Round: %r Turn: %r Score: %s %i:%i %s" % (
+            round_, turn, teams[0].name, teams[0].score, teams[1].score, teams[1].name)
+        status = ""
+        if events:
+            if events.has(datamodel.TeamWins):
+                team_wins_event = events.first(datamodel.TeamWins)
+                status = ("Game Over: Team: '%s' wins!" %
+                          universe.teams[team_wins_event.winning_team_index].name)
+            elif events.has(datamodel.GameDraw):
+                status = "Game Over: Draw!"
+        lines = [list(header.ljust(maze.width))]
+        lines.extend(cells[y * maze.width:(y + 1) * maze.width]
+                     for y in range(maze.height))
+        lines.append(list(status.ljust(maze.width)))
+        return lines
+
+    def draw(self, lines):
+        """ Writes the changes between the drawn frame and `lines`. """
+        out = []
+        if self.drawn is None or len(self.drawn) != len(lines):
+            # clear the screen and hide the cursor
+            out.append("\033[2J\033[?25l")
+            self.drawn = [[] for line in lines]
+        for row, (old, new) in enumerate(zip(self.drawn, lines)):
+            col = 0
+            while col < len(new):
+                if col < len(old) and old[col] == new[col]:
+                    col += 1
+                    continue
+                # a run of changed cells
+                end = col + 1
+                while end < len(new) and (end >= len(old) or old[end] != new[end]):
+                    end += 1
+                out.append("\033[%i;%iH" % (row + 1, col + 1))
+                out.append("".join(new[col:end]))
+                col = end
+            if len(old) > len(new):
+                # erase the rest of a line which got shorter
+                out.append("\033[%i;%iH\033[K" % (row + 1, len(new) + 1))
+        self.drawn = lines
+        self.last_draw = time.time()
+        if out:
+            self.stream.write("".join(out))
+            self.stream.flush()
+
 class DumpingViewer(AbstractViewer):
     """ A viewer which dumps to a given stream.
     """
@@ -56,3 +172,225 @@ def observe(self, round_, turn, universe, events):
 
         self.stream.write(json_converter.dumps(kwargs))
         self.stream.write("\x04")
+
+
+class ViewerQueue(object):
+    """ A bounded queue of game snapshots for a single viewer.
+
+    Each item is a tuple ``(round_, turn, universe, events)``. What happens
+    when a new snapshot is put into a full queue is decided by `policy`:
+
+    * ``"block"`` waits until the viewer has consumed an item. No snapshot
+      is lost, but a slow viewer will eventually slow down the game.
+    * ``"drop"`` discards the oldest queued snapshot.
+    * ``"coalesce"`` merges the new snapshot into the newest queued one:
+      the later round, turn and universe are kept and the event lists are
+      concatenated, so that no event (e.g. `TeamWins`) gets lost.
+
+    Parameters
+    ----------
+    maxsize : int, optional, default = 1
+        the maximum number of queued snapshots
+    policy : string, optional, default = "coalesce"
+        one of "block", "drop" or "coalesce"
+
+    Attributes
+    ----------
+    dropped : int
+        the number of snapshots which were dropped or coalesced
+    """
+    POLICIES = ("block", "drop", "coalesce")
+
+    def __init__(self, maxsize=1, policy="coalesce"):
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown viewer queue policy %r." % policy)
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._items = collections.deque()
+        self._unfinished = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+    def put(self, item):
+        """ Queues `item` according to the queue policy. """
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._items) >= self.maxsize:
+                if self.policy == "block":
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._cond.wait()
+                elif self.policy == "drop":
+                    self._items.popleft()
+                    self._unfinished -= 1
+                    self.dropped += 1
+                else:
+                    item = self._coalesce(self._items.pop(), item)
+                    self._unfinished -= 1
+                    self.dropped += 1
+            self._items.append(item)
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """ Returns the next snapshot.
+
+        Returns None, if the queue has been closed and is empty or if no
+        item arrived within `timeout` seconds.
+        """
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def task_done(self):
+        """ Marks a snapshot which was returned by `get()` as processed. """
+        with self._cond:
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def join(self, timeout=None):
+        """ Waits until all queued snapshots have been processed.
+
+        Returns True, if the queue has been drained.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while self._unfinished:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            return not self._unfinished
+
+    def close(self):
+        """ Closes the queue. Pending snapshots may still be fetched. """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    @staticmethod
+    def _coalesce(old, new):
+        events = TypeAwareList(old[3], base_class=datamodel.UniverseEvent)
+        events.extend(new[3])
+        return new[0], new[1], new[2], events
+
+
+class ViewerWorker(SuspendableThread):
+    """ Thread which feeds the snapshots of a `ViewerQueue` to a viewer.
+
+    Snapshots are shared between all viewers and must be treated as
+    read-only.
+    """
+    def __init__(self, viewer, queue):
+        SuspendableThread.__init__(self)
+        self.thread.daemon = True
+        self.viewer = viewer
+        self.queue = queue
+
+    def _run(self):
+        item = self.queue.get(timeout=0.5)
+        if item is None:
+            if self.queue.closed:
+                raise CloseThread
+            return
+        try:
+            round_, turn, universe, events = item
+            self.viewer.observe(round_, turn, universe, events)
+        except Exception:
+            _logger.exception("Viewer %r failed to observe a snapshot.",
+                              self.viewer)
+        finally:
+            self.queue.task_done()
+
+
+class ViewerDispatcher(object):
+    """ Fans out game snapshots to viewers in background threads.
+
+    Every registered viewer has its own `ViewerQueue` and `ViewerWorker`,
+    so a slow viewer only holds up itself and never the game which
+    publishes the snapshots.
+
+    Examples
+    --------
+    >>> dispatcher = ViewerDispatcher()
+    >>> dispatcher.add_viewer(AsciiViewer(), policy="coalesce")
+    >>> dispatcher.publish(round_, turn, universe.copy(), events)
+    >>> dispatcher.stop()
+    """
+    def __init__(self):
+        self.workers = []
+
+    def __len__(self):
+        return len(self.workers)
+
+    def add_viewer(self, viewer, maxsize=1, policy="coalesce"):
+        """ Starts a worker for `viewer`. """
+        worker = ViewerWorker(viewer, ViewerQueue(maxsize, policy))
+        self.workers.append(worker)
+        worker.start()
+
+    def publish(self, round_, turn, universe, events):
+        """ Hands the snapshot to all viewers.
+
+        The snapshot is shared by all viewers and must not be modified
+        afterwards.
+        """
+        item = (round_, turn, universe, events)
+        for worker in self.workers:
+            worker.queue.put(item)
+
+    def flush(self, timeout=None):
+        """ Waits until all viewers have processed their queued snapshots.
+
+        `timeout` is the time in seconds for all viewers together.
+        Returns True, if all queues have been drained.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        drained = True
+        for worker in self.workers:
+            if deadline is None:
+                remaining = None
+            else:
+                remaining = max(0, deadline - time.time())
+            drained = worker.queue.join(remaining) and drained
+        return drained
+
+    def stop(self, flush=True, timeout=FLUSH_TIMEOUT):
+        """ Stops all workers.
+
+        Pending snapshots are delivered first, unless `flush` is False.
+        Viewers which have not caught up after `timeout` seconds are
+        abandoned, so that a hanging viewer cannot block the caller.
+        """
+        if flush:
+            if not self.flush(timeout):
+                _logger.warning("Viewers did not catch up within %s seconds.",
+                                timeout)
+        for worker in self.workers:
+            worker.queue.close()
+            worker.stop()
+        deadline = time.time() + 1
+        for worker in self.workers:
+            if worker.thread.is_alive() and \
+                    worker.thread is not threading.current_thread():
+                worker.thread.join(max(0, deadline - time.time()))
+        self.workers = []
@@ -1,8 +1,15 @@
 import unittest
 import time
+import os
+import tempfile
 import Queue
+import threading
 
-from pelita.messaging import DispatchingActor, expose, Actor, actor_of, RemoteConnection, Exit, Request, ActorNotRunning
+from pelita.messaging import DispatchingActor, expose, Actor, actor_of, RemoteConnection, Exit, Request, ActorNotRunning,\
+        AnytimeRequest, gather, actor_registry, DeadConnection, PriorityInbox, PRIORITY_LOW, PRIORITY_HIGH,\
+        metrics, Histogram
+from pelita.messaging.remote_actor import RemoteOutbox
+from pelita.messaging.metrics import MAX_STOPPED_ACTORS
 
 class Dispatcher(DispatchingActor):
     def __init__(self):
@@ -38,6 +45,10 @@ def return_message(self, *args, **kwargs):
     def fake_name(self):
         self.ref.reply(12)
 
+    @expose(priority=PRIORITY_HIGH)
+    def urgent(self):
+        self.ref.reply("urgent")
+
 
 class TestDispatchingActor(unittest.TestCase):
     def test_running(self):
@@ -105,6 +116,49 @@ def test_invalid_dispatch(self):
 
         actor.stop()
 
+    def test_wrong_params(self):
+        actor = actor_of(Dispatcher)
+        actor.start()
+
+        res = actor.query("set_param1", [1, 2])
+        self.assertTrue(res.get(3).startswith("Type Error"))
+        res = actor.query("complicated_params", {"arg4": 1})
+        self.assertTrue(res.get(3).startswith("Type Error"))
+        # the actor is still usable
+        self.assertEqual(actor.query("complicated_params", {"arg2": 0}).get(3), 301)
+
+        actor.stop()
+
+    def test_duplicate_name(self):
+        def define():
+            class Duplicate(DispatchingActor):
+                @expose
+                def method(self):
+                    pass
+
+                @expose(name="method")
+                def other_method(self):
+                    pass
+        self.assertRaises(ValueError, define)
+
+    def test_anytime_request(self):
+        actor = actor_of(Dispatcher)
+        actor.start()
+
+        req = AnytimeRequest()
+        self.assertEqual(req.provisional, None)
+        req.put({"provisional": 1})
+        req.put({"provisional": 2})
+        self.assertEqual(req.provisional, 2)
+        self.assertFalse(req.has_result())
+
+        res = actor.query("complicated_params", [], request=req)
+        self.assertTrue(res is req)
+        self.assertEqual(res.get(), 321)
+        self.assertEqual(res.provisional, 2)
+
+        actor.stop()
+
     def test_lifecycle(self):
         actor = actor_of(Dispatcher)
         self.assertRaises(ActorNotRunning, actor.notify, "dummy")
@@ -114,6 +168,27 @@ def test_lifecycle(self):
         actor.join()
         self.assertRaises(ActorNotRunning, actor.notify, "dummy")
 
+    def test_stop_wakes_actor(self):
+        actor = actor_of(Dispatcher)
+        actor.start()
+        start = time.time()
+        actor._actor.stop()
+        actor.join(2)
+        self.assertFalse(actor.is_alive)
+        self.assertTrue(time.time() - start < 1)
+
+    def test_wait_for_name(self):
+        self.assertEqual(actor_registry.wait_for_name("not-yet-there", 0.05), None)
+
+        def register():
+            time.sleep(0.05)
+            actor_of(Dispatcher, "registered-later")
+        thread = threading.Thread(target=register)
+        thread.start()
+        ref = actor_registry.wait_for_name("registered-later", 3)
+        self.assertTrue(ref is actor_registry.get_by_name("registered-later"))
+        thread.join()
+
     def test_complicated_params(self):
         actor = actor_of(Dispatcher)
         actor.start()
@@ -224,6 +299,150 @@ def test_simply_reply(self):
         actor_ref.stop()
         #assert False
 
+    def test_query_batch(self):
+        actor_ref = actor_of(MultiplyingActor)
+        actor_ref.start()
+
+        requests = actor_ref.query_batch([("mult", [1, 2]), ("mult", [3, 4])])
+        self.assertEqual(gather(requests, 3), [2, 12])
+        actor_ref.stop()
+
+class TestPriorityInbox(unittest.TestCase):
+    def test_order(self):
+        inbox = PriorityInbox()
+        inbox.put({"message": 1})
+        inbox.put({"message": 2, "priority": PRIORITY_LOW})
+        inbox.put({"message": 3, "priority": PRIORITY_HIGH})
+        inbox.put({"message": 4})
+        self.assertEqual(inbox.qsize(), 4)
+        self.assertEqual([inbox.get(False)["message"] for _ in range(4)], [3, 1, 4, 2])
+        self.assertTrue(inbox.empty())
+        self.assertRaises(Queue.Empty, inbox.get, False)
+        self.assertRaises(Queue.Empty, inbox.get, True, 0.05)
+
+    def test_starvation(self):
+        inbox = PriorityInbox(starvation_limit=2)
+        inbox.put({"message": "low", "priority": PRIORITY_LOW})
+        for i in range(5):
+            inbox.put({"message": i, "priority": PRIORITY_HIGH})
+        messages = [inbox.get(False)["message"] for _ in range(6)]
+        self.assertEqual(messages, [0, 1, "low", 2, 3, 4])
+
+    def test_dispatch_priority(self):
+        actor = actor_of(Dispatcher)
+        self.assertEqual(actor._actor.priority_for({"method": "urgent"}), PRIORITY_HIGH)
+        self.assertEqual(actor._actor.priority_for({"method": "?urgent"}), PRIORITY_HIGH)
+        self.assertEqual(actor._actor.priority_for({"method": "dummy"}), 0)
+        self.assertEqual(actor._actor.priority_for("no dict"), 0)
+
+        # queue some messages before the actor runs
+        actor._actor.put({"method": "set_param1", "params": [1]})
+        req = Request()
+        actor._actor.put({"method": "urgent"}, req)
+        actor.start()
+        self.assertEqual(req.get(3), "urgent")
+        actor.stop()
+
+class TestRequest(unittest.TestCase):
+    def test_first_reply_wins(self):
+        req = Request()
+        self.assertFalse(req.has_result())
+        self.assertEqual(req.get_or_none(), None)
+        self.assertRaises(Queue.Empty, req.get, 0)
+
+        req.put(1)
+        req.put(2)
+        self.assertTrue(req.has_result())
+        self.assertEqual(req.get(), 1)
+        # the result can be read more than once
+        self.assertEqual(req.get(0), 1)
+        self.assertEqual(req.get_or_none(), 1)
+
+    def test_gather(self):
+        req1 = Request()
+        req2 = Request()
+        req1.put("a")
+        start = time.time()
+        self.assertRaises(Queue.Empty, gather, [req1, req2], 0.2)
+        self.assertTrue(time.time() - start < 1)
+
+        req2.put("b")
+        self.assertEqual(gather([req1, req2], 0), ["a", "b"])
+
+    def test_fail(self):
+        req = Request()
+        req.fail(DeadConnection())
+        req.put(1)
+        self.assertRaises(DeadConnection, req.get, 0)
+
+    def test_put_fail_race(self):
+        requests = [Request() for _ in range(2000)]
+        def complete(method, value):
+            for req in requests:
+                getattr(req, method)(value)
+        threads = [threading.Thread(target=complete, args=("put", 1)),
+                   threading.Thread(target=complete, args=("fail", DeadConnection()))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # either the reply or the error, never both
+        for req in requests:
+            self.assertTrue((req._result is None) != (req._error is None))
+
+class SlowConnection(object):
+    """ Connection which does not send before `release` is set. """
+    def __init__(self):
+        self.sent = []
+        self.release = threading.Event()
+
+    def send(self, msg):
+        self.release.wait()
+        self.sent.append(msg)
+
+class FakeMailbox(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def stop(self):
+        pass
+
+class TestRemoteOutbox(unittest.TestCase):
+    def test_direct(self):
+        connection = SlowConnection()
+        connection.release.set()
+        outbox = RemoteOutbox(FakeMailbox(connection))
+        outbox.put({"actor": "a", "message": 1})
+        self.assertEqual(connection.sent, [{"actor": "a", "message": 1}])
+        self.assertRaises(ValueError, outbox.set_policy, "unknown")
+
+    def test_coalesce(self):
+        def observe(*params):
+            return {"actor": "viewer", "message": {"method": "observe", "params": list(params)}}
+        def merge(old, new):
+            return {"method": "observe", "params": old["params"] + new["params"]}
+
+        connection = SlowConnection()
+        outbox = RemoteOutbox(FakeMailbox(connection))
+        outbox.set_policy("coalesce", maxsize=1, merge=merge)
+
+        outbox.put(observe(1))
+        # wait until the writer is stuck in sending the first frame
+        for _ in range(100):
+            if not outbox._frames:
+                break
+            time.sleep(0.01)
+        outbox.put(observe(2))
+        outbox.put(observe(3))
+        self.assertEqual(outbox.dropped, 1)
+
+        connection.release.set()
+        self.assertTrue(outbox.flush(3))
+        self.assertEqual(connection.sent, [observe(1), observe(2, 3)])
+
+        outbox.close()
+        self.assertRaises(DeadConnection, outbox.put, observe(4))
+
 class TestRemoteActor(unittest.TestCase):
     def test_remote(self):
         remote = RemoteConnection().start_listener("localhost", 0)
@@ -247,7 +466,97 @@ def test_remote(self):
         res = client1.query("mult", [2, 2, 4])
         self.assertEqual(res.get(timeout=3), 16)
 
+        # several queries in a single frame
+        requests = client1.query_batch([("mult", [1, 2, 3]), ("mult", [5, 5])])
+        self.assertEqual(gather(requests, 3), [6, 25])
+
+        remote.stop()
+
+    def test_remote_compression(self):
+        remote = RemoteConnection(compression_threshold=0).start_listener("localhost", 0)
+        remote.register("main-actor", actor_of(MultiplyingActor))
+        remote.start_all()
+        port = remote.listener.socket.port
+
+        client_remote = RemoteConnection(compression_threshold=0)
+        client = client_remote.actor_for("main-actor", "localhost", port)
+        # the peers announce their capabilities before anything else
+        self.assertEqual(client.query("mult", [2, 3]).get(timeout=3), 6)
+
+        res = client.query("mult", [1] * 1000)
+        self.assertEqual(res.get(timeout=3), 1)
+
+        traffic = client_remote.traffic()
+        self.assertTrue(traffic["sent"] < traffic["sent_raw"] / 4)
+
+        remote.stop()
+
+    def test_closed_connection_fails_requests(self):
+        remote = RemoteConnection().start_listener("localhost", 0)
+        remote.register("main-actor", actor_of(MultiplyingActor))
+        remote.start_all()
+        port = remote.listener.socket.port
+
+        client = RemoteConnection().actor_for("main-actor", "localhost", port)
+        self.assertEqual(client.query("mult", [2, 3]).get(timeout=3), 6)
+        disconnected = threading.Event()
+        client.add_disconnect_callback(disconnected.set)
+        # never answered
+        request = client.query("unknown")
+        # close the connections, but keep the actor alive, so that it
+        # does not answer with an error either
+        remote.listener.stop()
+        remote.shutdown()
+
+        start = time.time()
+        self.assertRaises(DeadConnection, request.get, 3)
+        self.assertTrue(time.time() - start < 1)
+        self.assertFalse(client.is_connected())
+        self.assertRaises(DeadConnection, client.query, "mult", [1])
+        self.assertTrue(disconnected.wait(1))
+        # called at once for a closed connection
+        called = []
+        client.add_disconnect_callback(lambda: called.append(True))
+        self.assertEqual(called, [True])
+        remote.stop()
+
+    def test_heartbeat(self):
+        remote = RemoteConnection(heartbeat_interval=0.05).start_listener("localhost", 0)
+        remote.register("main-actor", actor_of(MultiplyingActor))
+        remote.start_all()
+        port = remote.listener.socket.port
+
+        client = RemoteConnection(heartbeat_interval=0.05).actor_for("main-actor", "localhost", port)
+        silent = RemoteConnection(heartbeat_interval=None).actor_for("main-actor", "localhost", port)
+        time.sleep(0.5)
+
+        # idle, but alive
+        self.assertTrue(client.is_connected())
+        self.assertEqual(client.query("mult", [2, 3]).get(timeout=3), 6)
+        # closed by the server
+        self.assertFalse(silent.is_connected())
+
+        remote.stop()
+
+    def test_unix_remote(self):
+        path = os.path.join(tempfile.mkdtemp(), "pelita.sock")
+        remote = RemoteConnection().start_unix_listener(path)
+        remote.register("main-actor", actor_of(MultiplyingActor))
+
+        remote.start_all()
+
+        client1 = RemoteConnection().unix_actor_for("main-actor", path)
+        res = client1.query("mult", [1, 2, 3, 4])
+        self.assertEqual(res.get(timeout=3), 24)
+        self.assertTrue(client1.is_connected())
+
+        client2 = RemoteConnection().unix_actor_for("main-actor", path)
+        res = client2.query("mult", [4, 4, 4])
+        self.assertEqual(res.get(timeout=3), 64)
+
         remote.stop()
+        # the socket file is removed
+        self.assertFalse(os.path.exists(path))
 
     def test_bad_actors(self):
         remote = RemoteConnection().start_listener("localhost", 0)
@@ -331,5 +640,85 @@ def test_connection(self):
 
         self.assertFalse(still_connected)
 
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+    def test_histogram(self):
+        hist = Histogram([1, 2, 3])
+        self.assertEqual(hist.percentile(0.5), None)
+        for value in [0.5, 0.5, 1.5, 5]:
+            hist.observe(value)
+        snapshot = hist.snapshot()
+        self.assertEqual(snapshot["count"], 4)
+        self.assertEqual(snapshot["buckets"], [2, 1, 0, 1])
+        self.assertEqual(snapshot["max"], 5)
+        self.assertEqual(snapshot["p50"], 1)
+        self.assertEqual(snapshot["p99"], 5)
+
+    def test_actor_metrics(self):
+        actor = actor_of(Dispatcher, "metrics-dispatcher")
+        actor.start()
+        actor.notify("set_param1", [1])
+        self.assertEqual(actor.query("get_param1").get(3), 1)
+        actor.stop()
+        actor.join(3)
+
+        stats = metrics.snapshot()["actors"]["metrics-dispatcher"]
+        self.assertEqual(stats["received"], 2)
+        self.assertEqual(stats["handled"], 2)
+        self.assertEqual(stats["errors"], 0)
+        self.assertEqual(stats["methods"]["get_param1"]["handler_time"]["count"], 1)
+        self.assertEqual(stats["methods"]["set_param1"]["queue_time"]["count"], 1)
+
+    def test_stopped_actors_are_capped(self):
+        metrics.max_stopped_actors = 2
+        metrics.reset()
+        try:
+            running = actor_of(Dispatcher, "metrics-running")
+            running.start()
+            running.notify("set_param1", [1])
+            for i in range(3):
+                actor = actor_of(Dispatcher, "metrics-stopped-%i" % i)
+                actor.start()
+                actor.notify("set_param1", [i])
+                actor.stop()
+                actor.join(3)
+            self.assertEqual(running.query("get_param1").get(3), 1)
+
+            actors = metrics.snapshot()["actors"]
+            # only the last stopped actors are kept
+            self.assertEqual(sorted(actors), ["metrics-running", "metrics-stopped-1",
+                                              "metrics-stopped-2"])
+            self.assertEqual(actors["metrics-stopped-2"]["handled"], 1)
+            running.stop()
+            running.join(3)
+        finally:
+            metrics.max_stopped_actors = MAX_STOPPED_ACTORS
+
+    def test_remote_metrics(self):
+        remote = RemoteConnection().start_listener("localhost", 0)
+        remote.register("main-actor", actor_of(MultiplyingActor))
+        remote.start_all()
+        port = remote.listener.socket.port
+
+        client = RemoteConnection().actor_for("main-actor", "localhost", port)
+        for _ in range(3):
+            self.assertEqual(client.query("mult", [2, 3]).get(timeout=3), 6)
+
+        connections = metrics.snapshot()["connections"]
+        client_stats = connections[repr(client._remote_mailbox.connection)]
+        self.assertTrue(client_stats["frames_sent"] >= 3)
+        self.assertTrue(client_stats["bytes_received"] > 0)
+        self.assertEqual(client_stats["round_trips"]["mult"]["count"], 3)
+        self.assertTrue(metrics.summary())
+
+        remote.stop()
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,11 @@
 import unittest
+import os
+import socket
+import tempfile
 import Queue
 
-from pelita.messaging.remote import TcpThreadedListeningServer, TcpConnectingClient
+from pelita.messaging.remote import TcpThreadedListeningServer, TcpConnectingClient,\
+        UnixThreadedListeningServer, UnixConnectingClient, JsonSocketConnection
 
 class TestConnection(unittest.TestCase):
     def test_accept(self):
@@ -37,5 +41,65 @@ def acceptor(connection):
         listener.stop()
         listener.thread.join()
 
+    def test_unix_accept(self):
+        path = os.path.join(tempfile.mkdtemp(), "pelita.sock")
+        listener = UnixThreadedListeningServer(path=path)
+
+        timeout = 1
+        queue = Queue.Queue()
+
+        def acceptor(connection):
+            queue.put(connection)
+
+        listener.on_accept = acceptor
+        listener.start()
+
+        conn = UnixConnectingClient(path=path)
+        sock = conn.handle_connect()
+
+        try:
+            received_conn = queue.get(True, timeout)
+        except Queue.Empty:
+            raise AssertionError("Timed out. No connection in %d secs." % timeout)
+
+        sock.sendall("ping")
+        self.assertEqual(received_conn.recv(4), "ping")
+
+        listener.stop()
+        listener.thread.join()
+        self.assertFalse(os.path.exists(path))
+
+class TestJsonSocketConnection(unittest.TestCase):
+    def setUp(self):
+        sender, receiver = socket.socketpair()
+        self.sender = JsonSocketConnection(sender)
+        self.receiver = JsonSocketConnection(receiver)
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_compression(self):
+        universe = {"maze": ["#", " ", "."] * 200, "round": 1}
+        self.sender.send(universe)
+        self.sender.enable_compression(threshold=100)
+        self.sender.send({"small": 1})
+        for round_ in range(2, 5):
+            self.sender.send(dict(universe, round=round_))
+
+        self.assertEqual(self.receiver.read(), universe)
+        self.assertEqual(self.receiver.read(), {"small": 1})
+        for round_ in range(2, 5):
+            self.assertEqual(self.receiver.read(), dict(universe, round=round_))
+
+        # the later frames share the compression stream
+        self.assertTrue(self.sender.bytes_sent < self.sender.bytes_sent_raw / 2)
+        self.assertEqual(self.sender.bytes_sent, self.receiver.bytes_received)
+        self.assertEqual(self.sender.bytes_sent_raw, self.receiver.bytes_received_raw)
+
+    def test_invalid_compressed_frame(self):
+        self.sender.send({"zlib": "no zlib data"})
+        self.assertRaises(ValueError, self.receiver.read)
+
 if __name__ == '__main__':
     unittest.main()
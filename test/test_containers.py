@@ -262,6 +262,49 @@ class D(object):
         tal[0] = b
         self.assertEqual(list(tal), [b, b, c])
 
+    def test_has_first(self):
+        class A(object):
+            pass
+
+        class B(A):
+            pass
+
+        a, b, b2 = A(), B(), B()
+        tal = TypeAwareList([b, a, b2], base_class=A)
+        self.assertTrue(tal.has(A))
+        self.assertTrue(tal.has(B))
+        self.assertFalse(tal.has(int))
+        self.assertTrue(tal.first(B) is b)
+        self.assertTrue(tal.first(A) is b)
+        self.assertEqual(tal.first(int), None)
+        self.assertEqual(tal.first(int, "default"), "default")
+
+        tal = TypeAwareList([1, [], 2])
+        self.assertEqual(tal.first(int), 1)
+        self.assertEqual(tal.first(list), [])
+        self.assertFalse(tal.has(dict))
+
+    def test_buckets_follow_modifications(self):
+        tal = TypeAwareList([1, [], 2])
+        tal.insert(0, {})
+        self.assertEqual(tal.first(dict), {})
+        self.assertEqual(tal.filter_type(int), [1, 2])
+
+        del tal[0]
+        self.assertFalse(tal.has(dict))
+
+        tal[1] = "string"
+        self.assertFalse(tal.has(list))
+        self.assertEqual(tal.first(str), "string")
+
+        tal.remove_type(int)
+        self.assertFalse(int in tal)
+        self.assertEqual(list(tal), ["string"])
+
+        tal += [3, 4]
+        self.assertEqual(tal.filter_type(int), [3, 4])
+        self.assertEqual(tal.first(int), 3)
+
     def test_base_class(self):
         self.assertRaises(TypeError, TypeAwareList, base_class=1)
         self.assertRaises(TypeError, TypeAwareList, base_class=list())
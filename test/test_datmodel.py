@@ -1,9 +1,11 @@
 import unittest
+import copy
 import json
+import pickle
 from pelita.layout import Layout
 from pelita.containers import Mesh
 from pelita.datamodel import *
-from pelita.messaging.json_convert import json_converter
+from pelita.messaging.json_convert import json_converter, JsonConverter
 
 
 # the legal chars for a basic CTFUniverse
@@ -159,20 +161,10 @@ def test_json_serialization(self):
         white_json = json_converter.dumps(white)
 
         black_json_target = {'__id__': 'pelita.datamodel.Bot',
-                             '__value__': {'current_pos': [1, 1],
-                                           'homezone': [0, 3],
-                                           'index': 0,
-                                           'initial_pos': [1, 1],
-                                           'team_index': 0,
-                                           'noisy': False}}
+                             '__compact__': [0, 1, 1, 0, 0, 3, 1, 1, False]}
 
         white_json_target = {'__id__': 'pelita.datamodel.Bot',
-                             '__value__': {'current_pos': [1, 1],
-                                           'homezone': [3, 6],
-                                           'index': 1,
-                                           'initial_pos': [6, 6],
-                                           'team_index': 1,
-                                           'noisy': False}}
+                             '__compact__': [1, 6, 6, 1, 3, 6, 1, 1, False]}
 
         self.assertEqual(json.loads(black_json), black_json_target)
         self.assertEqual(json.loads(white_json), white_json_target)
@@ -180,6 +172,31 @@ def test_json_serialization(self):
         self.assertEqual(json_converter.loads(black_json), black)
         self.assertEqual(json_converter.loads(white_json), white)
 
+        # the verbose form can still be read
+        black_dict = {'__id__': 'pelita.datamodel.Bot',
+                      '__value__': {'current_pos': [1, 1],
+                                    'homezone': [0, 3],
+                                    'index': 0,
+                                    'initial_pos': [1, 1],
+                                    'team_index': 0,
+                                    'noisy': False}}
+        self.assertEqual(json_converter.loads(json.dumps(black_dict)), black)
+
+    def test_slots_copy(self):
+        black = Bot(0, [1, 1], 0, (0, 3), current_pos=[2, 1])
+        self.assertFalse(hasattr(black, "__dict__"))
+        self.assertEqual(black.initial_pos, (1, 1))
+        self.assertTrue(isinstance(black.current_pos, tuple))
+
+        black_copy = copy.deepcopy(black)
+        self.assertEqual(black, black_copy)
+        self.assertFalse(black is black_copy)
+        black_copy.current_pos = (1, 1)
+        self.assertNotEqual(black, black_copy)
+
+        self.assertEqual(black, pickle.loads(pickle.dumps(black)))
+        self.assertEqual(black, pickle.loads(pickle.dumps(black, 2)))
+
 class TestTeam(unittest.TestCase):
 
     def test_init(self):
@@ -237,18 +254,10 @@ def test_json_serialization(self):
         team_white_json = json_converter.dumps(team_white)
 
         team_black_json_target = {"__id__": "pelita.datamodel.Team",
-                                  "__value__": {"index": 0,
-                                                "bots": [],
-                                                "score": 0,
-                                                "name": "black",
-                                                "zone": [0, 2]}}
+                                  "__compact__": [0, "black", 0, 2, 0, []]}
 
         team_white_json_target = {"__id__": "pelita.datamodel.Team",
-                                  "__value__": {"index": 1,
-                                                "bots": [1, 3, 5],
-                                                "score": 5,
-                                                "name": "white",
-                                                "zone": [3, 6]}}
+                                  "__compact__": [1, "white", 3, 6, 5, [1, 3, 5]]}
 
         self.assertEqual(json.loads(team_black_json), team_black_json_target)
         self.assertEqual(json.loads(team_white_json), team_white_json_target)
@@ -256,6 +265,28 @@ def test_json_serialization(self):
         self.assertEqual(json_converter.loads(team_black_json), team_black)
         self.assertEqual(json_converter.loads(team_white_json), team_white)
 
+        # the verbose form can still be read
+        team_white_dict = {"__id__": "pelita.datamodel.Team",
+                           "__value__": {"index": 1,
+                                         "bots": [1, 3, 5],
+                                         "score": 5,
+                                         "name": "white",
+                                         "zone": [3, 6]}}
+        self.assertEqual(json_converter.loads(json.dumps(team_white_dict)),
+                         team_white)
+
+    def test_slots_copy(self):
+        team_white = Team(1, 'white', (3, 6), score=5, bots=[1, 3, 5])
+        self.assertFalse(hasattr(team_white, "__dict__"))
+
+        team_copy = copy.deepcopy(team_white)
+        self.assertEqual(team_white, team_copy)
+        team_copy._add_bot(7)
+        self.assertEqual(team_white.bots, [1, 3, 5])
+        self.assertNotEqual(team_white, team_copy)
+
+        self.assertEqual(team_white, pickle.loads(pickle.dumps(team_white)))
+
 
 class TestMazeComponents(unittest.TestCase):
 
@@ -397,6 +428,26 @@ def test_json(self):
         game_draw = GameDraw()
         self.assertEqual(game_draw, reconvert(game_draw))
 
+    def test_slots_copy(self):
+        events = [BotMoves(0, (0, 0), (1, 0)), BotEats(1, (0, 0)),
+                  FoodEaten((0, 0)), TeamScoreChange(0, 1, 2),
+                  BotDestroyed(0, (0, 0), (0, 1), (0, 0), 1, (0, 1), (0, 1)),
+                  TimeoutEvent(0), TeamWins(0), GameDraw()]
+        for event in events:
+            self.assertFalse(hasattr(event, "__dict__"))
+            self.assertEqual(event, copy.deepcopy(event))
+            self.assertFalse(event is copy.deepcopy(event))
+            self.assertEqual(event, pickle.loads(pickle.dumps(event)))
+        self.assertNotEqual(TeamWins(0), TeamWins(1))
+        self.assertNotEqual(TeamWins(0), TimeoutEvent(0))
+
+    def test_interned_positions(self):
+        first = BotMoves(0, [1, 2], (3, 4))
+        second = BotMoves(1, (1, 2), [3, 4])
+        self.assertTrue(first.old_pos is second.old_pos)
+        self.assertTrue(first.new_pos is second.new_pos)
+        self.assertTrue(new_pos((0, 2), east) is first.old_pos)
+
 class TestCTFUniverse(unittest.TestCase):
 
     def test_factory(self):
@@ -610,6 +661,12 @@ def test_json(self):
         universe_json = json_converter.dumps(universe)
         self.assertEqual(json_converter.loads(universe_json), universe)
 
+        verbose_converter = JsonConverter(compact=False)
+        verbose_converter.reg = json_converter.reg
+        universe_json = verbose_converter.dumps(universe)
+        self.assertTrue(len(universe_json) > len(json_converter.dumps(universe)))
+        self.assertEqual(json_converter.loads(universe_json), universe)
+
 
 class TestCTFUniverseRules(unittest.TestCase):
 
@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 
 import unittest
+import re
 import time
+import threading
+import StringIO
 import pelita
 from pelita.datamodel import north, south, east, west, stop,\
         Wall, Free, Food, TeamWins, GameDraw, BotMoves, create_CTFUniverse,\
-        KILLPOINTS
-from pelita.game_master import GameMaster, UniverseNoiser, PlayerTimeout
+        KILLPOINTS, UniverseEvent, TimeoutEvent
+from pelita.containers import TypeAwareList
+from pelita.game_master import GameMaster, UniverseNoiser, PlayerTimeout, \
+        MAX_TIMEOUTS
 from pelita.player import AbstractPlayer, SimpleTeam, TestPlayer, StoppingPlayer
-from pelita.viewer import AbstractViewer, DevNullViewer
+from pelita.viewer import AbstractViewer, DevNullViewer, ViewerQueue, AnsiViewer, \
+        ViewerDispatcher
 from pelita.graph import AdjacencyList
 
 
@@ -433,6 +439,80 @@ def observe(self, round_, turn, universe, events):
         self.assertTrue(TeamWins in tv.cache[-1])
         self.assertEqual(tv.cache[-1][0], TeamWins(1))
 
+    def test_provisional_move_on_timeout(self):
+        test_start = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+
+        class ProvisionalTeam(object):
+            """ Always times out, but has a provisional move. """
+            def _set_bot_ids(self, bot_ids):
+                pass
+            def _set_initial(self, universe):
+                pass
+            def _get_move(self, bot_idx, universe):
+                raise PlayerTimeout(east)
+
+        gm = GameMaster(test_start, 2, 2)
+        gm.register_team(ProvisionalTeam())
+        gm.register_team(SimpleTeam(StoppingPlayer()))
+
+        class TestViewer(AbstractViewer):
+            def __init__(self):
+                self.cache = list()
+            def observe(self, round_, turn, universe, events):
+                self.cache.append(events)
+
+        tv = TestViewer()
+        gm.register_viewer(tv)
+        gm.play()
+
+        # the provisional moves have been used but counted as timeouts
+        self.assertEqual(gm.universe.bots[0].current_pos, (3, 1))
+        self.assertEqual(gm.universe.teams[0].score, 1)
+        self.assertEqual(gm.player_teams_timeouts, [2, 0])
+        self.assertEqual(len([events for events in tv.cache
+                              if TimeoutEvent in events]), 2)
+
+    def test_lose_on_provisional_timeouts(self):
+        test_start = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+
+        class ProvisionalTeam(object):
+            """ Always times out, but has a provisional move. """
+            def _set_bot_ids(self, bot_ids):
+                pass
+            def _set_initial(self, universe):
+                pass
+            def _get_move(self, bot_idx, universe):
+                raise PlayerTimeout(stop)
+
+        gm = GameMaster(test_start, 2, 100)
+        gm.register_team(ProvisionalTeam())
+        gm.register_team(SimpleTeam(StoppingPlayer()))
+
+        class TestViewer(AbstractViewer):
+            def __init__(self):
+                self.cache = list()
+            def observe(self, round_, turn, universe, events):
+                self.cache.append((round_, events))
+
+        tv = TestViewer()
+        gm.register_viewer(tv)
+        gm.play()
+
+        # a team which only sends provisional moves still loses
+        self.assertEqual(gm.player_teams_timeouts, [MAX_TIMEOUTS, 0])
+        self.assertEqual(gm.universe.bots[0].current_pos, (1, 1))
+        round_, events = tv.cache[-1]
+        self.assertEqual(round_, MAX_TIMEOUTS - 1)
+        self.assertEqual(events.filter_type(TeamWins)[0], TeamWins(1))
+
     def test_draw_on_timeout(self):
         test_start = (
             """ ######
@@ -575,3 +655,151 @@ def observe(self, round_, turn, universe, events):
         self.assertEqual(gm.universe.bots[0].current_pos, (2,1))
         self.assertTrue(TeamWins in tv.cache[-1])
         self.assertEqual(tv.cache[-1].filter_type(TeamWins)[0], TeamWins(1))
+
+
+class TestViewerDispatch(unittest.TestCase):
+
+    def _events(self, *events):
+        return TypeAwareList(events, base_class=UniverseEvent)
+
+    def test_queue_policies(self):
+        queue = ViewerQueue(maxsize=2, policy="drop")
+        for i in range(4):
+            queue.put((i, None, None, self._events()))
+        self.assertEqual(queue.dropped, 2)
+        self.assertEqual([queue.get()[0] for _ in range(2)], [2, 3])
+
+        queue = ViewerQueue(maxsize=1, policy="coalesce")
+        queue.put((0, 0, "old", self._events(TimeoutEvent(0))))
+        queue.put((0, 1, "new", self._events(TeamWins(1))))
+        self.assertEqual(len(queue), 1)
+        round_, turn, universe, events = queue.get()
+        self.assertEqual((round_, turn, universe), (0, 1, "new"))
+        self.assertEqual(list(events), [TimeoutEvent(0), TeamWins(1)])
+        self.assertTrue(TeamWins in events)
+
+        queue.close()
+        self.assertEqual(queue.get(), None)
+        self.assertRaises(ValueError, ViewerQueue, policy="unknown")
+
+    def test_background_viewer(self):
+        test_start = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+        gm = GameMaster(test_start, 2, 2)
+        gm.register_team(SimpleTeam(TestPlayer([east, east])))
+        gm.register_team(SimpleTeam(StoppingPlayer()))
+
+        class SlowViewer(AbstractViewer):
+            def __init__(self):
+                self.cache = list()
+            def observe(self, round_, turn, universe, events):
+                time.sleep(0.05)
+                self.cache.append((round_, turn, universe, events))
+
+        synchronous = SlowViewer()
+        blocking = SlowViewer()
+        coalescing = SlowViewer()
+        gm.register_viewer(synchronous)
+        gm.register_viewer(blocking, background=True, policy="block")
+        gm.register_viewer(coalescing, background=True, policy="coalesce")
+        gm.play()
+
+        # play returns only after all viewers have caught up
+        self.assertEqual(len(gm.viewer_dispatcher), 0)
+        self.assertEqual([c[:2] for c in blocking.cache],
+                         [c[:2] for c in synchronous.cache])
+        self.assertEqual(blocking.cache[-1][2], synchronous.cache[-1][2])
+
+        # coalescing viewers may skip states but see all events
+        self.assertTrue(0 < len(coalescing.cache) <= len(blocking.cache))
+        all_events = sum([list(c[3]) for c in coalescing.cache], [])
+        self.assertEqual(all_events, sum([list(c[3]) for c in blocking.cache], []))
+        self.assertEqual(coalescing.cache[-1][2], gm.universe)
+
+        # background viewers share a copy of the universe
+        self.assertFalse(blocking.cache[-1][2] is gm.universe)
+        self.assertFalse(coalescing.cache[-1][2] is gm.universe)
+
+    def test_hanging_viewer(self):
+        queue = ViewerQueue(maxsize=1, policy="block")
+        queue.put((0, 0, None, self._events()))
+        start = time.time()
+        self.assertFalse(queue.join(0.1))
+        self.assertTrue(time.time() - start >= 0.1)
+        queue.get()
+        queue.task_done()
+        self.assertTrue(queue.join(0.1))
+
+        release = threading.Event()
+        class HangingViewer(AbstractViewer):
+            def observe(self, round_, turn, universe, events):
+                release.wait(5)
+
+        dispatcher = ViewerDispatcher()
+        for _ in range(3):
+            dispatcher.add_viewer(HangingViewer(), policy="block")
+        dispatcher.publish(0, 0, None, self._events())
+        start = time.time()
+        # the timeout is shared by all viewers
+        self.assertFalse(dispatcher.flush(0.2))
+        dispatcher.stop(timeout=0.2)
+        self.assertTrue(time.time() - start < 2)
+        self.assertEqual(len(dispatcher), 0)
+        release.set()
+
+
+class TestAnsiViewer(unittest.TestCase):
+    def test_minimal_redraw(self):
+        test_start = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+        universe = create_CTFUniverse(test_start, 2)
+        stream = StringIO.StringIO()
+        viewer = AnsiViewer(stream, fps=1000)
+
+        viewer.set_initial(universe)
+        full_frame = stream.getvalue()
+        self.assertTrue(full_frame.startswith("\033[2J"))
+
+        stream.truncate(0)
+        time.sleep(0.002)
+        viewer.observe(0, 0, universe, TypeAwareList(base_class=UniverseEvent))
+        # only the header has changed
+        self.assertEqual(set(re.findall("\033\\[(\\d+);", stream.getvalue())), set(["1"]))
+
+        stream.truncate(0)
+        events = universe.move_bot(0, east)
+        time.sleep(0.002)
+        viewer.observe(0, 1, universe, events)
+        changes = stream.getvalue()
+        self.assertTrue("\033[3;2H" in changes)
+        self.assertTrue(len(changes) < len(full_frame) / 4)
+
+        # too early for another frame
+        stream.truncate(0)
+        viewer.frame_interval = 10
+        viewer.observe(0, 2, universe, TypeAwareList(base_class=UniverseEvent))
+        self.assertEqual(stream.getvalue(), "")
+
+        # but the end of the game is always drawn
+        viewer.observe(0, None, universe, TypeAwareList([GameDraw()], base_class=UniverseEvent))
+        self.assertTrue("Draw!" in stream.getvalue())
+
+    def test_bot_cells(self):
+        test_start = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+        universe = create_CTFUniverse(test_start, 2)
+        universe.bots[1].index = 11
+        lines = AnsiViewer(StringIO.StringIO()).render(0, 0, universe, None)
+        strip = lambda cell: re.sub("\033\\[[0-9;]*m", "", cell)
+        maze_lines = [[strip(cell) for cell in line] for line in lines[1:-1]]
+        self.assertTrue(all(len(cell) == 1 for line in maze_lines for cell in line))
+        self.assertEqual(maze_lines[2][4], "1")
@@ -2,7 +2,7 @@
 
 import unittest
 from pelita.datamodel import create_CTFUniverse, Free
-from pelita.graph import AdjacencyList, NoPathException, NoPositionException
+from pelita.graph import AdjacencyList, NoPathException, NoPositionException, LayoutInfo
 
 class TestAdjacencyList(unittest.TestCase):
 
@@ -121,3 +121,36 @@ def test_bfs_exceptions(self):
         self.assertRaises(NoPositionException, al.bfs, (0, 1), [(10, 1)])
         self.assertRaises(NoPositionException, al.bfs, (1, 1), [(11, 1)])
 
+
+class TestLayoutInfo(unittest.TestCase):
+
+    def test_layout_info(self):
+        test_layout = (
+        """ ##########
+            #0   #  .#
+            # ## # ###
+            #   .   1#
+            ########## """)
+        universe = create_CTFUniverse(test_layout, 2)
+        info = LayoutInfo.for_maze(universe.maze)
+        self.assertTrue(info is LayoutInfo.for_maze(universe.copy().maze))
+
+        self.assertEqual(info.free, set(universe.maze.pos_of(Free)))
+        self.assertEqual(set(info.adjacency[(1, 1)]), set([(2, 1), (1, 2)]))
+
+        # the loop on the left is connected by (4, 3) to the rest
+        self.assertEqual(info.articulation_points,
+                         set([(4, 3), (5, 3), (6, 3), (6, 2), (6, 1), (7, 1), (7, 3)]))
+        self.assertEqual(info.dead_end_depth[(4, 3)], 0)
+        self.assertEqual(info.dead_end_depth[(5, 3)], 1)
+        self.assertEqual(info.dead_end_depth[(8, 1)], 6)
+        self.assertEqual(info.dead_end_depth[(0, 0)], 0)
+
+        self.assertTrue(((6, 2), (6, 1), (7, 1)) in info.corridors or
+                        ((7, 1), (6, 1), (6, 2)) in info.corridors)
+
+        self.assertEqual(info.team_borders,
+                         [universe.team_border(0), universe.team_border(1)])
+        self.assertEqual(info.border_distance[0][(1, 1)], 3)
+        self.assertEqual(info.border_distance[1][(8, 1)], 5)
+        self.assertEqual(info.border_distance[0][(0, 0)], None)
@@ -39,6 +39,15 @@ def _from_json_dict(cls, item):
     def __eq__(self, other):
         return self.b == other.b and self.a_values == other.a_values
 
+@json_id("pelita.test.C")
+class C(A):
+    def _to_json_list(self):
+        return [self.a]
+
+    @classmethod
+    def _from_json_list(cls, values):
+        return cls(*values)
+
 
 class TestJson(unittest.TestCase):
     def test_can_encode(self):
@@ -99,6 +108,28 @@ def decoder(obj):
 
         self.assertEqual(a, reencoded)
 
+    def test_compact(self):
+        converter = JsonConverter()
+        converter.register(C)
+
+        c = C([1, 2])
+        self.assertEqual(json.loads(converter.dumps(c)),
+                         {"__id__": "pelita.test.C", "__compact__": [[1, 2]]})
+        self.assertEqual(converter.loads(converter.dumps(c)), c)
+
+        # the verbose form is still understood
+        verbose = """{"__id__": "pelita.test.C", "__value__": {"a": [1, 2]}}"""
+        self.assertEqual(converter.loads(verbose), c)
+
+        converter.compact = False
+        self.assertEqual(json.loads(converter.dumps(c)),
+                         {"__id__": "pelita.test.C", "__value__": {"a": [1, 2]}})
+
+    def test_backend(self):
+        converter = JsonConverter(backend=json)
+        converter.register(A)
+        self.assertEqual(converter.loads(converter.dumps([A(1)])), [A(1)])
+
     def test_wrong_classes(self):
         converter = JsonConverter()
 
@@ -205,3 +205,54 @@ def test_from_file(self):
         layout = Layout.from_file("test/test_layout.layout", TestLayoutChecks.layout_chars, 2)
         self.assertEqual(layout, Layout(test_l, TestLayoutChecks.layout_chars, 2))
 
+
+class TestParseLayout(unittest.TestCase):
+
+    layout_chars = [Wall.char, Free.char, Food.char]
+
+    def test_parse(self):
+        test_layout = (
+            """
+                #######
+                #3 .  #
+                #2 0. #
+                #    1#
+                #######
+                """)
+        shape, data, bot_positions = parse_layout(test_layout, self.layout_chars, 4)
+        layout = Layout(test_layout, self.layout_chars, 4)
+        self.assertEqual(shape, layout.shape)
+        self.assertEqual(len(data), 7 * 5)
+        self.assertEqual(data[7:14], "#  .  #")
+        self.assertEqual(bot_positions, [(3, 2), (5, 3), (1, 2), (1, 1)])
+
+        # with all available layouts
+        for name in get_available_layouts()[::50]:
+            layout_str = get_layout_by_name(name)
+            layout = Layout(layout_str, self.layout_chars, 4)
+            shape, data, bot_positions = parse_layout(layout_str, self.layout_chars, 4)
+            self.assertEqual(shape, layout.shape)
+            mesh = layout.as_mesh()
+            for pos, char in mesh.iteritems():
+                if char.isdigit():
+                    self.assertEqual(bot_positions[int(char)], pos)
+                    char = Free.char
+                self.assertEqual(data[pos[0] + pos[1] * shape[0]], char)
+
+    def test_errors(self):
+        def error(layout_str, number_bots=2):
+            try:
+                parse_layout(layout_str, self.layout_chars, number_bots)
+            except LayoutEncodingException as e:
+                return str(e)
+            self.fail("No LayoutEncodingException raised.")
+
+        self.assertTrue("'f'" in error("####\n#0 #\n#1f#\n####"))
+        self.assertTrue("line 3, column 3" in error("####\n#0 #\n#1f#\n####"))
+        self.assertTrue("line 2, column 2 and line 3, column 6" in
+                        error("####\n#0 #\n    #0##\n####"))
+        self.assertTrue("missing" in error("####\n#0 #\n#  #\n####"))
+        self.assertTrue("line 3 has length 5" in error("####\n#0 #\n#1  #\n####"))
+        self.assertTrue("line 3 is empty" in error("####\n#0 #\n\n#1 #\n####"))
+        # a bot id which is not in the game
+        self.assertTrue("'2'" in error("####\n#0 #\n#12#\n####"))
@@ -194,3 +194,34 @@ def test_bot_ids(self):
         self.assertRaises(KeyError, team2._get_move, 0, dummy_universe)
         self.assertRaises(KeyError, team2._get_move, 2, dummy_universe)
 
+    def test_move_budget(self):
+        layout = (
+            """ ####
+                #01#
+                #### """
+        )
+        dummy_universe = create_CTFUniverse(layout, 2)
+
+        test_self = self
+        class AnytimePlayer(AbstractPlayer):
+            def get_move(self):
+                test_self.assertTrue(0 < self.remaining_time <= 10)
+                self.set_provisional_move(north)
+                self.set_provisional_move(east)
+                return stop
+
+        player = AnytimePlayer()
+        team = SimpleTeam(player)
+        team._set_bot_ids([0])
+        team._set_initial(dummy_universe)
+
+        provisional = []
+        team._set_move_budget(10, provisional.append)
+        self.assertEqual(team._get_move(0, dummy_universe), stop)
+        self.assertEqual(provisional, [north, east])
+
+        # the budget is only valid for a single move
+        self.assertEqual(player.remaining_time, None)
+        self.assertRaises(AssertionError, team._get_move, 0, dummy_universe)
+        self.assertEqual(provisional, [north, east])
+
@@ -0,0 +1,111 @@
+import unittest
+import os
+import shutil
+import StringIO
+import tempfile
+
+from pelita.datamodel import east, west, stop
+from pelita.game_master import GameMaster
+from pelita.player import SimpleTeam, TestPlayer
+from pelita.viewer import DumpingViewer
+from pelita.replay import ReplayRecorder, load_replay, position_heatmap, kill_map,\
+        time_to_first_food, food_race
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+LAYOUT = (
+    """ ########
+        #0 .. 3#
+        #2 .. 1#
+        ######## """)
+
+def play(viewer, rounds=3):
+    gm = GameMaster(LAYOUT, 4, rounds, noise=False)
+    gm.register_team(SimpleTeam(TestPlayer([east, east, east]), TestPlayer([east, east, stop])))
+    gm.register_team(SimpleTeam(TestPlayer([west, west, west]), TestPlayer([stop, stop, stop])))
+    gm.register_viewer(viewer)
+    gm.play()
+    return gm
+
+class TestReplayRecorder(unittest.TestCase):
+    def test_record(self):
+        recorder = ReplayRecorder()
+        play(recorder)
+        play(recorder)
+
+        self.assertEqual(recorder.game_starts, [0, 12])
+        self.assertEqual(len(recorder.positions), 24)
+        self.assertEqual(recorder.bot_teams, [0, 1, 0, 1])
+        self.assertEqual(recorder.positions[0], [(2, 1), (6, 2), (1, 2), (6, 1)])
+        # bot 0 eats at (4, 1) in its third move
+        self.assertEqual(recorder.food_eaten[:2], [(8, 0, 4, 1), (9, 1, 3, 2)])
+        # bot 2 destroys bot 1 at (3, 2)
+        self.assertEqual(recorder.kills[0], (10, 1, 2, 3, 2))
+        self.assertEqual(recorder.scores[8], [1, 0])
+
+    def test_read_dump(self):
+        stream = StringIO.StringIO()
+        play(DumpingViewer(stream))
+        from_dump = ReplayRecorder()
+        from_dump.read_dump(StringIO.StringIO(stream.getvalue()), chunk_size=100)
+
+        recorder = ReplayRecorder()
+        play(recorder)
+        self.assertEqual(from_dump.positions, recorder.positions)
+        self.assertEqual(from_dump.food_eaten, recorder.food_eaten)
+        self.assertEqual(from_dump.game_starts, recorder.game_starts)
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_save_and_analyse(self):
+        recorder = ReplayRecorder()
+        play(recorder)
+        play(recorder, rounds=1)
+        path = os.path.join(self.tmp_dir, "games.npz")
+        recorder.save(path)
+
+        replay = load_replay(path)
+        self.assertEqual(replay.num_games, 2)
+        self.assertEqual(replay.num_teams, 2)
+        # each column is read only once
+        self.assertTrue(replay.game_offsets is replay.game_offsets)
+        self.assertRaises(AttributeError, getattr, replay, "unknown")
+        self.assertEqual(replay.positions.shape, (16, 4, 2))
+        self.assertEqual(list(replay.team_names[1]), list(recorder.team_names[1]))
+        self.assertEqual(replay.walls_of(1).shape, (4, 8))
+        self.assertTrue(replay.walls_of(1)[0].all())
+
+        heatmap = position_heatmap(replay)
+        self.assertEqual(heatmap.shape, (4, 8))
+        self.assertEqual(heatmap.sum(), 16 * 4)
+        self.assertEqual(position_heatmap(replay, bots=[3], games=[1])[1, 6], 4)
+        kills = kill_map(replay)
+        self.assertEqual(kills.sum(), 1)
+        self.assertEqual(kills[2, 3], 1)
+        self.assertEqual(kill_map(replay, games=[1]).sum(), 0)
+
+        first = time_to_first_food(replay)
+        self.assertEqual(first.tolist(), [[8, 9], [-1, -1]])
+
+        race = food_race(replay, 0)
+        self.assertEqual(race.shape, (12, 2))
+        self.assertEqual(race[:, 1].tolist(), [0] * 9 + [1] * 3)
+        self.assertEqual(race[-1].tolist(), [1, 1])
+        replay.close()
+
+        with load_replay(path) as replay:
+            self.assertEqual(replay.walls_of(0).shape, (4, 8))
+        # the columns which have been read stay available
+        self.assertEqual(replay.walls_of(1).shape, (4, 8))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "tournament"))
+import scheduler
+
+from pelita.datamodel import east, stop
+from pelita.game_master import GameMaster
+from pelita.player import SimpleTeam, TestPlayer, StoppingPlayer
+from pelita.viewer import DumpingViewer
+
+LAYOUT = (
+    """ ######
+        #0 ..#
+        #.. 1#
+        ###### """)
+
+def result(match_id, team1="a", team2="b", status="finished", outcome=1):
+    return {"match_id": match_id, "stage": "round1", "team1": team1, "team2": team2,
+            "seed": 1, "status": status, "outcome": outcome,
+            "name1": "Team " + team1, "name2": "Team " + team2,
+            "score1": 1, "score2": 0, "dump": None, "error": None,
+            "duration": 0.1, "finished": 0.0}
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def play_dump(self, moves, rounds):
+        path = os.path.join(self.tmp_dir, "game.dump")
+        with open(path, "w") as stream:
+            gm = GameMaster(LAYOUT, 2, rounds, noise=False)
+            gm.register_team(SimpleTeam(TestPlayer(moves)), team_name="left")
+            gm.register_team(SimpleTeam(StoppingPlayer()), team_name="right")
+            gm.register_viewer(DumpingViewer(stream))
+            gm.play()
+        return path
+
+    def test_read_outcome(self):
+        path = self.play_dump([east, east], 2)
+        self.assertEqual(scheduler.read_outcome(path), (0, ["left", "right"], [1, 0]))
+
+        path = self.play_dump([stop, stop], 2)
+        self.assertEqual(scheduler.read_outcome(path), (None, ["left", "right"], [0, 0]))
+
+        # an unfinished game
+        with open(path) as stream:
+            data = stream.read()
+        with open(path, "w") as stream:
+            stream.write(data[:data.rindex("\x04", 0, -1) + 1])
+        self.assertEqual(scheduler.read_outcome(path), None)
+
+    def test_side_order(self):
+        stdout = ("Using factory 'b_spec' -> u'B'\n"
+                  "Using factory 'a_spec' -> 'A'\n"
+                  "Finished. 'A' won over 'B'. (1:0)\n")
+        self.assertEqual(scheduler.side_order(["B", "A"], stdout), [0, 1])
+        self.assertEqual(scheduler.side_order(["A", "B"], stdout), [1, 0])
+        self.assertEqual(scheduler.side_order(["A", "C"], stdout), None)
+        # the sides of equally named teams cannot be told apart
+        stdout = ("Using factory 'b_spec' -> 'A'\n"
+                  "Using factory 'a_spec' -> 'A'\n")
+        self.assertEqual(scheduler.side_order(["A", "A"], stdout), None)
+
+    def test_resume(self):
+        db = os.path.join(self.tmp_dir, "tournament.db")
+        store = scheduler.ResultStore(db)
+        store.add(result("rr-0-1"))
+        store.add(result("rr-0-2", team2="c", status="failed", outcome=0))
+        store.close()
+
+        store = scheduler.ResultStore(db)
+        self.assertEqual(store.get("rr-0-1"), result("rr-0-1"))
+        self.assertEqual(store.get("rr-1-2"), None)
+
+        options = scheduler.parser.parse_args(
+            ["pelitagame", "a", "b", "c", "--workers", "1", "--db", db,
+             "--dumps", self.tmp_dir])
+        s = scheduler.Scheduler(options, store)
+        # stored matches are not played again
+        results = s.play([s.match("rr-0-1", "round1", "a", "b"),
+                          s.match("rr-0-2", "round1", "a", "c")])
+        self.assertEqual(results["rr-0-1"], result("rr-0-1"))
+        self.assertEqual(results["rr-0-2"]["status"], "failed")
+        # the names of failed matches are not used
+        self.assertEqual(s.names, {"a": "Team a", "b": "Team b", "c": "c"})
+        # another tournament in the same database
+        self.assertRaises(ValueError, s.play, [s.match("rr-0-1", "round1", "a", "c")])
+        s.pool.close()
+
+        self.assertEqual(store.forget_failed(), 1)
+        self.assertEqual(store.get("rr-0-2"), None)
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
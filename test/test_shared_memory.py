@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+import mmap
+import os
+import time
+import unittest
+
+from pelita.datamodel import create_CTFUniverse, east, west, Food
+from pelita.game_master import GameMaster, PlayerTimeout
+from pelita.player import SimpleTeam, TestPlayer, StoppingPlayer, BFSPlayer, AbstractPlayer
+from pelita.shared_memory import UniverseBuffer, SharedMemoryTeamPlayer
+
+
+class TestUniverseBuffer(unittest.TestCase):
+
+    layout = (
+        """ ##########
+            #0 . . 3 #
+            #2   .  1#
+            ########## """)
+
+    def test_round_trip(self):
+        universe = create_CTFUniverse(self.layout, 4)
+        buffer = UniverseBuffer(universe, mmap.mmap(-1, UniverseBuffer.size_for(universe)))
+
+        universe.move_bot(0, east)
+        universe.move_bot(1, west)
+        universe.teams[1].score = 7
+        universe.bots[3].noisy = True
+        universe.maze.remove_at(Food, (5, 2))
+
+        buffer.write(1, 2, universe)
+        bot_index, read_universe = buffer.read(1)
+        self.assertEqual(bot_index, 2)
+        self.assertEqual(read_universe, universe)
+        self.assertTrue(read_universe.bots[3].noisy)
+        self.assertEqual(read_universe.food_list, universe.food_list)
+
+        # a newer state has been written
+        buffer.write(2, 0, universe)
+        self.assertEqual(buffer.read(1), None)
+
+    def test_reply(self):
+        universe = create_CTFUniverse(self.layout, 4)
+        buffer = UniverseBuffer(universe)
+        self.assertEqual(buffer.size, UniverseBuffer.size_for(universe))
+        buffer.buf = mmap.mmap(-1, buffer.size)
+
+        buffer.write_reply(3, east)
+        self.assertTrue(buffer.has_reply(3))
+        self.assertEqual(buffer.read_reply(3), east)
+        self.assertFalse(buffer.has_reply(4))
+        self.assertEqual(buffer.read_reply(4), None)
+        buffer.write_reply(4, "no move")
+        self.assertTrue(buffer.has_reply(4))
+        self.assertEqual(buffer.read_reply(4), None)
+        buffer.close()
+        self.assertEqual(buffer.buf, None)
+
+
+class ReplyingConnection(object):
+    """ Replies to every request without doing anything. """
+    def send(self, message):
+        self.message = message
+
+    def poll(self, timeout):
+        return True
+
+    def recv(self):
+        return ("reply", self.message[1], None)
+
+    def close(self):
+        pass
+
+
+class TestSharedMemoryTeamPlayer(unittest.TestCase):
+
+    def test_game(self):
+        layout = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+        gm = GameMaster(layout, 2, 2, noise=False)
+        player = SharedMemoryTeamPlayer.start_process(
+            SimpleTeam(TestPlayer([east, east])))
+        gm.register_team(player)
+        gm.register_team(SimpleTeam(StoppingPlayer()))
+        gm.play()
+
+        self.assertEqual(gm.universe.bots[0].current_pos, (3, 1))
+        self.assertEqual(gm.universe.teams[0].score, 1)
+        self.assertTrue(player.is_connected())
+
+        player.close()
+        player.process.join(3)
+        self.assertFalse(player.process.is_alive())
+        self.assertFalse(player.is_connected())
+
+    def test_bfs_game(self):
+        layout = (
+            """ ##########
+                #0 . . 3 #
+                #2   .  1#
+                ########## """)
+        gm = GameMaster(layout, 4, 20, noise=False)
+        players = [
+            SharedMemoryTeamPlayer.start_process(
+                SimpleTeam(BFSPlayer(), BFSPlayer())),
+            SharedMemoryTeamPlayer.start_process(
+                SimpleTeam(StoppingPlayer(), StoppingPlayer()))
+        ]
+        for player in players:
+            gm.register_team(player)
+        gm.play()
+        self.assertEqual(gm.universe.teams[0].score, 2)
+
+        for player in players:
+            player.close()
+            self.assertFalse(player.process.is_alive())
+
+    def test_provisional_move(self):
+        layout = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+
+        class SlowPlayer(AbstractPlayer):
+            def get_move(self):
+                self.set_provisional_move(east)
+                time.sleep(self.remaining_time + 0.2)
+                return (0, 0)
+
+        gm = GameMaster(layout, 2, 1, noise=False)
+        player = SharedMemoryTeamPlayer.start_process(
+            SimpleTeam(SlowPlayer()), timeout=0.3)
+        gm.register_team(player)
+        gm.register_team(SimpleTeam(StoppingPlayer()))
+        gm.play()
+
+        self.assertEqual(gm.universe.bots[0].current_pos, (2, 1))
+        self.assertEqual(gm.player_teams_timeouts, [1, 0])
+        player.close()
+
+    def test_session(self):
+        layout = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+        player = SharedMemoryTeamPlayer.start_process(
+            SimpleTeam(TestPlayer([east, east, east, east])))
+        buffers = []
+        for _ in range(2):
+            gm = GameMaster(layout, 2, 2, noise=False)
+            gm.register_team(player)
+            gm.register_team(SimpleTeam(StoppingPlayer()))
+            gm.play()
+            self.assertEqual(gm.universe.bots[0].current_pos, (3, 1))
+            buffers.append(player.buffer)
+
+        # the mapping of the first game has been released
+        self.assertEqual(buffers[0].buf, None)
+        self.assertEqual(player._mapping_path, None)
+        player.close()
+        self.assertEqual(buffers[1].buf, None)
+
+    def test_late_set_initial(self):
+        layout = (
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """)
+
+        class SlowTeam(SimpleTeam):
+            def _set_initial(self, universe):
+                time.sleep(0.4)
+                return super(SlowTeam, self)._set_initial(universe)
+
+        gm = GameMaster(layout, 2, 2, noise=False)
+        player = SharedMemoryTeamPlayer.start_process(
+            SlowTeam(TestPlayer([east, east])), timeout=0.3)
+        gm.register_team(player)
+        gm.register_team(SimpleTeam(StoppingPlayer()))
+        gm.set_initial()
+        # the team has not mapped the file yet
+        path = player._mapping_path
+        self.assertTrue(os.path.exists(path))
+
+        gm.play_round(0)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(gm.universe.bots[0].current_pos, (2, 1))
+        player.close()
+
+    def test_missing_reply(self):
+        universe = create_CTFUniverse(
+            """ ######
+                #0 ..#
+                #.. 1#
+                ###### """, 2)
+        player = SharedMemoryTeamPlayer(ReplyingConnection())
+        player._set_initial(universe)
+        self.assertEqual(player._mapping_path, None)
+        # the reply has been sent, but no move has been written
+        self.assertRaises(PlayerTimeout, player._get_move, 0, universe)
+        player.close()
+
+if __name__ == '__main__':
+    unittest.main()
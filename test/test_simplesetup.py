@@ -1,9 +1,26 @@
 # -*- coding: utf-8 -*-
 import unittest
+import os
+import tempfile
+import time
 
-from pelita.simplesetup import SimpleClient, SimpleServer
+from pelita.simplesetup import SimpleClient, SimpleServer, parse_address, auto_connect
 from pelita.player import SimpleTeam, RandomPlayer
-from pelita.viewer import AsciiViewer
+from pelita.viewer import AsciiViewer, AbstractViewer
+from pelita.actors import ViewerActor, BroadcastHub, ServerActor
+from pelita.datamodel import create_CTFUniverse
+from pelita.replay import ReplayRecorder
+
+class CollectingViewer(AbstractViewer):
+    def __init__(self):
+        self.initial = []
+        self.observed = []
+
+    def set_initial(self, universe):
+        self.initial.append(universe)
+
+    def observe(self, round_, turn, universe, events):
+        self.observed.append((round_, turn))
 
 class TestSimpleSetup(unittest.TestCase):
     def test_load_layout(self):
@@ -62,6 +79,132 @@ def test_simple_game(self):
 
         self.assertFalse(server.server.is_alive)
 
+    def test_session_games(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        class CountingTeam(SimpleTeam):
+            def _set_initial(self, universe):
+                self.initial_calls = getattr(self, "initial_calls", 0) + 1
+                return super(CountingTeam, self)._set_initial(universe)
+
+        team1 = CountingTeam("team1", RandomPlayer())
+        team2 = CountingTeam("team2", RandomPlayer())
+        client1 = SimpleClient(team1)
+        client2 = SimpleClient(team2)
+        server = SimpleServer(layout_string=layout, rounds=5, players=2, games=3)
+
+        client1.autoplay_background()
+        client2.autoplay_background()
+        server.run_simple(AsciiViewer)
+
+        self.assertFalse(server.server.is_alive)
+        results = server.server._actor.results
+        self.assertEqual(len(results), 3)
+        # the teams change sides after each game
+        first_names = results[0][0]
+        self.assertEqual(results[1][0], first_names[::-1])
+        self.assertEqual(results[2][0], first_names)
+        # the teams were connected once and played all games
+        self.assertEqual(team1.initial_calls, 3)
+        self.assertEqual(team2.initial_calls, 3)
+
+        self.assertRaises(ValueError, SimpleServer, layout_string=layout, games=0)
+
+    def test_remote_session_games(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        tmp_dir = tempfile.mkdtemp()
+        address = "unix://" + os.path.join(tmp_dir, "pelita.sock")
+        dump = os.path.join(tmp_dir, "pelita.dump")
+        client1 = SimpleClient(SimpleTeam("team1", RandomPlayer()), address=address)
+        client2 = SimpleClient(SimpleTeam("team2", RandomPlayer()))
+        server = SimpleServer(layout_string=layout, rounds=5, players=2, games=3,
+                              address=address, dump_to_file=dump)
+
+        client1.autoplay_background()
+        client2.autoplay_background()
+        server.run_simple(AsciiViewer)
+
+        self.assertFalse(server.server.is_alive)
+        results = server.server._actor.results
+        self.assertEqual(len(results), 3)
+        # the remote team stays in the session and changes sides
+        first_names = results[0][0]
+        self.assertEqual(sorted(first_names), ["team1", "team2"])
+        self.assertEqual(results[1][0], first_names[::-1])
+        self.assertEqual(results[2][0], first_names)
+
+        # all games are in the dump
+        recorder = ReplayRecorder()
+        with open(dump) as stream:
+            recorder.read_dump(stream)
+        self.assertEqual(len(recorder.game_starts), 3)
+        self.assertEqual([names for names in recorder.team_names],
+                         [names for names, scores in results])
+
+    def test_session_dead_teams(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        class Team(object):
+            def __init__(self, connected):
+                self.connected = connected
+            def is_connected(self):
+                return self.connected
+
+        server = ServerActor()
+        server.on_start()
+        alive = Team(True)
+        server.teams = [Team(False), alive]
+        server.team_names = ["team1", "team2"]
+        server.scheduled_games.extend([(layout, 2, 5)] * 2)
+        server._continue_session()
+        # the next game waits for another team
+        self.assertEqual(server.teams, [alive])
+        self.assertEqual(server.team_names, ["team2"])
+        self.assertFalse(server.game_master is None)
+        self.assertEqual(len(server.scheduled_games), 1)
+
+        # without any teams, the session is over
+        alive.connected = False
+        server.game_master = None
+        server._continue_session()
+        self.assertEqual(server.teams, [])
+        self.assertEqual(server.team_names, [])
+        self.assertTrue(server.game_master is None)
+        self.assertEqual(len(server.scheduled_games), 0)
+
+    def test_shared_memory_game(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        client1 = SimpleClient(SimpleTeam("team1", RandomPlayer()))
+        client2 = SimpleClient(SimpleTeam("team2", RandomPlayer()))
+        server = SimpleServer(layout_string=layout, rounds=5, players=2)
+
+        process1 = client1.autoplay_shared_memory(server)
+        process2 = client2.autoplay_shared_memory(server)
+        server.run_simple(AsciiViewer)
+
+        self.assertFalse(server.server.is_alive)
+        # the server stops the team processes after the game
+        self.assertFalse(process1.is_alive())
+        self.assertFalse(process2.is_alive())
+
     def test_simple_remote_game(self):
         layout = """
         ##########
@@ -83,5 +226,144 @@ def test_simple_remote_game(self):
 
         self.assertFalse(server.server.is_alive)
 
+    def test_auto_connect_backoff(self):
+        attempts = []
+        def connect():
+            attempts.append(time.time())
+            return len(attempts) == 4
+        self.assertTrue(auto_connect(connect, retries=10, delay=0.08, initial_delay=0.02))
+        self.assertEqual(len(attempts), 4)
+        waits = [b - a for a, b in zip(attempts, attempts[1:])]
+        # 0.02, 0.04, 0.08 (capped)
+        self.assertTrue(waits[0] < waits[2])
+        self.assertTrue(sum(waits) < 0.5)
+
+        attempts[:] = []
+        self.assertFalse(auto_connect(lambda: False, retries=3, delay=0.01))
+
+    def test_broadcast_late_join(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        universe = create_CTFUniverse(layout, 2)
+        hub = BroadcastHub()
+        early_viewer = CollectingViewer()
+        early_actor = ViewerActor(early_viewer)
+        hub.subscribe(early_actor.actor_ref)
+        hub.subscribe(ViewerActor(CollectingViewer()).actor_ref)
+
+        hub.set_initial(universe)
+        hub.observe(0, 0, universe, [])
+        hub.observe(0, 1, universe, [])
+        # encoded once for all subscribers
+        self.assertEqual(hub.encodings, 3)
+
+        viewer = CollectingViewer()
+        viewer_actor = ViewerActor(viewer)
+        hub.subscribe(viewer_actor.actor_ref)
+        # the late viewer only gets the keyframe
+        for _ in range(100):
+            if viewer.observed and len(early_viewer.observed) == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(len(viewer.initial), 1)
+        self.assertEqual(viewer.observed, [(0, 1)])
+        self.assertEqual(early_viewer.observed, [(0, 0), (0, 1)])
+
+        for ref in hub.subscribers:
+            ref.stop()
+
+    def test_broadcast_dead_viewer(self):
+        layout = """
+        ##########
+        #0      1#
+        ##########
+        """
+        universe = create_CTFUniverse(layout, 2)
+        hub = BroadcastHub()
+        hub.set_initial(universe)
+        hub.observe(0, 0, universe, [])
+
+        dead_ref = ViewerActor(CollectingViewer()).actor_ref
+        dead_ref.stop()
+        dead_ref.join()
+        hub.subscribe(dead_ref)
+        self.assertEqual(hub.subscribers, [])
+
+        hub.observe(0, 1, universe, [])
+        self.assertEqual(hub.encodings, 3)
+
+    def test_broadcast_game(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        address = "unix://" + os.path.join(tempfile.mkdtemp(), "pelita.sock")
+        client1 = SimpleClient(SimpleTeam("team1", RandomPlayer()), address=address)
+        client2 = SimpleClient(SimpleTeam("team2", RandomPlayer()), address=address)
+        server = SimpleServer(layout_string=layout, rounds=5, players=2, address=address,
+                              broadcast=True)
+
+        viewers = [CollectingViewer() for _ in range(3)]
+        viewer_actors = [ViewerActor(viewer) for viewer in viewers]
+        for viewer_actor in viewer_actors:
+            self.assertTrue(viewer_actor.connect_unix("pelita-broadcast", server.path))
+
+        client1.autoplay_background()
+        client2.autoplay_background()
+        server.run_simple(AsciiViewer)
+        self.assertFalse(server.server.is_alive)
+
+        hub = server.server._actor.broadcast_hub
+        last = hub._latest[1][:2]
+        for _ in range(300):
+            if all(viewer.observed and viewer.observed[-1] == tuple(last) for viewer in viewers):
+                break
+            time.sleep(0.01)
+        for viewer in viewers:
+            self.assertEqual(len(viewer.initial), 1)
+            self.assertEqual(viewer.observed[-1], tuple(last))
+
+        for viewer_actor in viewer_actors:
+            viewer_actor.actor_ref.stop()
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("tcp://localhost:50007"),
+                         ("localhost", 50007, None))
+        self.assertEqual(parse_address("tcp://:50007"), ("", 50007, None))
+        self.assertEqual(parse_address("unix:///tmp/pelita.sock"),
+                         (None, None, "/tmp/pelita.sock"))
+        self.assertRaises(ValueError, parse_address, "localhost:50007")
+        self.assertRaises(ValueError, parse_address, "tcp://localhost")
+        self.assertRaises(ValueError, parse_address, "tcp://localhost:port")
+        self.assertRaises(ValueError, parse_address, "udp://localhost:50007")
+
+    def test_simple_unix_game(self):
+        layout = """
+        ##########
+        #        #
+        #0      1#
+        ##########
+        """
+        address = "unix://" + os.path.join(tempfile.mkdtemp(), "pelita.sock")
+        client1 = SimpleClient(SimpleTeam("team1", RandomPlayer()), address=address)
+        client2 = SimpleClient(SimpleTeam("team2", RandomPlayer()), address=address)
+        server = SimpleServer(layout_string=layout, rounds=5, players=2, address=address)
+
+        self.assertEqual(server.port, None)
+        self.assertTrue(server.path.endswith("pelita.sock"))
+        self.assertTrue(server.server.is_alive)
+
+        client1.autoplay_background()
+        client2.autoplay_background()
+        server.run_simple(AsciiViewer)
+
+        self.assertFalse(server.server.is_alive)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+
+import Tkinter
+
+from pelita.containers import TypeAwareList
+from pelita.datamodel import create_CTFUniverse, UniverseEvent, BotMoves, TeamWins
+from pelita.ui.tk_canvas import TkApplication, MAX_IDLE_INTERVAL
+from pelita.ui.tk_viewer import TkViewer
+
+LAYOUT = (
+    """ ######
+        #0 ..#
+        #.. 1#
+        ###### """)
+
+def events(*items):
+    return TypeAwareList(items, base_class=UniverseEvent)
+
+class RecordingMaster(object):
+    """ Records the delays of `after` instead of scheduling anything. """
+    def __init__(self):
+        self.delays = []
+
+    def after(self, delay, callback):
+        self.delays.append(delay)
+
+
+class TestFrameQueue(unittest.TestCase):
+    def test_observe_does_not_block(self):
+        queue = TkViewer.create_queue(fps=25)
+        universe = create_CTFUniverse(LAYOUT, 2)
+        start = time.time()
+        # nobody reads the queue
+        for turn in range(100):
+            queue.put((0, turn, universe, events()))
+        self.assertTrue(time.time() - start < 0.5)
+        self.assertEqual(len(queue), 1)
+
+    def test_keeps_team_wins(self):
+        queue = TkViewer.create_queue(fps=25)
+        universe = create_CTFUniverse(LAYOUT, 2)
+        queue.put((0, 0, universe, events(BotMoves(0, (1, 1), (2, 1)))))
+        queue.put((0, 1, universe, events(BotMoves(1, (4, 2), (3, 2)))))
+        queue.put((1, None, universe, events(TeamWins(0))))
+        round_, turn, frame_universe, frame_events = queue.get(timeout=0)
+        self.assertEqual((round_, turn), (1, None))
+        self.assertTrue(frame_universe is universe)
+        self.assertEqual(len(frame_events), 3)
+        self.assertEqual(frame_events.filter_type(TeamWins), [TeamWins(0)])
+
+    def test_default_queue(self):
+        queue = TkViewer.create_queue(queue_size=3)
+        self.assertEqual(queue.maxsize, 3)
+
+
+class TestReadFrames(unittest.TestCase):
+    def setUp(self):
+        try:
+            self.root = Tkinter.Tk()
+        except Tkinter.TclError:
+            self.skipTest("No display available.")
+        self.queue = TkViewer.create_queue(fps=25)
+        self.app = TkApplication(queue=self.queue, master=self.root, fps=25)
+        self.app.master = RecordingMaster()
+        self.observed = []
+        self.app.observe = self.observed.append
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def test_idle_backoff(self):
+        for _ in range(6):
+            self.app.read_frames()
+        delays = self.app.master.delays
+        # the interval doubles up to MAX_IDLE_INTERVAL
+        self.assertTrue(delays[0] <= 80)
+        self.assertEqual(delays, sorted(delays))
+        self.assertTrue(all(delay <= MAX_IDLE_INTERVAL * 1000 for delay in delays))
+        self.assertTrue(delays[-1] > MAX_IDLE_INTERVAL * 1000 / 2)
+        self.assertEqual(self.observed, [{}] * 6)
+
+        # back to the frame rate with the next state
+        universe = create_CTFUniverse(LAYOUT, 2)
+        self.queue.put((0, 0, universe, events()))
+        self.app.read_frames()
+        self.assertTrue(delays[-1] <= 40)
+        self.assertTrue(self.observed[-1]["universe"] is universe)
+
+    def test_draws_coalesced_frame(self):
+        universe = create_CTFUniverse(LAYOUT, 2)
+        self.queue.put((0, 0, universe, events(BotMoves(0, (1, 1), (2, 1)))))
+        self.queue.put((1, None, universe, events(TeamWins(0))))
+        self.app.read_frames()
+
+        self.assertEqual(len(self.observed), 1)
+        frame = self.observed[0]
+        self.assertEqual((frame["round"], frame["turn"]), (1, None))
+        self.assertEqual(len(frame["events"]), 2)
+        self.assertTrue(TeamWins in frame["events"])
+        self.assertEqual(len(self.queue), 0)
+
+if __name__ == '__main__':
+    unittest.main()
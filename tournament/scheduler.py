@@ -0,0 +1,389 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+""" Non-interactive tournament scheduler.
+
+Plays the same tournament as tournament.py (everybody vs everybody,
+followed by a K.O. round) without presentation and without waiting for
+the operator:
+
+* independent matches are run in parallel on a pool of workers (one per
+  CPU by default). Each match is a separate pelitagame process with the
+  null viewer.
+* the outcome of each match is read from its dump file (the final
+  universe and its TeamWins or GameDraw event) instead of being parsed
+  from stdout.
+* every finished match is immediately written to an SQLite database.
+  When the scheduler is started again with the same database, finished
+  matches are not played again; the seeds of all matches are derived
+  from the tournament seed, so that the resumed tournament is the same.
+
+Usage::
+
+    $ ./scheduler.py ../pelitagame group0 group1 group2 group3 group4
+
+"""
+from __future__ import print_function
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import argparse
+import ast
+import collections
+import functools
+import hashlib
+import multiprocessing
+import multiprocessing.pool
+import random
+import re
+import sqlite3
+import threading
+import time
+from subprocess import Popen, PIPE
+
+from pelita import datamodel
+from pelita.messaging.json_convert import json_converter
+
+# Number of points a teams gets for matches in the first round
+POINTS_DRAW = 1
+POINTS_WIN = 2
+
+# Number of matches in the K.O. round until a winner is chosen at random
+MAX_DEATHMATCHES = 3
+
+Match = collections.namedtuple("Match", "match_id stage team1 team2 seed")
+
+# pelitagame prints the names of the loaded teams (left team first)
+FACTORY_RE = re.compile(r"^Using factory (.*) -> (.*)$", re.M)
+
+COLUMNS = ("match_id", "stage", "team1", "team2", "seed", "status", "outcome",
+           "name1", "name2", "score1", "score2", "dump", "error", "duration",
+           "finished")
+
+
+class ResultStore(object):
+    """ The results of all played matches in an SQLite database.
+
+    `outcome` is 1 or 2 if team1 or team2 has won and 0 for a draw.
+    Matches which have crashed have the `status` "failed" and count
+    as a draw.
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS matches ("
+                " match_id TEXT PRIMARY KEY, stage TEXT,"
+                " team1 TEXT, team2 TEXT, seed INTEGER,"
+                " status TEXT, outcome INTEGER,"
+                " name1 TEXT, name2 TEXT, score1 INTEGER, score2 INTEGER,"
+                " dump TEXT, error TEXT, duration REAL, finished REAL)")
+
+    def get(self, match_id):
+        row = self.connection.execute(
+            "SELECT * FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def add(self, result):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO matches (%s) VALUES (%s)" % (
+                    ", ".join(COLUMNS), ", ".join("?" * len(COLUMNS))),
+                [result[column] for column in COLUMNS])
+
+    def forget_failed(self):
+        """ Removes the crashed matches, so that they are played again. """
+        with self.connection:
+            return self.connection.execute(
+                "DELETE FROM matches WHERE status = 'failed'").rowcount
+
+    def close(self):
+        self.connection.close()
+
+
+def match_seed(seed, match_id):
+    """ Derives the seed of a match from the tournament seed. """
+    return int(hashlib.md5("%s:%s" % (seed, match_id)).hexdigest()[:8], 16)
+
+def read_outcome(dump):
+    """ Reads the final message of a game from the file `dump`.
+
+    Returns a tuple (winner, names, scores) or None, if the game has
+    not been finished. `winner` is the index of the winning team in the
+    universe or None for a draw.
+    """
+    with open(dump, "rb") as stream:
+        parts = [part for part in stream.read().split("\x04") if part.strip()]
+    if not parts:
+        return None
+    message = json_converter.loads(parts[-1])
+    universe = message["universe"]
+    finished = False
+    winner = None
+    for event in message.get("events") or []:
+        if isinstance(event, datamodel.TeamWins):
+            finished, winner = True, event.winning_team_index
+        elif isinstance(event, datamodel.GameDraw):
+            finished = True
+    if not finished:
+        return None
+    return (winner,
+            [team.name for team in universe.teams],
+            [team.score for team in universe.teams])
+
+def side_order(names, stdout):
+    """ Returns the indices of the left and the right team in the
+    universe.
+
+    The teams are added to the universe in the order in which they
+    connect, which is not necessarily the order of the command line.
+    `stdout` of pelitagame tells the names of the left and the right team.
+    Returns None, if the sides cannot be told apart (e.g. both teams
+    have the same name).
+    """
+    loaded = [ast.literal_eval(name) for spec, name in FACTORY_RE.findall(stdout)]
+    if len(set(names)) != len(names):
+        return None
+    if loaded == names:
+        return [0, 1]
+    if loaded == names[::-1]:
+        return [1, 0]
+    return None
+
+def run_match(match, options):
+    """ Plays a single match in a pelitagame process and returns
+    its result (a dict with the columns of the `ResultStore`).
+    """
+    dump = os.path.join(options.dumps, match.match_id + ".dump")
+    args = [sys.executable, options.pelitagame, "--null",
+            "--rounds", str(options.rounds), "--seed", str(match.seed),
+            "--dump", dump, match.team1, match.team2]
+    if os.path.exists(dump):
+        # left over from a crashed run
+        os.remove(dump)
+    start = time.time()
+    process = Popen(args, stdout=PIPE, stderr=PIPE)
+    timer = None
+    if options.timeout:
+        timer = threading.Timer(options.timeout, process.kill)
+        timer.start()
+    try:
+        stdout, stderr = process.communicate()
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+    result = dict(match._asdict(), status="failed", outcome=0,
+                  name1=match.team1, name2=match.team2, score1=None, score2=None,
+                  dump=dump, error=stderr or None,
+                  duration=time.time() - start, finished=time.time())
+    outcome = None
+    try:
+        if os.path.exists(dump):
+            outcome = read_outcome(dump)
+    except ValueError as e:
+        stderr += "Cannot read %s: %s\n" % (dump, e)
+    if outcome is None:
+        result["error"] = "%sThe game has not been finished (exit code %s)." % (
+            stderr, process.returncode)
+        return result
+
+    winner, names, scores = outcome
+    order = side_order(names, stdout)
+    if order is None:
+        result["error"] = "%sCannot tell the sides of %r apart." % (stderr, names)
+        return result
+
+    result["name1"], result["name2"] = [names[i] for i in order]
+    result["score1"], result["score2"] = [scores[i] for i in order]
+    result["outcome"] = 0 if winner is None else order.index(winner) + 1
+    result["status"] = "finished"
+    return result
+
+
+class Scheduler(object):
+    """ Plays the matches of a tournament on a pool of workers and keeps
+    their results in `store`.
+    """
+    def __init__(self, options, store):
+        self.options = options
+        self.store = store
+        self.pool = multiprocessing.pool.ThreadPool(options.workers)
+        self.names = dict((team, team) for team in options.teams)
+
+    def match(self, match_id, stage, team1, team2):
+        return Match(match_id, stage, team1, team2,
+                     match_seed(self.options.seed, match_id))
+
+    def play(self, matches):
+        """ Plays all `matches` in parallel, which are not in the store
+        yet, and returns the results by match id.
+        """
+        results = {}
+        pending = []
+        for match in matches:
+            stored = self.store.get(match.match_id)
+            if stored is None:
+                pending.append(match)
+            elif (stored["team1"], stored["team2"]) != (match.team1, match.team2):
+                raise ValueError("Match %s was played by %s and %s, not by %s and %s."
+                                 " Use another database for another tournament." % (
+                                 match.match_id, stored["team1"], stored["team2"],
+                                 match.team1, match.team2))
+            else:
+                results[match.match_id] = stored
+                self.report(stored, resumed=True)
+
+        run = functools.partial(run_match, options=self.options)
+        for result in self.pool.imap_unordered(run, pending):
+            self.store.add(result)
+            results[result["match_id"]] = result
+            self.report(result)
+        return results
+
+    def report(self, result, resumed=False):
+        if result["status"] == "finished":
+            # failed matches only know the team specs
+            self.names[result["team1"]] = result["name1"]
+            self.names[result["team2"]] = result["name2"]
+        name1, name2 = result["name1"], result["name2"]
+        if result["status"] == "failed":
+            error = (result["error"] or "").strip().splitlines()
+            text = "*** ERROR: the match failed (counted as a draw): %s" % (
+                error[-1] if error else "")
+        elif result["outcome"] == 0:
+            text = "draw (%i:%i)" % (result["score1"], result["score2"])
+        else:
+            text = "%s wins (%i:%i)" % ((name1, name2)[result["outcome"] - 1],
+                                        result["score1"], result["score2"])
+        print("%-12s %s vs %s: %s%s" % (result["match_id"], name1, name2, text,
+                                        " [stored]" if resumed else ""))
+        sys.stdout.flush()
+
+    def round1(self, teams):
+        """ Plays everybody vs everybody and returns the teams sorted by
+        their points.
+        """
+        print()
+        print("ROUND 1 (Everybody vs Everybody)")
+        print("================================")
+        matches = [self.match("rr-%i-%i" % (i, j), "round1", teams[i], teams[j])
+                   for i in range(len(teams)) for j in range(i + 1, len(teams))]
+        results = self.play(matches)
+
+        points = dict((team, 0) for team in teams)
+        for match in matches:
+            outcome = results[match.match_id]["outcome"]
+            if outcome == 0:
+                points[match.team1] += POINTS_DRAW
+                points[match.team2] += POINTS_DRAW
+            else:
+                points[(match.team1, match.team2)[outcome - 1]] += POINTS_WIN
+
+        ranking = sorted(((points[team], team) for team in teams), reverse=True)
+        print()
+        print("Ranking:")
+        for p, team in ranking:
+            print("  %25s %d" % (self.names[team], p))
+        return [team for p, team in ranking]
+
+    def deathmatches(self, pairs):
+        """ Plays the pairs (stage, team1, team2) until one team of each
+        pair has won and returns the winners. Pairs which have no winner
+        after `MAX_DEATHMATCHES` matches get a winner chosen at random.
+        """
+        winners = {}
+        for attempt in range(1, MAX_DEATHMATCHES + 1):
+            matches = [self.match("%s-%i" % (stage, attempt), stage, team1, team2)
+                       for stage, team1, team2 in pairs if stage not in winners]
+            if not matches:
+                break
+            results = self.play(matches)
+            for match in matches:
+                outcome = results[match.match_id]["outcome"]
+                if outcome:
+                    winners[match.stage] = (match.team1, match.team2)[outcome - 1]
+        for stage, team1, team2 in pairs:
+            if stage not in winners:
+                rnd = random.Random(match_seed(self.options.seed, stage))
+                winners[stage] = rnd.choice((team1, team2))
+                print("No winner of %s after %i Death Matches. Chose %s at random." % (
+                      stage, MAX_DEATHMATCHES, self.names[winners[stage]]))
+        return [winners[stage] for stage, team1, team2 in pairs]
+
+    def round2(self, teams):
+        """ Plays the K.O. round and returns the winner.
+
+        The best four teams play the semifinals (1 vs 4 and 2 vs 3) and
+        the winner of their final plays against the remaining teams one
+        after the other.
+        """
+        print()
+        print("ROUND 2 (K.O.)")
+        print("==============")
+        if len(teams) >= 4:
+            w1, w2 = self.deathmatches([("semifinal1", teams[0], teams[3]),
+                                        ("semifinal2", teams[1], teams[2])])
+            winner, remaining = w1, [w2] + teams[4:]
+        else:
+            winner, remaining = teams[0], teams[1:]
+        for i, team in enumerate(remaining):
+            winner, = self.deathmatches([("final%i" % (i + 1), winner, team)])
+        return winner
+
+    def run(self):
+        teams = list(self.options.teams)
+        random.Random(self.options.seed).shuffle(teams)
+        try:
+            winner = self.round2(self.round1(teams))
+        finally:
+            self.pool.close()
+        print()
+        print("The winner of the Pelita tournament is... %s. Congratulations!" % (
+              self.names[winner],))
+        return winner
+
+
+parser = argparse.ArgumentParser(description="Play a Pelita tournament without"
+                                 " interruptions.")
+parser.add_argument("pelitagame", help="the pelitagame script")
+parser.add_argument("teams", nargs="*", metavar="TEAM",
+                    default=["group0", "group1", "group2", "group3", "group4"],
+                    help="the teams (as given to pelitagame)."
+                    " Default: group0 .. group4")
+parser.add_argument("--db", default="tournament.db",
+                    help="the SQLite database which stores the results."
+                    " Default: 'tournament.db'")
+parser.add_argument("--dumps", default="dumpstore", metavar="DIR",
+                    help="the directory for the game dumps. Default: 'dumpstore'")
+parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                    help="the number of matches played at the same time."
+                    " Default: the number of CPUs")
+parser.add_argument("--rounds", type=int, default=300,
+                    help="maximum number of rounds of a match")
+parser.add_argument("--seed", type=int, default=42,
+                    help="the seed of the tournament")
+parser.add_argument("--timeout", type=float, default=None, metavar="SECONDS",
+                    help="stop matches which take longer (counted as crashed)")
+parser.add_argument("--retry-failed", action="store_true",
+                    help="play crashed matches of the database again")
+
+if __name__ == '__main__':
+    options = parser.parse_args()
+    if not os.path.isfile(options.pelitagame):
+        sys.stderr.write(options.pelitagame + ' not found!\n')
+        sys.exit(2)
+    if len(options.teams) < 2:
+        sys.stderr.write('A tournament needs at least two teams!\n')
+        sys.exit(1)
+    if not os.path.exists(options.dumps):
+        os.mkdir(options.dumps)
+
+    store = ResultStore(options.db)
+    if options.retry_failed:
+        print("Playing %i crashed matches again." % store.forget_failed())
+    try:
+        Scheduler(options, store).run()
+    finally:
+        store.close()